@@ -1,6 +1,11 @@
 # appointments/admin.py
 from django.contrib import admin
-from .models import Provider, Location, AppointmentType, Appointment
+from .models import Provider, Location, AppointmentType, Appointment, ProviderSchedule
+
+
+class ProviderScheduleInline(admin.TabularInline):
+    model = ProviderSchedule
+    extra = 0
 
 
 @admin.register(Provider)
@@ -8,6 +13,7 @@ class ProviderAdmin(admin.ModelAdmin):
     list_display = ['id', 'name', 'specialty', 'phone', 'email']
     search_fields = ['name', 'specialty']
     list_filter = ['specialty']
+    inlines = [ProviderScheduleInline]
 
 
 @admin.register(Location)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class AppointmentsConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "appointments"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,17 @@
+# appointments/checks.py
+from django.core.checks import Warning, register
+
+from mulisa_api import caching
+
+
+@register(deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    if caching.is_shared():
+        return []
+    return [
+        Warning(
+            'Slot grid, calendar feed and patient chart caching is off: the default cache is per process.',
+            hint='Set CACHE_BACKEND to a shared cache (e.g. Redis) to enable it.',
+            id='appointments.W001',
+        )
+    ]
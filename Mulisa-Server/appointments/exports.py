@@ -0,0 +1,24 @@
+# appointments/exports.py
+from mulisa_api.exports import Export
+
+from .models import Appointment
+
+APPOINTMENTS = Export(
+    "appointments",
+    Appointment.objects.order_by("patient_id", "appointment_date", "appointment_time", "id"),
+    [
+        "id",
+        "patient_id",
+        "provider_id",
+        "appointment_type_id",
+        "location_id",
+        "appointment_date",
+        "appointment_time",
+        "start",
+        "end",
+        "status",
+        "created_at",
+        "updated_at",
+    ],
+    date_field="start",
+)
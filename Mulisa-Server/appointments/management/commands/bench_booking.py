@@ -0,0 +1,161 @@
+import queue
+import random
+import threading
+import time as timer
+from datetime import date, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+
+from appointments.models import Provider, Location, AppointmentType, Appointment, ProviderSchedule
+from appointments.services import booking
+from appointments.services.booking import padded_interval
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark concurrent booking throughput and double-booking safety '
+        'against a throwaway test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=400)
+        parser.add_argument('--providers', type=int, default=8)
+        parser.add_argument('--slots', type=int, default=16, help='Candidate start times per provider')
+        parser.add_argument(
+            '--mode',
+            choices=['locked', 'naive'],
+            default='locked',
+            help='locked: booking service; naive: check-then-insert without a lock',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            # Threads need a real file; in-memory shared cache raises table locks
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = 'bench_booking.sqlite3'
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        owner = get_user_model().objects.create_user(username='bench', password='bench')
+        patient = Patient.objects.create(owner=owner, name='Bench Patient', age=40, gender='other')
+        location = Location.objects.create(
+            name='Bench Clinic', address='1 Main St', city='Atlanta', state='GA', zip_code='30301'
+        )
+        appt_type = AppointmentType.objects.create(
+            name='Bench Visit', duration_minutes=30, buffer_before_min=5, buffer_after_min=5
+        )
+        providers = [
+            Provider.objects.create(name=f'Bench {i}', specialty='Bench')
+            for i in range(options['providers'])
+        ]
+        location.providers.add(*providers)
+
+        day = date.today() + timedelta(days=1)
+        starts = [time(8 + (i * 30) // 60, (i * 30) % 60) for i in range(options['slots'])]
+        # Bookings must fall inside working hours; open the whole day
+        ProviderSchedule.objects.bulk_create(
+            ProviderSchedule(
+                provider=provider, location=location, weekday=day.weekday(),
+                start=time(0, 0), end=time(23, 59),
+            )
+            for provider in providers
+        )
+
+        work = queue.Queue()
+        for _ in range(options['attempts']):
+            work.put((rng.choice(providers).pk, rng.choice(starts)))
+
+        counts = {'booked': 0, 'conflicts': 0, 'errors': 0}
+        counts_lock = threading.Lock()
+        naive = options['mode'] == 'naive'
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        provider_id, start = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    fields = {
+                        'patient_id': patient.pk,
+                        'provider_id': provider_id,
+                        'appointment_type': appt_type,
+                        'location_id': location.pk,
+                        'appointment_date': day,
+                        'appointment_time': start,
+                    }
+                    try:
+                        if naive:
+                            with transaction.atomic():
+                                if booking.find_conflict(provider_id, day, start, appt_type):
+                                    raise booking.SlotUnavailable()
+                                Appointment.objects.create(**fields)
+                        else:
+                            booking.book_appointment(**fields)
+                        outcome = 'booked'
+                    except booking.SlotUnavailable:
+                        outcome = 'conflicts'
+                    except Exception:
+                        outcome = 'errors'
+                    with counts_lock:
+                        counts[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = timer.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = timer.perf_counter() - started
+
+        self.stdout.write(
+            f"mode={options['mode']} threads={options['threads']} "
+            f"providers={options['providers']} attempts={options['attempts']} ({connection.vendor})"
+        )
+        self.stdout.write(
+            f"booked={counts['booked']} conflicts={counts['conflicts']} errors={counts['errors']}"
+        )
+        self.stdout.write(
+            f"elapsed={elapsed:.3f}s throughput={options['attempts'] / elapsed:.1f} attempts/s "
+            f"({counts['booked'] / elapsed:.1f} bookings/s)"
+        )
+
+        overlaps = self._count_overlaps(day)
+        style = self.style.SUCCESS if overlaps == 0 else self.style.ERROR
+        self.stdout.write(style(f'double-booked pairs: {overlaps}'))
+
+    @staticmethod
+    def _count_overlaps(day):
+        rows = Appointment.objects.filter(
+            appointment_date=day, status='scheduled'
+        ).order_by('provider_id', 'appointment_time').values_list(
+            'provider_id',
+            'appointment_time',
+            'appointment_type__duration_minutes',
+            'appointment_type__buffer_before_min',
+            'appointment_type__buffer_after_min',
+        )
+        overlaps = 0
+        by_provider = {}
+        for provider_id, start, duration, before, after in rows:
+            by_provider.setdefault(provider_id, []).append(
+                padded_interval(start, duration, before, after)
+            )
+        for intervals in by_provider.values():
+            for i, (start_a, end_a) in enumerate(intervals):
+                for start_b, end_b in intervals[i + 1:]:
+                    if start_b < end_a and start_a < end_b:
+                        overlaps += 1
+        return overlaps
@@ -0,0 +1,111 @@
+import random
+import time as timer
+from datetime import date, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+
+from appointments.models import Provider, Location, AppointmentType, Appointment
+from appointments.serializers import AppointmentSerializer, AppointmentFastSerializer
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows/s of AppointmentSerializer and AppointmentFastSerializer '
+        'on list pages, against a throwaway test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Appointments to create')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20, help='Pages rendered per path')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _seed(self, rows, rng):
+        owner = get_user_model().objects.create_user(username='bench', password='bench')
+        patients = [
+            Patient.objects.create(owner=owner, name=f'Bench Patient {i}', age=20 + i, gender='other')
+            for i in range(50)
+        ]
+        location = Location.objects.create(
+            name='Bench Clinic', address='1 Main St', city='Atlanta', state='GA', zip_code='30301'
+        )
+        appt_type = AppointmentType.objects.create(name='Bench Visit', duration_minutes=30)
+        providers = [Provider.objects.create(name=f'Bench {i}', specialty='Bench') for i in range(10)]
+
+        first_day = date.today() + timedelta(days=1)
+        appointments = []
+        for i in range(rows):
+            appointment = Appointment(
+                patient=rng.choice(patients),
+                provider=rng.choice(providers),
+                appointment_type=appt_type,
+                location=location,
+                appointment_date=first_day + timedelta(days=i // 16),
+                appointment_time=time(8 + (i % 16) // 2, (i % 2) * 30),
+                notes=f'Bench note {i}',
+            )
+            appointment.sync_bounds()
+            appointments.append(appointment)
+        Appointment.objects.bulk_create(appointments, batch_size=500)
+
+    def _measure(self, render, pages):
+        with CaptureQueriesContext(connection) as queries:
+            started = timer.perf_counter()
+            rendered = 0
+            for offset in pages:
+                rendered += len(render(offset))
+            elapsed = timer.perf_counter() - started
+        return rendered / elapsed, len(queries) / len(pages)
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        self._seed(options['rows'], rng)
+
+        size = options['page_size']
+        queryset = Appointment.objects.filter(status='scheduled').order_by('start', 'id')
+        last_page = max(options['rows'] - size, 0)
+        pages = [rng.randint(0, last_page) for _ in range(options['repeat'])]
+
+        paths = {
+            # What upcoming/past did before: no patient join, one query per row for patient fields
+            'serializer (no patient join)': lambda offset: AppointmentSerializer(
+                queryset.select_related('provider', 'appointment_type', 'location')[offset:offset + size],
+                many=True,
+            ).data,
+            'serializer': lambda offset: AppointmentSerializer(
+                queryset.select_related('provider', 'appointment_type', 'location', 'patient')[offset:offset + size],
+                many=True,
+            ).data,
+            'fast': lambda offset: AppointmentFastSerializer(
+                AppointmentFastSerializer.project(queryset)[offset:offset + size],
+                many=True,
+            ).data,
+        }
+
+        expected = [dict(row) for row in paths['serializer'](0)]
+        if paths['fast'](0) != expected:
+            self.stdout.write(self.style.ERROR('fast path output differs from AppointmentSerializer'))
+            return
+
+        self.stdout.write(
+            f"rows={options['rows']} page_size={size} pages={len(pages)} ({connection.vendor})"
+        )
+        baseline = None
+        for name, render in paths.items():
+            rate, queries = self._measure(render, pages)
+            if name == 'serializer':
+                baseline = rate
+            speedup = f' ({rate / baseline:.1f}x serializer)' if baseline and name == 'fast' else ''
+            self.stdout.write(f'{name:30} {rate:10.0f} rows/s {queries:6.1f} queries/page{speedup}')
@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.exports import APPOINTMENTS
+from mulisa_api.exports import FORMATS, ExportError, parse_bound, parse_patient_ids, write_export
+from patients.exports import VITALS
+
+EXPORTS = {
+    'vitals': VITALS,
+    'appointments': APPOINTMENTS,
+}
+
+
+class Command(BaseCommand):
+    help = 'Stream vitals or appointments to a CSV/NDJSON file (or stdout) for offline analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write; stdout when omitted')
+        parser.add_argument('--patients', help='Comma-separated patient IDs')
+        parser.add_argument('--from', dest='start', help='ISO date or datetime')
+        parser.add_argument('--to', dest='end', help='ISO date or datetime')
+
+    def handle(self, *args, **options):
+        try:
+            filters = {
+                'patient_ids': parse_patient_ids(options['patients']),
+                'start': parse_bound(options['start']),
+                'end': parse_bound(options['end'], end_of_day=True),
+            }
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        export = EXPORTS[options['dataset']]
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as stream:
+                rows = write_export(export, stream, options['format'], **filters)
+            self.stderr.write(self.style.SUCCESS(f"Exported {rows} {export.name} to {options['output']}"))
+        else:
+            rows = write_export(export, sys.stdout, options['format'], **filters)
+            self.stderr.write(f'Exported {rows} {export.name}')
@@ -1,5 +1,7 @@
+from datetime import time
+
 from django.core.management.base import BaseCommand
-from appointments.models import Provider, Location, AppointmentType
+from appointments.models import Provider, Location, AppointmentType, ProviderSchedule
 
 
 class Command(BaseCommand):
@@ -71,6 +73,18 @@ class Command(BaseCommand):
         location2.providers.add(provider2)
         self.stdout.write('Linked providers to locations')
         
+        # Weekday working hours (Mon-Fri, 9am-5pm) at each linked location
+        for location in (location1, location2):
+            for provider in location.providers.all():
+                for weekday in range(5):
+                    ProviderSchedule.objects.get_or_create(
+                        provider=provider,
+                        location=location,
+                        weekday=weekday,
+                        defaults={'start': time(9, 0), 'end': time(17, 0)}
+                    )
+        self.stdout.write('Created provider schedules')
+        
         # Create Appointment Types
         apt_type1, created = AppointmentType.objects.get_or_create(
             name='General Checkup',
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start', models.TimeField()),
+                ('end', models.TimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='appointments.location')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='appointments.provider')),
+            ],
+            options={
+                'ordering': ['provider', 'weekday', 'start'],
+                'indexes': [models.Index(fields=['provider', 'location', 'weekday'], name='appointment_provide_01156e_idx')],
+            },
+        ),
+    ]
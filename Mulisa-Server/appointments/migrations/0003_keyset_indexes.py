@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_providerschedule'),
+        ('patients', '0003_alter_patient_options'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_patient_8037cd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_provide_99fd0f_idx',
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['appointment_date', 'appointment_time', 'id'], name='appointment_appoint_341a41_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'appointment_date', 'appointment_time', 'id'], name='appointment_patient_e053ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['provider', 'appointment_date', 'appointment_time', 'id'], name='appointment_provide_9c3ba0_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_start_end(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    tz = timezone.get_default_timezone()
+    batch = []
+    rows = Appointment.objects.select_related('appointment_type').only(
+        'id', 'appointment_date', 'appointment_time', 'appointment_type__duration_minutes'
+    ).iterator(chunk_size=1000)
+    for appt in rows:
+        start = datetime.combine(appt.appointment_date, appt.appointment_time)
+        if settings.USE_TZ:
+            start = timezone.make_aware(start, tz)
+        appt.start = start
+        appt.end = start + timedelta(minutes=appt.appointment_type.duration_minutes)
+        batch.append(appt)
+        if len(batch) >= 1000:
+            Appointment.objects.bulk_update(batch, ['start', 'end'])
+            batch = []
+    if batch:
+        Appointment.objects.bulk_update(batch, ['start', 'end'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_keyset_indexes'),
+        ('patients', '0003_alter_patient_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='start',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_start_end, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['provider', 'start'], name='appt_provider_start_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['patient', 'start', 'id'], name='appt_patient_start_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'scheduled')), fields=['start', 'id'], name='appt_start_sched_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_start_end'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('providers', 'Provider'), ('patients', 'Patient')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='calendar_feed_unique')],
+            },
+        ),
+    ]
@@ -1,5 +1,11 @@
 # appointments/models.py
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import User
 from patients.models import Patient
 
@@ -44,6 +50,50 @@ class Location(models.Model):
         ordering = ['name']
 
 
+class ProviderSchedule(models.Model):
+    """Recurring weekly working hours of a provider at a location"""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    provider = models.ForeignKey(
+        Provider,
+        on_delete=models.CASCADE,
+        related_name='schedules'
+    )
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name='schedules'
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start = models.TimeField()
+    end = models.TimeField()
+    is_active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        if self.start and self.end and self.end <= self.start:
+            raise ValidationError({'end': 'End time must be after start time'})
+
+    def __str__(self):
+        return f"{self.provider} @ {self.location} {self.get_weekday_display()} {self.start}-{self.end}"
+
+    class Meta:
+        ordering = ['provider', 'weekday', 'start']
+        indexes = [
+            models.Index(fields=['provider', 'location', 'weekday']),
+        ]
+
+
 class AppointmentType(models.Model):
     """Type of appointment (checkup, consultation, etc.)"""
     name = models.CharField(max_length=200)
@@ -62,6 +112,27 @@ class AppointmentType(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def save(self, *args, **kwargs):
+        from .services import invalidation
+
+        previous = None
+        if self.pk:
+            previous = AppointmentType.objects.filter(pk=self.pk).values_list(
+                'duration_minutes', 'buffer_before_min', 'buffer_after_min'
+            ).first()
+        super().save(*args, **kwargs)
+        if previous is None or previous == (self.duration_minutes, self.buffer_before_min, self.buffer_after_min):
+            return
+        # Keep the denormalised end of existing appointments in step
+        if previous[0] != self.duration_minutes:
+            self.appointments.filter(start__isnull=False).update(
+                end=F('start') + timedelta(minutes=self.duration_minutes)
+            )
+        # Bookings of this type block different slots now, and feeds show the new end
+        invalidation.snapshots_changed(
+            self.appointments.values_list('provider_id', 'patient_id', 'appointment_date').distinct()
+        )
+    
     def __str__(self):
         return self.name
     
@@ -101,6 +172,11 @@ class Appointment(models.Model):
     appointment_date = models.DateField()
     appointment_time = models.TimeField()
     
+    # Denormalised from date/time and the type's duration (kept in sync on save)
+    # so time-range queries are a single index range scan
+    start = models.DateTimeField(null=True, editable=False)
+    end = models.DateTimeField(null=True, editable=False)
+    
     status = models.CharField(
         max_length=20, 
         choices=STATUS_CHOICES, 
@@ -114,9 +190,81 @@ class Appointment(models.Model):
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
         indexes = [
-            models.Index(fields=['patient', 'appointment_date']),
-            models.Index(fields=['provider', 'appointment_date']),
+            # Keyset pagination seeks on (appointment_date, appointment_time, id)
+            models.Index(fields=['appointment_date', 'appointment_time', 'id']),
+            models.Index(fields=['patient', 'appointment_date', 'appointment_time', 'id']),
+            models.Index(fields=['provider', 'appointment_date', 'appointment_time', 'id']),
+            # Overlap checks, upcoming feeds and calendar exports only look at live bookings
+            models.Index(
+                fields=['provider', 'start'],
+                condition=models.Q(status='scheduled'),
+                name='appt_provider_start_sched_idx',
+            ),
+            models.Index(
+                fields=['patient', 'start', 'id'],
+                condition=models.Q(status='scheduled'),
+                name='appt_patient_start_sched_idx',
+            ),
+            models.Index(
+                fields=['start', 'id'],
+                condition=models.Q(status='scheduled'),
+                name='appt_start_sched_idx',
+            ),
         ]
     
+    @staticmethod
+    def compute_bounds(appointment_date, appointment_time, duration_minutes):
+        """Timezone-aware (start, end) of a clinic wall-clock date/time."""
+        start = datetime.combine(appointment_date, appointment_time)
+        if settings.USE_TZ:
+            start = timezone.make_aware(start, timezone.get_default_timezone())
+        return start, start + timedelta(minutes=duration_minutes)
+    
+    def sync_bounds(self):
+        self.start, self.end = self.compute_bounds(
+            self.appointment_date,
+            self.appointment_time,
+            self.appointment_type.duration_minutes,
+        )
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The state caches were built from; saves invalidate it as well as the new one
+        if {'provider_id', 'patient_id', 'appointment_date'} <= set(field_names):
+            instance._loaded_snapshot = (instance.provider_id, instance.patient_id, instance.appointment_date)
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.sync_bounds()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'start', 'end'}
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.patient.user.get_full_name()} - {self.provider.name} on {self.appointment_date}"
+
+class CalendarFeed(models.Model):
+    """
+    Link version of a provider or patient calendar feed. Feed URLs are signed
+    with the version they were issued under; rotating it revokes them all.
+    """
+    KIND_CHOICES = [
+        ('providers', 'Provider'),
+        ('patients', 'Patient'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    version = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='calendar_feed_unique'),
+        ]
+
     def __str__(self):
-        return f"{self.patient.user.get_full_name()} - {self.provider.name} on {self.appointment_date}"
\ No newline at end of file
+        return f"{self.kind}/{self.object_id} v{self.version}"
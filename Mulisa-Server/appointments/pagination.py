@@ -0,0 +1,125 @@
+# appointments/pagination.py
+import base64
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class AppointmentPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class AppointmentCursorPagination(BasePagination):
+    """
+    Keyset pagination over (appointment_date, appointment_time, id), or
+    (start, id) when the queryset is ordered by ``start``.
+
+    Opt in with ``?cursor=`` (empty for the first page) or
+    ``?pagination=cursor``. Each page seeks past the last row of the previous
+    one with a range predicate on the composite indexes, with no COUNT(*) and
+    no OFFSET, so page 50 costs the same as page 1. The sort direction follows
+    the first ordering field of the queryset.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    keys = ('appointment_date', 'appointment_time', 'id')
+    start_keys = ('start', 'id')
+
+    @classmethod
+    def requested(cls, request):
+        if request is None:
+            return False
+        params = request.query_params
+        return cls.cursor_query_param in params or params.get('pagination') == 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, obj):
+        raw = '|'.join(
+            value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            for value in (
+                obj[key] if isinstance(obj, dict) else getattr(obj, key)
+                for key in self.active_keys
+            )
+        )
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token, model):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            parts = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            if len(parts) != len(self.active_keys):
+                raise ValueError(token)
+            return [
+                model._meta.get_field(key).to_python(part)
+                for key, part in zip(self.active_keys, parts)
+            ]
+        except (ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound('Invalid cursor')
+
+    def _seek(self, position):
+        """Rows strictly after ``position`` in the current sort direction."""
+        op = 'lt' if self.descending else 'gt'
+        first_key, first_value = self.active_keys[0], position[0]
+        seek = Q()
+        for i, (key, value) in enumerate(zip(self.active_keys, position)):
+            equal = dict(zip(self.active_keys[:i], position[:i]))
+            seek |= Q(**equal, **{f'{key}__{op}': value})
+        # The redundant inclusive bound on the first key lets the planner range-scan the index
+        return Q(**{f'{first_key}__{op}e': first_value}) & seek
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        self.descending = bool(ordering) and ordering[0].startswith('-')
+        self.active_keys = (
+            self.start_keys if ordering and ordering[0].lstrip('-') == 'start' else self.keys
+        )
+        prefix = '-' if self.descending else ''
+        queryset = queryset.order_by(*[prefix + key for key in self.active_keys])
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            queryset = queryset.filter(self._seek(self.decode_cursor(token, queryset.model)))
+
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
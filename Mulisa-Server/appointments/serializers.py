@@ -1,9 +1,12 @@
 # appointments/serializers.py
 from rest_framework import serializers
+from mulisa_api.metrics import TimedSerializerMixin, serializer_timer
+from mulisa_api.sparse import SparseFieldsMixin, wants
 from .models import Appointment, Provider, Location, AppointmentType
+from .services import booking
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = [
@@ -17,7 +20,7 @@ class LocationSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProviderSerializer(serializers.ModelSerializer):
+class ProviderSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     locations = LocationSerializer(many=True, read_only=True)
     
     class Meta:
@@ -31,9 +34,10 @@ class ProviderSerializer(serializers.ModelSerializer):
             'bio',
             'locations',
         ]
+        expandable_fields = ('locations',)
 
 
-class AppointmentTypeSerializer(serializers.ModelSerializer):
+class AppointmentTypeSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AppointmentType
         fields = [
@@ -45,7 +49,7 @@ class AppointmentTypeSerializer(serializers.ModelSerializer):
         ]
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     # Read-only fields for display
     provider_name = serializers.CharField(source='provider.name', read_only=True)
     provider_specialty = serializers.CharField(source='provider.specialty', read_only=True)
@@ -88,6 +92,84 @@ class AppointmentSerializer(serializers.ModelSerializer):
         if value < timezone.now().date():
             raise serializers.ValidationError("Appointment date cannot be in the past")
         return value
+    
+    def update(self, instance, validated_data):
+        """Re-check overlaps when the appointment moves"""
+        try:
+            return booking.update_appointment(instance, validated_data)
+        except booking.SlotUnavailable as e:
+            raise serializers.ValidationError({'appointment_time': str(e)})
+
+
+class AppointmentFastSerializer:
+    """
+    Read-only twin of AppointmentSerializer for list responses.
+
+    ``project`` turns a queryset into a ``.values()`` query that fetches
+    exactly the output fields (joins included), and ``data`` builds the
+    dicts directly. Dates and times still go through DRF's own fields, so
+    the JSON is identical to AppointmentSerializer's.
+    """
+    # Output name -> lookup, in AppointmentSerializer.Meta.fields order
+    FIELDS = {
+        'id': 'id',
+        'patient': 'patient_id',
+        'provider': 'provider_id',
+        'appointment_type': 'appointment_type_id',
+        'location': 'location_id',
+        'appointment_date': 'appointment_date',
+        'appointment_time': 'appointment_time',
+        'status': 'status',
+        'notes': 'notes',
+        'provider_name': 'provider__name',
+        'provider_specialty': 'provider__specialty',
+        'type_name': 'appointment_type__name',
+        'location_name': 'location__name',
+        'location_address': 'location__address',
+        'patient_name': 'patient__name',
+        'patient_age': 'patient__age',
+        'patient_gender': 'patient__gender',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    FORMATTERS = {
+        'appointment_date': serializers.DateField().to_representation,
+        'appointment_time': serializers.TimeField().to_representation,
+        'created_at': serializers.DateTimeField().to_representation,
+        'updated_at': serializers.DateTimeField().to_representation,
+    }
+    # Always fetched so keyset cursors can be built from the rows
+    EXTRA = ('id', 'appointment_date', 'appointment_time', 'start')
+
+    def __init__(self, rows, many=True, context=None):
+        self.rows = rows
+        self.many = many
+        self.names = self.selected((context or {}).get('request'))
+
+    @classmethod
+    def selected(cls, request=None):
+        """Output fields left after ?fields= (see mulisa_api.sparse)"""
+        return [name for name in cls.FIELDS if wants(request, name)]
+
+    @classmethod
+    def project(cls, queryset, request=None):
+        lookups = [cls.FIELDS[name] for name in cls.selected(request)]
+        return queryset.values(*dict.fromkeys([*lookups, *cls.EXTRA]))
+
+    def to_representation(self, row):
+        data = {}
+        for name in self.names:
+            value = row[self.FIELDS[name]]
+            formatter = self.FORMATTERS.get(name)
+            data[name] = formatter(value) if formatter is not None and value is not None else value
+        return data
+
+    @property
+    def data(self):
+        with serializer_timer():
+            if not self.many:
+                return self.to_representation(self.rows)
+            return [self.to_representation(row) for row in self.rows]
 
 
 class AppointmentCreateSerializer(serializers.ModelSerializer):
@@ -110,4 +192,77 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         from django.utils import timezone
         if value < timezone.now().date():
             raise serializers.ValidationError("Appointment date cannot be in the past")
-        return value
\ No newline at end of file
+        return value
+    
+    def create(self, validated_data):
+        """Book atomically so concurrent requests cannot double-book a provider"""
+        try:
+            return booking.book_appointment(**validated_data)
+        except booking.SlotUnavailable as e:
+            raise serializers.ValidationError({'appointment_time': str(e)})
+
+
+MAX_BULK_OPERATIONS = 500
+
+
+class BulkAppointmentOperationSerializer(serializers.Serializer):
+    """
+    One entry of a bulk request. Related objects are plain IDs here and are
+    looked up for the whole batch at once by the bulk service.
+    """
+    REQUIRED_FIELDS = {
+        'create': ['patient', 'provider', 'appointment_type', 'location', 'appointment_date', 'appointment_time'],
+        'cancel': ['id'],
+        'reschedule': ['id'],
+    }
+
+    op = serializers.ChoiceField(choices=['create', 'cancel', 'reschedule'])
+    id = serializers.IntegerField(required=False)
+    patient = serializers.IntegerField(required=False)
+    provider = serializers.IntegerField(required=False)
+    appointment_type = serializers.IntegerField(required=False)
+    location = serializers.IntegerField(required=False)
+    appointment_date = serializers.DateField(required=False)
+    appointment_time = serializers.TimeField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate_appointment_date(self, value):
+        """Ensure appointment date is not in the past"""
+        from django.utils import timezone
+        if value < timezone.now().date():
+            raise serializers.ValidationError("Appointment date cannot be in the past")
+        return value
+
+    def validate(self, attrs):
+        missing = [name for name in self.REQUIRED_FIELDS[attrs['op']] if name not in attrs]
+        if missing:
+            raise serializers.ValidationError({name: 'This field is required.' for name in missing})
+        if attrs['op'] == 'reschedule' and not {'provider', 'appointment_date', 'appointment_time'} & attrs.keys():
+            raise serializers.ValidationError(
+                'Reschedule needs at least one of provider, appointment_date, appointment_time.'
+            )
+        return attrs
+
+
+class BulkAppointmentSerializer(serializers.Serializer):
+    """
+    Envelope of a bulk request. Entries are validated one by one so a bad
+    entry is reported in its own result instead of failing the batch.
+    """
+    operations = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=MAX_BULK_OPERATIONS,
+    )
+    atomic = serializers.BooleanField(default=False)
+
+    def validated_operations(self):
+        """Validated entries, or ``{'op': ..., 'errors': ...}`` for invalid ones."""
+        operations = []
+        for raw in self.validated_data['operations']:
+            entry = BulkAppointmentOperationSerializer(data=raw)
+            if entry.is_valid():
+                operations.append(entry.validated_data)
+            else:
+                operations.append({'op': raw.get('op'), 'errors': entry.errors})
+        return operations
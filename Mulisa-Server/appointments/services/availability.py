@@ -0,0 +1,158 @@
+# appointments/services/availability.py
+"""
+Bitmap availability engine.
+
+A provider/location/day is a Python int where bit ``i`` is the ``i``-th
+SLOT_UNIT_MIN block after midnight. Working hours set bits, booked
+appointments (padded by their type's buffers) clear them, and the bookable
+starts for an appointment type fall out of a few shifts and ANDs instead of
+one lookup per candidate slot.
+
+Times are quantised to SLOT_UNIT_MIN: working hours round inward, bookings
+round outward, so a partially covered block is never offered. Anything that
+spills past midnight is clipped to the day.
+"""
+from collections import defaultdict
+
+SLOT_UNIT_MIN = 5
+UNITS_PER_DAY = 24 * 60 // SLOT_UNIT_MIN
+DAY_MASK = (1 << UNITS_PER_DAY) - 1
+
+# Offered start times are aligned to this many minutes after midnight
+SLOT_STEP_MIN = 15
+
+_step_combs = {}
+
+
+def minutes_of(t):
+    """Minutes after midnight for a ``datetime.time``."""
+    return t.hour * 60 + t.minute
+
+
+def span_mask(start_min, end_min, inward=False):
+    """
+    Bitmask covering [start_min, end_min) clipped to the day.
+    ``inward`` drops partially covered units instead of including them.
+    """
+    if inward:
+        lo = -(-start_min // SLOT_UNIT_MIN)
+        hi = end_min // SLOT_UNIT_MIN
+    else:
+        lo = start_min // SLOT_UNIT_MIN
+        hi = -(-end_min // SLOT_UNIT_MIN)
+    lo = max(lo, 0)
+    hi = min(hi, UNITS_PER_DAY)
+    if hi <= lo:
+        return 0
+    return ((1 << (hi - lo)) - 1) << lo
+
+
+def runs_of(mask, length):
+    """
+    Bits ``i`` of ``mask`` such that bits ``i .. i+length-1`` are all set.
+    Uses doubling shifts, so it costs O(log length) big-int operations.
+    """
+    result = mask
+    covered = 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        result &= result >> shift
+        covered += shift
+    return result
+
+
+def _step_comb(step_units):
+    comb = _step_combs.get(step_units)
+    if comb is None:
+        comb = 0
+        for unit in range(0, UNITS_PER_DAY, step_units):
+            comb |= 1 << unit
+        _step_combs[step_units] = comb
+    return comb
+
+
+def _set_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class DayGrid:
+    """Open and busy bitmaps for one provider at one location on one day"""
+    __slots__ = ('day', 'open', 'busy')
+
+    def __init__(self, day, open_mask=0, busy_mask=0):
+        self.day = day
+        self.open = open_mask
+        self.busy = busy_mask
+
+    def add_hours(self, start, end):
+        """Mark [start, end) working time as open."""
+        self.open |= span_mask(minutes_of(start), minutes_of(end), inward=True)
+
+    @property
+    def free(self):
+        return self.open & ~self.busy & DAY_MASK
+
+    def slot_starts(self, duration, before=0, after=0, step=SLOT_STEP_MIN):
+        """
+        Minutes after midnight at which an appointment of ``duration`` fits,
+        with its ``before``/``after`` buffers also inside free time.
+        """
+        lead = -(-before // SLOT_UNIT_MIN)
+        tail = max(-(-(duration + after) // SLOT_UNIT_MIN), 1)
+        fits = runs_of(self.free, lead + tail) << lead
+        step_units = max(step // SLOT_UNIT_MIN, 1)
+        starts = fits & _step_comb(step_units) & DAY_MASK
+        return [unit * SLOT_UNIT_MIN for unit in _set_bits(starts)]
+
+    def covers(self, start, duration, before=0, after=0):
+        """
+        Whether working hours cover an appointment of ``duration`` at
+        ``start`` together with its buffers, the rule ``slot_starts`` applies.
+        Nothing may spill past either midnight.
+        """
+        start_min = minutes_of(start)
+        lo, hi = start_min - before, start_min + duration + after
+        if lo < 0 or hi > UNITS_PER_DAY * SLOT_UNIT_MIN:
+            return False
+        return not span_mask(lo, hi) & ~self.open
+
+
+def booking_mask(start, duration, before=0, after=0):
+    """Busy mask of one booked appointment including its buffers."""
+    start_min = minutes_of(start)
+    return span_mask(start_min - before, start_min + duration + after)
+
+
+def build_grids(days, schedules, bookings):
+    """
+    Build a DayGrid per (provider_id, location_id, day).
+
+    ``schedules`` yields (provider_id, location_id, weekday, start, end) and
+    ``bookings`` yields (provider_id, date, time, duration, before, after).
+    A provider cannot be in two places at once, so a booking blocks that
+    provider's grids at every location on its day. Bookings are folded into
+    per-provider-day busy masks in a single pass.
+    """
+    by_weekday = defaultdict(list)
+    for day in days:
+        by_weekday[day.weekday()].append(day)
+
+    grids = {}
+    for provider_id, location_id, weekday, start, end in schedules:
+        for day in by_weekday.get(weekday, ()):
+            key = (provider_id, location_id, day)
+            grid = grids.get(key)
+            if grid is None:
+                grid = grids[key] = DayGrid(day)
+            grid.add_hours(start, end)
+
+    busy = defaultdict(int)
+    for provider_id, day, start, duration, before, after in bookings:
+        busy[(provider_id, day)] |= booking_mask(start, duration, before, after)
+
+    for (provider_id, _location_id, day), grid in grids.items():
+        grid.busy = busy.get((provider_id, day), 0)
+    return grids
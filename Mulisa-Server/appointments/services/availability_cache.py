@@ -0,0 +1,132 @@
+# appointments/services/availability_cache.py
+"""
+Versioned cache for computed slot grids.
+
+Entries are keyed by provider/location/date/type plus two generation
+counters: one per provider-day, bumped by appointment writes, and one per
+provider, bumped when the provider's schedule changes. A write makes the old
+key unreachable, so a stale grid is never served, and every other day keeps
+its entry.
+
+Generations start from a nanosecond timestamp rather than zero. If the
+cache evicts a counter, the new counter cannot collide with a key written
+under the old one.
+
+Schedule and appointment writes bump generations from model signals once
+their transaction commits (see ``appointments.signals``), so admin, shell
+and other workers' writes are seen too. Grids are only cached when the
+default cache is shared between processes (``mulisa_api.caching``).
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from mulisa_api import caching
+
+GRID_TIMEOUT = 60 * 60 * 24
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _count(name, amount=1):
+    if amount:
+        with _stats_lock:
+            _stats[name] += amount
+
+
+def stats():
+    """Hit/miss/invalidation counters for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _day_key(provider_id, day):
+    return f'avail:gen:{provider_id}:{day.isoformat()}'
+
+
+def _schedule_key(provider_id):
+    return f'avail:sched:{provider_id}'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate(provider_id, day):
+    """Bump the generation of one provider-day."""
+    _bump(_day_key(provider_id, day))
+    _count('invalidations')
+
+
+def invalidate_schedule(provider_id):
+    """Bump the schedule generation of a provider, dropping all of its days."""
+    _bump(_schedule_key(provider_id))
+    _count('invalidations')
+
+
+def _generations(keys):
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    for key, value in missing.items():
+        # add() keeps a concurrently initialised counter instead of clobbering it
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        found[key] = value
+    return found
+
+
+def get_grids(cells, appt_type, compute):
+    """
+    Slot start minutes for each (provider_id, location_id, day) in ``cells``.
+
+    ``compute(missing_cells)`` is called once with the cells not in cache
+    and must return {cell: [minutes]}. Its results are stored under the
+    current generations.
+    """
+    cells = list(cells)
+    if not cells:
+        return {}
+    if not caching.is_shared():
+        _count('misses', len(cells))
+        computed = compute(cells)
+        return {cell: computed.get(cell, []) for cell in cells}
+
+    day_keys = {(p, day): _day_key(p, day) for p, _l, day in cells}
+    schedule_keys = {p: _schedule_key(p) for p, _l, _day in cells}
+    gens = _generations(list(day_keys.values()) + list(schedule_keys.values()))
+
+    type_part = (
+        f'{appt_type.id}:{appt_type.duration_minutes}'
+        f'-{appt_type.buffer_before_min}-{appt_type.buffer_after_min}'
+    )
+    keys = {
+        (p, l, day): (
+            f'avail:slots:{p}:{l}:{day.isoformat()}:{type_part}'
+            f':{gens[schedule_keys[p]]}:{gens[day_keys[(p, day)]]}'
+        )
+        for p, l, day in cells
+    }
+
+    cached = cache.get_many(list(keys.values()))
+    result = {}
+    missing = []
+    for cell, key in keys.items():
+        if key in cached:
+            result[cell] = cached[key]
+        else:
+            missing.append(cell)
+
+    _count('hits', len(result))
+    _count('misses', len(missing))
+
+    if missing:
+        computed = compute(missing)
+        cache.set_many({keys[cell]: computed.get(cell, []) for cell in missing}, GRID_TIMEOUT)
+        for cell in missing:
+            result[cell] = computed.get(cell, [])
+    return result
@@ -0,0 +1,233 @@
+# appointments/services/booking.py
+"""
+Race-free booking.
+
+Every write that can occupy a provider's time runs inside
+``provider_day_lock``. The lock serialises writers for one provider on one
+date and nothing else, so bookings for other providers or days run in
+parallel. Inside the lock a single query checks the padded interval
+(duration plus type buffers) against the provider's scheduled
+appointments before the row is written.
+
+The padded interval must also lie inside the provider's working hours at
+the location, the same rule slotting uses to offer a start time.
+
+PostgreSQL uses transaction-scoped advisory locks, so the guarantee holds
+across processes. Other backends (SQLite in local dev) fall back to
+in-process locks, which only protect a single worker.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Value
+
+from ..models import Appointment, AppointmentType, ProviderSchedule
+from .availability import DayGrid, minutes_of
+
+# Changing any of these can make an appointment collide with another one
+# or fall outside working hours
+SCHEDULING_FIELDS = {
+    'provider',
+    'location',
+    'appointment_type',
+    'appointment_date',
+    'appointment_time',
+    'status',
+}
+
+# No appointment plus its buffers spans longer than this
+MAX_BOOKING_SPAN = timedelta(days=1)
+MINUTE = Value(timedelta(minutes=1), output_field=DurationField())
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+class SlotUnavailable(Exception):
+    """The requested time overlaps another appointment or falls outside working hours."""
+
+
+def _local_lock(key):
+    with _local_locks_guard:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def provider_day_lock(keys):
+    """
+    Open a transaction holding exclusive locks on the given
+    (provider_id, date) keys. Keys are taken in sorted order so concurrent
+    multi-day writers cannot deadlock.
+    """
+    keys = sorted(set(keys))
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for provider_id, day in keys:
+                    cursor.execute(
+                        'SELECT pg_advisory_xact_lock(%s, %s)',
+                        [int(provider_id) & 0x7FFFFFFF, day.toordinal()],
+                    )
+            yield
+        return
+
+    locks = [_local_lock(key) for key in keys]
+    for lock in locks:
+        lock.acquire()
+    try:
+        with transaction.atomic():
+            yield
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+
+def padded_interval(start, duration, before=0, after=0):
+    """[start, end) in minutes after midnight, including buffers."""
+    start_min = minutes_of(start)
+    return start_min - before, start_min + duration + after
+
+
+def _minutes(field):
+    return ExpressionWrapper(F(field) * MINUTE, output_field=DurationField())
+
+
+def find_conflict(provider_id, day, start, appt_type, exclude_id=None):
+    """
+    ID of a scheduled appointment overlapping the padded interval of a new
+    ``appt_type`` booking at ``start``, or None.
+
+    One query: the bounds on ``start`` make it a range scan of the
+    (provider, start) WHERE status='scheduled' index, and the exact
+    buffer-aware overlap test runs on that handful of rows.
+    """
+    new_start, new_end = Appointment.compute_bounds(day, start, appt_type.duration_minutes)
+    new_start -= timedelta(minutes=appt_type.buffer_before_min)
+    new_end += timedelta(minutes=appt_type.buffer_after_min)
+
+    return Appointment.objects.filter(
+        provider_id=provider_id,
+        status='scheduled',
+        start__gt=new_start - MAX_BOOKING_SPAN,
+        start__lt=new_end + MAX_BOOKING_SPAN,
+    ).exclude(pk=exclude_id).alias(
+        blocked_start=F('start') - _minutes('appointment_type__buffer_before_min'),
+        blocked_end=F('end') + _minutes('appointment_type__buffer_after_min'),
+    ).filter(
+        blocked_start__lt=new_end,
+        blocked_end__gt=new_start,
+    ).order_by().values_list('id', flat=True).first()
+
+
+def _ensure_free(provider_id, day, start, appt_type, exclude_id=None):
+    conflict = find_conflict(provider_id, day, start, appt_type, exclude_id)
+    if conflict is not None:
+        raise SlotUnavailable(
+            f"Provider already has appointment {conflict} overlapping {day} {start:%H:%M}"
+        )
+
+
+def working_hours(keys):
+    """
+    DayGrid of the active working hours for each
+    (provider_id, location_id, weekday) in ``keys`` that has any, from one
+    query.
+    """
+    keys = set(keys)
+    grids = {}
+    if not keys:
+        return grids
+    rows = ProviderSchedule.objects.filter(
+        provider_id__in={provider_id for provider_id, _, _ in keys},
+        location_id__in={location_id for _, location_id, _ in keys},
+        weekday__in={weekday for _, _, weekday in keys},
+        is_active=True,
+    ).values_list('provider_id', 'location_id', 'weekday', 'start', 'end')
+    for provider_id, location_id, weekday, start, end in rows:
+        key = (provider_id, location_id, weekday)
+        if key in keys:
+            grid = grids.get(key)
+            if grid is None:
+                grid = grids[key] = DayGrid(None)
+            grid.add_hours(start, end)
+    return grids
+
+
+def outside_hours(grids, provider_id, location_id, day, start, appt_type):
+    """Error message if the padded booking is not inside working hours, else None."""
+    grid = grids.get((provider_id, location_id, day.weekday()))
+    if grid is None or not grid.covers(
+        start,
+        appt_type.duration_minutes,
+        appt_type.buffer_before_min,
+        appt_type.buffer_after_min,
+    ):
+        return f"{day} {start:%H:%M} is outside the provider's working hours at this location"
+    return None
+
+
+def _ensure_working_hours(provider_id, location_id, day, start, appt_type):
+    grids = working_hours([(provider_id, location_id, day.weekday())])
+    message = outside_hours(grids, provider_id, location_id, day, start, appt_type)
+    if message is not None:
+        raise SlotUnavailable(message)
+
+
+def _appointment_type(value):
+    if isinstance(value, AppointmentType):
+        return value
+    return AppointmentType.objects.get(pk=value)
+
+
+def book_appointment(**fields):
+    """
+    Create a scheduled appointment unless it falls outside working hours
+    or overlaps another one.
+    """
+    appt_type = _appointment_type(fields['appointment_type'])
+    provider_id = fields['provider'].pk if 'provider' in fields else fields['provider_id']
+    location_id = fields['location'].pk if 'location' in fields else fields['location_id']
+    day = fields['appointment_date']
+
+    with provider_day_lock([(provider_id, day)]):
+        if fields.get('status', 'scheduled') == 'scheduled':
+            _ensure_working_hours(provider_id, location_id, day, fields['appointment_time'], appt_type)
+            _ensure_free(provider_id, day, fields['appointment_time'], appt_type)
+        return Appointment.objects.create(**fields)
+
+
+def update_appointment(instance, changes):
+    """
+    Apply ``changes`` to ``instance``. If the result is a scheduled
+    appointment, re-check working hours and overlaps on its (possibly new)
+    provider-day.
+    """
+    for attr, value in changes.items():
+        setattr(instance, attr, value)
+
+    if instance.status != 'scheduled' or not SCHEDULING_FIELDS & changes.keys():
+        instance.save()
+        return instance
+
+    with provider_day_lock([(instance.provider_id, instance.appointment_date)]):
+        _ensure_working_hours(
+            instance.provider_id,
+            instance.location_id,
+            instance.appointment_date,
+            instance.appointment_time,
+            instance.appointment_type,
+        )
+        _ensure_free(
+            instance.provider_id,
+            instance.appointment_date,
+            instance.appointment_time,
+            instance.appointment_type,
+            exclude_id=instance.pk,
+        )
+        instance.save()
+    return instance
@@ -0,0 +1,264 @@
+# appointments/services/bulk.py
+"""
+Batch create / cancel / reschedule.
+
+A batch is checked as a whole: referenced appointments and related objects
+are loaded with one query per table, every provider-day that gains a
+booking is locked (see ``booking.provider_day_lock``), and the scheduled
+appointments of those days are read once. Overlaps are then tested in
+memory, against the database rows and against earlier entries of the same
+batch. Working hours are loaded with one more query and checked the same
+way, and the survivors are written with ``bulk_create``/``bulk_update`` in
+the same transaction.
+
+Entries are applied in order, so "cancel 12, then book its slot" works.
+With ``atomic=True`` a single failing entry cancels the whole batch and the
+other entries are reported as skipped.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from patients.models import Patient
+from ..models import Appointment, AppointmentType, Location, Provider
+from . import invalidation
+from .booking import outside_hours, provider_day_lock, working_hours
+
+UPDATE_FIELDS = [
+    'provider',
+    'appointment_date',
+    'appointment_time',
+    'status',
+    'start',
+    'end',
+    'updated_at',
+]
+WRITE_BATCH_SIZE = 200
+
+RELATED = {
+    'patient': Patient,
+    'provider': Provider,
+    'appointment_type': AppointmentType,
+    'location': Location,
+}
+
+
+def _padded(start, end, appt_type):
+    return (
+        start - timedelta(minutes=appt_type.buffer_before_min),
+        end + timedelta(minutes=appt_type.buffer_after_min),
+    )
+
+
+class _Calendar:
+    """Padded intervals of each provider's scheduled appointments in the batch window."""
+
+    def __init__(self, keys):
+        self.busy = {}
+        if not keys:
+            return
+        days = [day for _provider_id, day in keys]
+        rows = Appointment.objects.filter(
+            provider_id__in={provider_id for provider_id, _day in keys},
+            status='scheduled',
+            # One day either side catches appointments that spill over midnight
+            appointment_date__range=(min(days) - timedelta(days=1), max(days) + timedelta(days=1)),
+            start__isnull=False,
+        ).values_list(
+            'id',
+            'provider_id',
+            'start',
+            'end',
+            'appointment_type__buffer_before_min',
+            'appointment_type__buffer_after_min',
+        )
+        for pk, provider_id, start, end, before, after in rows:
+            self.busy.setdefault(provider_id, {})[pk] = (
+                start - timedelta(minutes=before),
+                end + timedelta(minutes=after),
+            )
+
+    def conflict(self, provider_id, interval, ignore=None):
+        start, end = interval
+        for key, (busy_start, busy_end) in self.busy.get(provider_id, {}).items():
+            if key != ignore and busy_start < end and start < busy_end:
+                return key
+        return None
+
+    def add(self, provider_id, key, interval):
+        self.busy.setdefault(provider_id, {})[key] = interval
+
+    def remove(self, provider_id, key):
+        self.busy.get(provider_id, {}).pop(key, None)
+
+
+def _describe(key):
+    if isinstance(key, tuple):
+        return f'operation {key[1]} of this batch'
+    return f'appointment {key}'
+
+
+def _ok(index, op, appointment):
+    return {'index': index, 'op': op, 'status': 'ok', 'id': appointment.pk}
+
+
+def _error(index, op, errors):
+    return {'index': index, 'op': op, 'status': 'error', 'errors': errors}
+
+
+def apply_operations(operations, atomic=False):
+    """
+    Apply a list of entries from ``BulkAppointmentSerializer.validated_operations``.
+
+    Returns ``(results, applied)``: one result per entry, in request order,
+    and whether anything was written.
+    """
+    valid = [(index, entry) for index, entry in enumerate(operations) if 'errors' not in entry]
+
+    existing = Appointment.objects.select_related('appointment_type').in_bulk(
+        {entry['id'] for _index, entry in valid if 'id' in entry}
+    )
+    related = {}
+    for name, model in RELATED.items():
+        wanted = {entry[name] for _index, entry in valid if name in entry}
+        related[name] = model.objects.in_bulk(wanted) if wanted else {}
+
+    # Provider-days that may gain a booking are the ones to lock
+    keys = set()
+    hours_keys = set()
+    for _index, entry in valid:
+        if entry['op'] == 'create':
+            keys.add((entry['provider'], entry['appointment_date']))
+            hours_keys.add((entry['provider'], entry['location'], entry['appointment_date'].weekday()))
+        elif entry['op'] == 'reschedule' and entry['id'] in existing:
+            appointment = existing[entry['id']]
+            provider_id = entry.get('provider', appointment.provider_id)
+            day = entry.get('appointment_date', appointment.appointment_date)
+            keys.add((provider_id, day))
+            hours_keys.add((provider_id, appointment.location_id, day.weekday()))
+
+    results = [None] * len(operations)
+    for index, entry in enumerate(operations):
+        if 'errors' in entry:
+            results[index] = _error(index, entry.get('op'), entry['errors'])
+
+    touched = set()
+    with provider_day_lock(keys):
+        calendar = _Calendar(keys)
+        hours = working_hours(hours_keys)
+        to_create = []
+        to_update = {}
+
+        for index, entry in valid:
+            op = entry['op']
+            missing = {
+                name: f'Invalid pk "{entry[name]}" - object does not exist.'
+                for name in RELATED
+                if name in entry and entry[name] not in related[name]
+            }
+            if missing:
+                results[index] = _error(index, op, missing)
+                continue
+
+            if op == 'create':
+                appointment = Appointment(
+                    patient=related['patient'][entry['patient']],
+                    provider=related['provider'][entry['provider']],
+                    appointment_type=related['appointment_type'][entry['appointment_type']],
+                    location=related['location'][entry['location']],
+                    appointment_date=entry['appointment_date'],
+                    appointment_time=entry['appointment_time'],
+                    notes=entry.get('notes'),
+                    status='scheduled',
+                )
+                message = outside_hours(
+                    hours,
+                    appointment.provider_id,
+                    appointment.location_id,
+                    appointment.appointment_date,
+                    appointment.appointment_time,
+                    appointment.appointment_type,
+                )
+                if message is not None:
+                    results[index] = _error(index, op, {'appointment_time': message})
+                    continue
+                appointment.sync_bounds()
+                interval = _padded(appointment.start, appointment.end, appointment.appointment_type)
+                conflict = calendar.conflict(appointment.provider_id, interval)
+                if conflict is not None:
+                    results[index] = _error(index, op, {
+                        'appointment_time': f'Provider already has {_describe(conflict)} overlapping '
+                                            f'{appointment.appointment_date} {appointment.appointment_time:%H:%M}'
+                    })
+                    continue
+                calendar.add(appointment.provider_id, ('op', index), interval)
+                to_create.append((index, appointment))
+                results[index] = _ok(index, op, appointment)
+                continue
+
+            appointment = existing.get(entry['id'])
+            if appointment is None:
+                results[index] = _error(index, op, {'id': 'Appointment not found.'})
+                continue
+
+            if op == 'cancel':
+                if appointment.status == 'cancelled':
+                    results[index] = _error(index, op, {'status': 'Appointment is already cancelled'})
+                    continue
+                calendar.remove(appointment.provider_id, appointment.pk)
+                touched.add(invalidation.snapshot(appointment))
+                appointment.status = 'cancelled'
+            else:
+                if appointment.status != 'scheduled':
+                    results[index] = _error(index, op, {'status': 'Only scheduled appointments can be rescheduled'})
+                    continue
+                provider = related['provider'].get(entry.get('provider'), appointment.provider)
+                day = entry.get('appointment_date', appointment.appointment_date)
+                at = entry.get('appointment_time', appointment.appointment_time)
+                message = outside_hours(
+                    hours, provider.pk, appointment.location_id, day, at, appointment.appointment_type
+                )
+                if message is not None:
+                    results[index] = _error(index, op, {'appointment_time': message})
+                    continue
+                start, end = Appointment.compute_bounds(day, at, appointment.appointment_type.duration_minutes)
+                interval = _padded(start, end, appointment.appointment_type)
+                conflict = calendar.conflict(provider.pk, interval, ignore=appointment.pk)
+                if conflict is not None:
+                    results[index] = _error(index, op, {
+                        'appointment_time': f'Provider already has {_describe(conflict)} overlapping {day} {at:%H:%M}'
+                    })
+                    continue
+                calendar.remove(appointment.provider_id, appointment.pk)
+                touched.add(invalidation.snapshot(appointment))
+                appointment.provider = provider
+                appointment.appointment_date = day
+                appointment.appointment_time = at
+                appointment.start, appointment.end = start, end
+                calendar.add(provider.pk, appointment.pk, interval)
+
+            to_update[appointment.pk] = appointment
+            results[index] = _ok(index, op, appointment)
+
+        failed = any(result['status'] == 'error' for result in results)
+        if atomic and failed:
+            for result in results:
+                if result['status'] == 'ok':
+                    result.update(status='skipped', id=None)
+            return results, False
+
+        Appointment.objects.bulk_create(
+            [appointment for _index, appointment in to_create], batch_size=WRITE_BATCH_SIZE
+        )
+        now = timezone.now()
+        for appointment in to_update.values():
+            appointment.updated_at = now
+        Appointment.objects.bulk_update(list(to_update.values()), UPDATE_FIELDS, batch_size=WRITE_BATCH_SIZE)
+
+    for index, appointment in to_create:
+        results[index]['id'] = appointment.pk
+    touched.update(invalidation.snapshot(appointment) for _index, appointment in to_create)
+    touched.update(invalidation.snapshot(appointment) for appointment in to_update.values())
+    # bulk_create/bulk_update send no signals
+    invalidation.snapshots_changed(touched)
+    return results, bool(to_create or to_update)
@@ -1,27 +1,158 @@
 # appointments/services/ics.py
+"""
+iCalendar rendering.
+
+``generate_ics`` renders a single appointment. ``iter_calendar`` streams a
+whole feed: it walks the queryset in chunks and yields the VEVENTs chunk
+by chunk, so memory use does not grow with the size of the calendar.
+
+Feeds are versioned through the cache. Every appointment write bumps the
+version of the provider's and the patient's feed (see
+``services.invalidation``), so an unchanged feed can answer
+``If-None-Match`` with a 304 without querying the appointment table.
+Renaming a provider, location, appointment type or patient bumps the feeds
+that show the name (``appointments.signals``). Versions are only used when
+the default cache is shared between processes
+(``mulisa_api.caching``); otherwise feeds carry no ETag and are always
+rendered.
+"""
+import uuid
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from mulisa_api import caching
+
+PRODID = "-//Mulisa//Appointments 1.0//EN"
+FEED_CHUNK_SIZE = 500
+# Feeds list scheduled appointments from this long ago onwards
+FEED_HISTORY = timedelta(days=30)
+
+FEED_FIELDS = (
+    "id",
+    "start",
+    "end",
+    "updated_at",
+    "notes",
+    "appointment_type__name",
+    "provider__name",
+    "location__name",
+    "location__address",
+)
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _escape(text):
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Fold content lines longer than 75 octets (RFC 5545 3.1)."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while len(encoded) > limit:
+        cut = limit
+        # Never split a multi-byte character
+        while (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        # Continuation lines start with a space, which counts towards the limit
+        limit = 74
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def vevent(row):
+    """One VEVENT from a dict of FEED_FIELDS values."""
+    summary = f"{row['appointment_type__name']} with Dr. {row['provider__name']}"
+    location = ", ".join(filter(None, (row["location__name"], row["location__address"])))
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{row['id']}@mulisa",
+        f"DTSTAMP:{_utc(row['updated_at'])}",
+        f"DTSTART:{_utc(row['start'])}",
+        f"DTEND:{_utc(row['end'])}",
+        f"SUMMARY:{_escape(summary)}",
+        f"LOCATION:{_escape(location)}",
+        f"DESCRIPTION:{_escape((row['notes'] or '')[:500])}",
+        "END:VEVENT",
+    ]
+    return "".join(_fold(line) for line in lines)
+
+
 def generate_ics(appt) -> str:
     """
     Minimal ICS content for calendar add.
     """
-    uid = f"{appt.id}@mulisa"
-    summary = f"{appt.type.name} with provider {appt.provider_id}"
-    tz = appt.timezone_str
-    # using UTC for simplicity; clients can convert
-    start = appt.start.strftime("%Y%m%dT%H%M%SZ")
-    end = appt.end.strftime("%Y%m%dT%H%M%SZ")
-    desc = (appt.notes_patient or "")[:500].replace("\n", "\\n")
-
+    row = {
+        "id": appt.id,
+        "start": appt.start,
+        "end": appt.end,
+        "updated_at": appt.updated_at or timezone.now(),
+        "notes": appt.notes,
+        "appointment_type__name": appt.appointment_type.name,
+        "provider__name": appt.provider.name,
+        "location__name": appt.location.name,
+        "location__address": appt.location.address,
+    }
     return (
         "BEGIN:VCALENDAR\r\n"
         "VERSION:2.0\r\n"
-        "PRODID:-//Mulisa//Appointments 1.0//EN\r\n"
-        "BEGIN:VEVENT\r\n"
-        f"UID:{uid}\r\n"
-        f"DTSTAMP:{start}\r\n"
-        f"DTSTART:{start}\r\n"
-        f"DTEND:{end}\r\n"
-        f"SUMMARY:{summary}\r\n"
-        f"DESCRIPTION:{desc}\r\n"
-        "END:VEVENT\r\n"
-        "END:VCALENDAR\r\n"
+        f"PRODID:{PRODID}\r\n"
+        + vevent(row)
+        + "END:VCALENDAR\r\n"
     )
+
+
+def iter_calendar(queryset, name):
+    """Yield a VCALENDAR for ``queryset`` one chunk of events at a time."""
+    yield (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        f"PRODID:{PRODID}\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+        "METHOD:PUBLISH\r\n"
+        + _fold(f"X-WR-CALNAME:{_escape(name)}")
+    )
+    batch = []
+    for row in queryset.values(*FEED_FIELDS).iterator(chunk_size=FEED_CHUNK_SIZE):
+        batch.append(vevent(row))
+        if len(batch) >= FEED_CHUNK_SIZE:
+            yield "".join(batch)
+            batch = []
+    batch.append("END:VCALENDAR\r\n")
+    yield "".join(batch)
+
+
+def _feed_key(kind, object_id):
+    return f"ics:feed:{kind}:{object_id}"
+
+
+def feed_version(kind, object_id):
+    """Opaque version of a provider or patient feed, created on first use (None when off)."""
+    if not caching.is_shared():
+        return None
+    key = _feed_key(kind, object_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_feed(kind, object_id):
+    cache.set(_feed_key(kind, object_id), uuid.uuid4().hex, None)
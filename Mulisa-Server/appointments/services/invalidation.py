@@ -0,0 +1,77 @@
+# appointments/services/invalidation.py
+"""
+Single place that knows what to invalidate when an appointment is written.
+
+Saves and deletes call ``appointment_changed`` from a post_save/post_delete
+receiver (``appointments.signals``), whichever code path made them. The
+appointment's state when it was loaded (``Appointment.from_db``) is passed
+along, so the provider-day and feeds it left are invalidated as well as the
+ones it moved to. Batch writers that bypass signals collect snapshots and
+call ``snapshots_changed`` once, so each provider-day and feed is bumped a
+single time. Writes to the rows a feed's events are rendered from (the
+provider, location, type and patient names) bump just the feeds through
+``feeds_changed``.
+
+Bumps run once the surrounding transaction commits; before that, a
+concurrent reader could re-cache the old state under the new version.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from mulisa_api import caching
+from patients import chart
+
+from . import availability_cache, ics
+
+
+def snapshot(appointment):
+    return (appointment.provider_id, appointment.patient_id, appointment.appointment_date)
+
+
+def appointment_changed(appointment, before=None):
+    touched = {snapshot(appointment)}
+    if before is not None:
+        touched.add(before)
+    snapshots_changed(touched)
+
+
+def snapshots_changed(touched):
+    touched = set(touched)
+    transaction.on_commit(lambda: _bump(touched))
+
+
+def _bump(touched):
+    days = {(provider_id, day) for provider_id, _patient_id, day in touched}
+    for provider_id, day in days:
+        availability_cache.invalidate(provider_id, day)
+    patient_ids = {patient_id for _, patient_id, _ in touched}
+    _bump_feeds({provider_id for provider_id, _, _ in touched}, patient_ids)
+    # Bulk writes skip the post_save signal that normally refreshes charts
+    chart.bump(*patient_ids)
+
+
+def feeds_changed(appointments=None, provider_ids=(), patient_ids=()):
+    """
+    Bump the provider and patient feeds listing any of ``appointments`` (a
+    queryset), plus the feeds of ``provider_ids`` and ``patient_ids``.
+    """
+    if not caching.is_shared():
+        # Feeds carry no version to bump
+        return
+    provider_ids, patient_ids = set(provider_ids), set(patient_ids)
+    if appointments is not None:
+        listed = appointments.filter(
+            status='scheduled',
+            start__gte=timezone.now() - ics.FEED_HISTORY,
+        ).order_by().values_list('provider_id', 'patient_id').distinct()
+        for provider_id, patient_id in listed:
+            provider_ids.add(provider_id)
+            patient_ids.add(patient_id)
+    transaction.on_commit(lambda: _bump_feeds(provider_ids, patient_ids))
+
+
+def _bump_feeds(provider_ids, patient_ids):
+    for provider_id in provider_ids:
+        ics.bump_feed('provider', provider_id)
+    for patient_id in patient_ids:
+        ics.bump_feed('patient', patient_id)
@@ -1,9 +1,171 @@
 # appointments/services/slotting.py
-from datetime import datetime, time
-from ..models import Provider, Location, AppointmentType, ProviderSchedule
-from ..utils import generate_slots_for_range
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from ..models import Provider, Location, AppointmentType, ProviderSchedule, Appointment
+from . import availability_cache
+from .availability import build_grids
+
+
+def _local_naive(value, end_of_day=False):
+    """Appointments store clinic wall-clock date/time, so compare in local naive time."""
+    if not isinstance(value, datetime):
+        return datetime.combine(value, time.max if end_of_day else time.min)
+    if timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def days_between(first, last):
+    day = first
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def load_grids(provider_ids, location_ids, first_day, last_day):
+    """
+    Load schedules and scheduled appointments for the given providers,
+    locations and days in two set-based queries and build their DayGrids.
+    """
+    schedules = ProviderSchedule.objects.filter(
+        provider_id__in=provider_ids,
+        location_id__in=location_ids,
+        is_active=True,
+    ).values_list('provider_id', 'location_id', 'weekday', 'start', 'end')
+
+    bookings = Appointment.objects.filter(
+        provider_id__in=provider_ids,
+        appointment_date__range=(first_day, last_day),
+        status='scheduled',
+    ).order_by().values_list(
+        'provider_id',
+        'appointment_date',
+        'appointment_time',
+        'appointment_type__duration_minutes',
+        'appointment_type__buffer_before_min',
+        'appointment_type__buffer_after_min',
+    )
+
+    return build_grids(days_between(first_day, last_day), schedules, bookings)
+
+
+def slot_minutes(pairs, first_day, last_day, appt_type):
+    """
+    Slot start minutes per (provider_id, location_id, day) for ``appt_type``,
+    served from the availability cache. All misses are computed together
+    with a single ``load_grids`` call.
+    """
+    days = list(days_between(first_day, last_day))
+    cells = [(provider_id, location_id, day) for provider_id, location_id in pairs for day in days]
+
+    def compute(missing):
+        grids = load_grids(
+            {provider_id for provider_id, _, _ in missing},
+            {location_id for _, location_id, _ in missing},
+            min(day for _, _, day in missing),
+            max(day for _, _, day in missing),
+        )
+        return {
+            cell: grids[cell].slot_starts(
+                appt_type.duration_minutes,
+                appt_type.buffer_before_min,
+                appt_type.buffer_after_min,
+            )
+            for cell in missing if cell in grids
+        }
+
+    return availability_cache.get_grids(cells, appt_type, compute)
+
+
+def grid_slots(day, minutes, appt_type, start_dt=None, end_dt=None):
+    """Bookable slots on ``day`` for ``appt_type`` within [start_dt, end_dt]."""
+    duration = timedelta(minutes=appt_type.duration_minutes)
+    slots = []
+    for minute in minutes:
+        start = datetime.combine(day, time(minute // 60, minute % 60))
+        end = start + duration
+        if start_dt and start < start_dt:
+            continue
+        if end_dt and end > end_dt:
+            break
+        slots.append({
+            "date": day.isoformat(),
+            "start": start.strftime("%H:%M"),
+            "end": end.strftime("%H:%M"),
+        })
+    return slots
+
+
+def _slot_stream(minutes, provider_id, location_id, first_day, last_day, appt_type, start_dt, end_dt):
+    """Chronological (sort_key, slot) pairs for one provider/location."""
+    for day in days_between(first_day, last_day):
+        day_minutes = minutes.get((provider_id, location_id, day))
+        if not day_minutes:
+            continue
+        for slot in grid_slots(day, day_minutes, appt_type, start_dt, end_dt):
+            yield (slot["date"], slot["start"], provider_id, location_id), slot
+
+
+def search_slots(appt_type, start_dt, end_dt, specialty=None, location_ids=None, limit=10):
+    """
+    Earliest ``limit`` open slots for ``appt_type`` across every provider
+    matching ``specialty`` at any of ``location_ids``.
+
+    Runs a fixed number of queries however many providers or days match:
+    one for provider/location pairs, then the two in ``load_grids`` for
+    whatever the availability cache is missing. Each
+    pair yields its slots in order and a heap merges the streams, so only
+    as many slots are built as it takes to fill ``limit``.
+    """
+    start_dt = _local_naive(start_dt)
+    end_dt = _local_naive(end_dt, end_of_day=True)
+    first_day = start_dt.date()
+    last_day = end_dt.date()
+
+    pairs = Location.providers.through.objects.all()
+    if specialty:
+        pairs = pairs.filter(provider__specialty__iexact=specialty)
+    if location_ids:
+        pairs = pairs.filter(location_id__in=location_ids)
+    pairs = list(pairs.values_list(
+        'provider_id', 'location_id', 'provider__name', 'location__name'
+    ))
+    if not pairs:
+        return []
+
+    minutes = slot_minutes(
+        [(provider_id, location_id) for provider_id, location_id, _, _ in pairs],
+        first_day,
+        last_day,
+        appt_type,
+    )
+
+    names = {}
+    streams = []
+    for provider_id, location_id, provider_name, location_name in pairs:
+        names[(provider_id, location_id)] = (provider_name, location_name)
+        streams.append(_slot_stream(
+            minutes, provider_id, location_id, first_day, last_day, appt_type, start_dt, end_dt
+        ))
+
+    results = []
+    merged = heapq.merge(*streams, key=lambda item: item[0])
+    for (_date, _start, provider_id, location_id), slot in islice(merged, limit):
+        provider_name, location_name = names[(provider_id, location_id)]
+        results.append({
+            "provider_id": provider_id,
+            "provider_name": provider_name,
+            "location_id": location_id,
+            "location_name": location_name,
+            **slot,
+        })
+    return results
+
 
-# appointments/services/slotting.py
 def get_slots(provider_id, location_id, type_id, start_dt, end_dt):
     """
     Fetch available slots for a given provider/location/type in a time range.
@@ -14,45 +176,34 @@ def get_slots(provider_id, location_id, type_id, start_dt, end_dt):
         appt_type = AppointmentType.objects.get(id=type_id)
     except (Provider.DoesNotExist, Location.DoesNotExist, AppointmentType.DoesNotExist) as e:
         return {"error": str(e), "slots": []}
+    except (ValueError, TypeError):
+        return {"error": "provider, location_id and type_id must be integer IDs", "slots": []}
 
     # Check if provider works at this location
-    if location not in provider.locations.all():
+    if not provider.locations.filter(pk=location.pk).exists():
         return {"error": "Provider does not work at this location", "slots": []}
 
-    # Get the provider's schedule for the requested date
-    weekday = start_dt.weekday()  # 0=Monday, 6=Sunday
-    
-    schedule = ProviderSchedule.objects.filter(
-        provider=provider,
-        location=location,
-        weekday=weekday,  # Changed from day_of_week
-        is_active=True
-    ).first()
-
-    # If no schedule found, return empty slots
-    if not schedule:
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        return {
-            "provider_id": str(provider_id),
-            "location_id": str(location_id),
-            "type_id": type_id,
-            "slots": [],
-            "message": f"No schedule found for this provider on {days[weekday]}"
-        }
+    start_dt = _local_naive(start_dt)
+    end_dt = _local_naive(end_dt, end_of_day=True)
+    first_day = start_dt.date()
+    last_day = end_dt.date()
 
-    slots = generate_slots_for_range(
-        provider=provider,
-        location=location,
-        appt_type=appt_type,
-        start_dt=start_dt,
-        end_dt=end_dt,
-        work_start=schedule.start,  # Changed from start_time
-        work_end=schedule.end,  # Changed from end_time
-    )
+    minutes = slot_minutes([(provider.id, location.id)], first_day, last_day, appt_type)
+    slots = [
+        slot for _key, slot in _slot_stream(
+            minutes, provider.id, location.id, first_day, last_day, appt_type, start_dt, end_dt
+        )
+    ]
 
-    return {
+    result = {
         "provider_id": str(provider_id),
         "location_id": str(location_id),
         "type_id": type_id,
         "slots": slots,
-    }
\ No newline at end of file
+    }
+    # Say why instead of returning a bare empty list
+    if not slots:
+        result["message"] = (
+            f"No open slots for this provider between {first_day} and {last_day}"
+        )
+    return result
@@ -0,0 +1,40 @@
+# appointments/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from patients.models import Patient
+from .models import Appointment, AppointmentType, Location, Provider, ProviderSchedule
+from .services import availability_cache, invalidation
+
+
+@receiver([post_save, post_delete], sender=ProviderSchedule)
+def schedule_changed(sender, instance, **kwargs):
+    # After commit, so a concurrent reader cannot re-cache the old schedule
+    provider_id = instance.provider_id
+    transaction.on_commit(lambda: availability_cache.invalidate_schedule(provider_id))
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    invalidation.appointment_changed(instance, getattr(instance, '_loaded_snapshot', None))
+    instance._loaded_snapshot = invalidation.snapshot(instance)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=AppointmentType)
+def event_details_changed(sender, instance, **kwargs):
+    # Names and addresses are part of every event that refers to them
+    invalidation.feeds_changed(instance.appointments.all())
+
+
+@receiver(post_save, sender=Provider)
+def provider_changed(sender, instance, **kwargs):
+    # Also in the provider's own calendar name
+    invalidation.feeds_changed(instance.appointments.all(), provider_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Patient)
+def patient_changed(sender, instance, **kwargs):
+    # Only the patient's own calendar name shows it
+    invalidation.feeds_changed(patient_ids=[instance.pk])
@@ -0,0 +1,412 @@
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from appointments.models import Appointment, AppointmentType, Location, Provider, ProviderSchedule
+from appointments.services import booking, bulk, ics
+from patients.models import Patient
+
+
+def next_monday():
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+class ClinicTestData:
+    """One provider working Monday 09:00-12:00 at one clinic, and a padded visit type."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        cls.patient = Patient.objects.create(owner=cls.staff, name='Ada', age=40, gender='female')
+        cls.provider = Provider.objects.create(name='Dr Who', specialty='General')
+        cls.location = Location.objects.create(
+            name='Main Clinic', address='1 Main St', city='Atlanta', state='GA', zip_code='30301'
+        )
+        cls.location.providers.add(cls.provider)
+        cls.visit = AppointmentType.objects.create(
+            name='Visit', duration_minutes=30, buffer_before_min=10, buffer_after_min=5
+        )
+        cls.day = next_monday()
+        ProviderSchedule.objects.create(
+            provider=cls.provider, location=cls.location, weekday=0, start=time(9), end=time(12)
+        )
+
+    def fields(self, at, **overrides):
+        return {
+            'patient': self.patient,
+            'provider': self.provider,
+            'appointment_type': self.visit,
+            'location': self.location,
+            'appointment_date': self.day,
+            'appointment_time': at,
+            **overrides,
+        }
+
+
+class SlotQueryParamTests(ClinicTestData, APITestCase):
+    """Bad ids and impossible dates are answered with 400, not 500."""
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+        self.slots_url = f'/api/providers/{self.provider.pk}/slots/'
+
+    def test_slots_bad_ids(self):
+        for params in (
+            {'location_id': 'abc', 'type_id': self.visit.pk},
+            {'location_id': self.location.pk, 'type_id': 'abc'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.slots_url, params).status_code, 400)
+        response = self.client.get('/api/providers/abc/slots/', {
+            'location_id': self.location.pk, 'type_id': self.visit.pk
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_slots_bad_dates(self):
+        for param in ('start', 'end'):
+            for value in ('junk', '2024-02-30', '2024-02-30T10:00:00'):
+                with self.subTest(param=param, value=value):
+                    response = self.client.get(self.slots_url, {
+                        'location_id': self.location.pk, 'type_id': self.visit.pk, param: value
+                    })
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(value, response.json()['error'])
+
+    def test_search_bad_dates(self):
+        for param in ('start', 'end'):
+            with self.subTest(param=param):
+                response = self.client.get('/api/availability/search/', {
+                    'type_id': self.visit.pk, param: '2024-02-30'
+                })
+                self.assertEqual(response.status_code, 400)
+
+
+class WorkingHoursTests(ClinicTestData, APITestCase):
+    """Booking accepts exactly the start times slotting offers."""
+
+    def offered(self):
+        response = self.client.get(f'/api/providers/{self.provider.pk}/slots/', {
+            'location_id': self.location.pk,
+            'type_id': self.visit.pk,
+            'start': self.day.isoformat(),
+            'end': self.day.isoformat(),
+        })
+        return [slot['start'] for slot in response.json()['slots']]
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+
+    def test_buffers_must_fit_inside_hours(self):
+        offered = self.offered()
+        # 10 minutes before and 35 after must fit in 09:00-12:00
+        self.assertEqual(offered[0], '09:15')
+        self.assertEqual(offered[-1], '11:15')
+        for at in (time(9), time(11, 30), time(8, 45), time(12)):
+            with self.subTest(at=at), self.assertRaisesMessage(booking.SlotUnavailable, 'working hours'):
+                booking.book_appointment(**self.fields(at))
+        booking.book_appointment(**self.fields(time(9, 15)))
+        booking.book_appointment(**self.fields(time(11, 15)))
+
+    def test_other_location_and_day_are_closed(self):
+        elsewhere = Location.objects.create(
+            name='Annex', address='2 Main St', city='Atlanta', state='GA', zip_code='30301'
+        )
+        elsewhere.providers.add(self.provider)
+        for overrides in ({'location': elsewhere}, {'appointment_date': self.day + timedelta(days=1)}):
+            with self.subTest(overrides=overrides), self.assertRaises(booking.SlotUnavailable):
+                booking.book_appointment(**self.fields(time(10), **overrides))
+
+    def test_update_rechecks_hours(self):
+        appointment = booking.book_appointment(**self.fields(time(10)))
+        response = self.client.patch(
+            f'/api/appointments/{appointment.pk}/', {'appointment_time': '09:00'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('working hours', response.json()['appointment_time'])
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.appointment_time, time(10))
+
+    def test_bulk_checks_hours(self):
+        tucked = booking.book_appointment(**self.fields(time(10)))
+        results, applied = bulk.apply_operations([
+            {'op': 'create', **{
+                name: getattr(value, 'pk', value) for name, value in self.fields(time(9)).items()
+            }},
+            {'op': 'reschedule', 'id': tucked.pk, 'appointment_time': time(11, 30)},
+        ])
+        self.assertFalse(applied)
+        for result in results:
+            self.assertEqual(result['status'], 'error')
+            self.assertIn('working hours', result['errors']['appointment_time'])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+class FeedVersionTests(ClinicTestData, APITestCase):
+    """Renaming anything an event shows changes the ETag of the feeds listing it."""
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        booking.book_appointment(**self.fields(time(10)))
+
+    def versions(self):
+        return ics.feed_version('provider', self.provider.pk), ics.feed_version('patient', self.patient.pk)
+
+    def assertBumps(self, instance, field, provider=True, patient=True):
+        before = self.versions()
+        setattr(instance, field, f'{getattr(instance, field)} (renamed)')
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        after = self.versions()
+        self.assertEqual((before[0] != after[0], before[1] != after[1]), (provider, patient))
+
+    def test_renames_bump_feeds(self):
+        self.assertBumps(self.location, 'address')
+        self.assertBumps(self.visit, 'name')
+        self.assertBumps(self.provider, 'name')
+        self.assertBumps(self.patient, 'name', provider=False)
+
+    def test_unrelated_rename_does_not(self):
+        annex = Location.objects.create(
+            name='Annex', address='2 Main St', city='Atlanta', state='GA', zip_code='30301'
+        )
+        self.assertBumps(annex, 'name', provider=False, patient=False)
+
+
+class BookingOverlapTests(ClinicTestData, APITestCase):
+    """Padded intervals of a provider's scheduled appointments may touch but not overlap."""
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+        # Blocks 09:50-10:35 with its buffers
+        self.booked = booking.book_appointment(**self.fields(time(10)))
+
+    def post(self, at, **overrides):
+        data = {
+            name: getattr(value, 'pk', value) for name, value in self.fields(at, **overrides).items()
+        }
+        return self.client.post('/api/appointments/', data, format='json')
+
+    def test_overlap_is_rejected(self):
+        response = self.post('10:15')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'appointment {self.booked.pk}', response.json()['appointment_time'])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_buffer_edges(self):
+        # 10:45 starts its 10-minute lead exactly where the 5-minute tail ends
+        self.assertEqual(self.post('10:45').status_code, 201)
+        with self.assertRaises(booking.SlotUnavailable):
+            # Its lead would start at 10:30, inside the first tail
+            booking.book_appointment(**self.fields(time(10, 40)))
+        # Ends at 09:20 plus 5 after: well clear of 09:50
+        self.assertEqual(self.post('09:15').status_code, 201)
+
+    def test_other_providers_and_cancelled_appointments_do_not_block(self):
+        colleague = Provider.objects.create(name='Dr Watson', specialty='General')
+        self.location.providers.add(colleague)
+        ProviderSchedule.objects.create(
+            provider=colleague, location=self.location, weekday=0, start=time(9), end=time(12)
+        )
+        self.assertEqual(self.post('10:00', provider=colleague).status_code, 201)
+        self.booked.status = 'cancelled'
+        self.booked.save()
+        self.assertEqual(self.post('10:00').status_code, 201)
+
+    def test_patch_rechecks_overlap(self):
+        later = booking.book_appointment(**self.fields(time(11)))
+        url = f'/api/appointments/{later.pk}/'
+        response = self.client.patch(url, {'appointment_time': '10:30'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        later.refresh_from_db()
+        self.assertEqual(later.appointment_time, time(11))
+        # Moving within its own padded interval is not a conflict with itself
+        self.assertEqual(self.client.patch(url, {'appointment_time': '11:15'}, format='json').status_code, 200)
+        # Non-scheduling fields skip the check
+        self.assertEqual(self.client.patch(url, {'notes': 'Bring results'}, format='json').status_code, 200)
+
+
+class CursorPaginationTests(ClinicTestData, APITestCase):
+    """Keyset pages never repeat or skip rows, even across ties and concurrent inserts."""
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+        # Pairs of appointments at the same date and time: only the id breaks the tie
+        for offset in range(3):
+            for _ in range(2):
+                self.create(self.day + timedelta(weeks=offset), time(10))
+
+    def create(self, day, at):
+        return Appointment.objects.create(**self.fields(at, appointment_date=day))
+
+    def walk(self, url, page_size=2, during=None):
+        ids, pages = [], 0
+        response = self.client.get(url, {'cursor': '', 'page_size': page_size})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.json())
+            ids += [row['id'] for row in response.json()['results']]
+            pages += 1
+            if pages == 1 and during is not None:
+                during()
+            if response.json()['next'] is None:
+                return ids
+            response = self.client.get(response.json()['next'])
+
+    def test_list_order_with_ties(self):
+        expected = list(
+            Appointment.objects.order_by('-appointment_date', '-appointment_time', '-id').values_list('id', flat=True)
+        )
+        # Odd page size splits a tie across pages
+        for page_size in (1, 2, 3, 4):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.walk('/api/appointments/', page_size), expected)
+
+    def test_upcoming_seeks_on_start(self):
+        expected = list(Appointment.objects.order_by('start', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/appointments/upcoming/', page_size=3), expected)
+
+    def test_inserts_between_pages(self):
+        seen_before = list(
+            Appointment.objects.order_by('-appointment_date', '-appointment_time', '-id').values_list('id', flat=True)
+        )
+        added = {}
+
+        def insert():
+            # One row sorting before the cursor (already passed) and one after it
+            added['passed'] = self.create(self.day + timedelta(weeks=5), time(10)).pk
+            added['ahead'] = self.create(self.day - timedelta(days=1), time(9)).pk
+
+        ids = self.walk('/api/appointments/', page_size=2, during=insert)
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertNotIn(added['passed'], ids)
+        self.assertEqual(ids, seen_before + [added['ahead']])
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get('/api/appointments/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+class BulkOperationTests(ClinicTestData, APITestCase):
+    """One result per entry, in order; failures stay in their own result unless the batch is atomic."""
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+        self.booked = booking.book_appointment(**self.fields(time(10)))
+
+    def create_op(self, at, **overrides):
+        return {
+            'op': 'create',
+            **{name: getattr(value, 'pk', value) for name, value in self.fields(at, **overrides).items()},
+        }
+
+    def post(self, operations, atomic=False):
+        return self.client.post(
+            '/api/appointments/bulk/', {'operations': operations, 'atomic': atomic}, format='json'
+        )
+
+    def batch(self):
+        return [
+            self.create_op('09:15'),
+            {'op': 'create', 'patient': self.patient.pk},
+            self.create_op('11:00', location=999999),
+            # Same slot as entry 0 of the same batch
+            self.create_op('09:15'),
+            # Frees 10:00, which the next entry books
+            {'op': 'cancel', 'id': self.booked.pk},
+            self.create_op('10:00'),
+            {'op': 'reschedule', 'id': 999999, 'appointment_time': '11:00'},
+        ]
+
+    def test_partial_failure(self):
+        response = self.post(self.batch())
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['applied'], body['succeeded'], body['failed']), (True, 3, 4))
+        results = body['results']
+        self.assertEqual([result['index'] for result in results], list(range(7)))
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['ok', 'error', 'error', 'error', 'ok', 'ok', 'error'],
+        )
+        self.assertIn('appointment_type', results[1]['errors'])
+        self.assertIn('location', results[2]['errors'])
+        self.assertIn('operation 0 of this batch', results[3]['errors']['appointment_time'])
+        self.assertIn('id', results[6]['errors'])
+
+        self.booked.refresh_from_db()
+        self.assertEqual(self.booked.status, 'cancelled')
+        created = Appointment.objects.filter(pk__in=[results[0]['id'], results[5]['id']])
+        self.assertEqual(
+            sorted(created.values_list('appointment_time', flat=True)), [time(9, 15), time(10)]
+        )
+
+    def test_atomic_failure_writes_nothing(self):
+        response = self.post(self.batch(), atomic=True)
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertFalse(body['applied'])
+        self.assertEqual(
+            [result['status'] for result in body['results']],
+            ['skipped', 'error', 'error', 'error', 'skipped', 'skipped', 'error'],
+        )
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.booked.refresh_from_db()
+        self.assertEqual(self.booked.status, 'scheduled')
+
+    def test_reschedule(self):
+        response = self.post([{'op': 'reschedule', 'id': self.booked.pk, 'appointment_time': '11:00'}])
+        self.assertEqual(response.json()['results'][0]['status'], 'ok')
+        self.booked.refresh_from_db()
+        self.assertEqual(self.booked.appointment_time, time(11))
+        self.assertEqual(timezone.localtime(self.booked.start).time(), time(11))
+
+
+class FastSerializerParityTests(ClinicTestData, APITestCase):
+    """List responses built from values() match AppointmentSerializer field for field."""
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+        booking.book_appointment(**self.fields(time(9, 15), notes='Fasting, bring "results"'))
+        booking.book_appointment(**self.fields(time(10), notes=None))
+        cancelled = booking.book_appointment(**self.fields(time(11)))
+        cancelled.status = 'cancelled'
+        cancelled.save()
+
+    def detail(self, pk, params=None):
+        return self.client.get(f'/api/appointments/{pk}/', params).json()
+
+    def test_rows_match_detail(self):
+        with self.assertNumQueries(2):
+            # count, page
+            rows = self.client.get('/api/appointments/').json()['results']
+        self.assertEqual(len(rows), 3)
+        for row in rows:
+            with self.subTest(id=row['id']):
+                self.assertEqual(row, self.detail(row['id']))
+
+    def test_sparse_fields_match(self):
+        params = {'fields': 'id,appointment_time,patient_name,updated_at'}
+        for url in ('/api/appointments/', '/api/appointments/upcoming/'):
+            with self.subTest(url=url):
+                rows = self.client.get(url, params).json()['results']
+                self.assertTrue(rows)
+                for row in rows:
+                    self.assertEqual(list(row), params['fields'].split(','))
+                    self.assertEqual(row, self.detail(row['id'], params))
+
+    def test_cursor_pages_match(self):
+        rows = self.client.get('/api/appointments/', {'cursor': '', 'page_size': 2}).json()['results']
+        for row in rows:
+            self.assertEqual(row, self.detail(row['id']))
@@ -5,15 +5,22 @@ from .views import (
     AppointmentViewSet,
     ProviderViewSet,
     LocationViewSet,
-    AppointmentTypeViewSet
+    AppointmentTypeViewSet,
+    AvailabilityViewSet
 )
+from .views_calendar import calendar_feed, CalendarLinkView
 
 router = DefaultRouter()
 router.register(r'appointments', AppointmentViewSet, basename='appointment')
 router.register(r'providers', ProviderViewSet, basename='provider')
 router.register(r'locations', LocationViewSet, basename='location')
 router.register(r'appointment-types', AppointmentTypeViewSet, basename='appointmenttype')
+router.register(r'availability', AvailabilityViewSet, basename='availability')
 
 urlpatterns = [
     path('', include(router.urls)),
+    
+    # Subscribable calendar feeds (signed-token auth for calendar clients)
+    path('calendars/<str:kind>/<int:pk>.ics', calendar_feed, name='calendar-feed'),
+    path('calendars/<str:kind>/<int:pk>/link/', CalendarLinkView.as_view(), name='calendar-link'),
 ]
\ No newline at end of file
@@ -1,33 +1,146 @@
 # appointments/views.py
+import logging
+
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+from mulisa_api.exports import ExportError, export_response
+from mulisa_api.sparse import SparseQuerysetMixin
+from .exports import APPOINTMENTS
 from .models import Appointment, Provider, Location, AppointmentType
 from .serializers import (
     AppointmentSerializer, 
     AppointmentCreateSerializer,
+    AppointmentFastSerializer,
     ProviderSerializer,
     LocationSerializer,
-    AppointmentTypeSerializer
+    AppointmentTypeSerializer,
+    BulkAppointmentSerializer,
+)
+from .pagination import AppointmentPagination, AppointmentCursorPagination
+from .permissions import IsStaffOrReadOnly
+from .services import bulk
+from .services.slotting import get_slots, search_slots
+
+logger = logging.getLogger(__name__)
+
+
+MAX_SLOT_RANGE_DAYS = 31
+CURSOR_PARAMETER = OpenApiParameter(
+    name='cursor',
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description='Opt in to keyset pagination; empty for the first page, then the cursor from `next`',
+    required=False
 )
+MAX_SEARCH_RESULTS = 50
 
 
-class AppointmentPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+def _parse_date_or_datetime(value, end_of_day=False):
+    """
+    Accept either an ISO datetime or a bare ISO date from query params.
+    Raises ValueError for anything else, including impossible dates such
+    as February 30th.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        parsed = None if day is not None else parse_datetime(value)
+    except ValueError:
+        # Well formed but impossible
+        day = parsed = None
+    if day is not None:
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    elif parsed is None:
+        raise ValueError(f'Invalid date or datetime: {value}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
 
 
-class ProviderViewSet(viewsets.ReadOnlyModelViewSet):
+class ProviderViewSet(SparseQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for viewing providers"""
     queryset = Provider.objects.all()
     serializer_class = ProviderSerializer
     permission_classes = [IsAuthenticated]
+    field_prefetch_related = {'locations': 'locations'}
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = self.with_field_relations(queryset)
+        return queryset
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='location_id',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Location to book at',
+                required=True
+            ),
+            OpenApiParameter(
+                name='type_id',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Appointment type ID',
+                required=True
+            ),
+            OpenApiParameter(
+                name='start',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='ISO date or datetime to search from (default: now)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description=f'ISO date or datetime to search until (default: 7 days, max {MAX_SLOT_RANGE_DAYS})',
+                required=False
+            ),
+        ],
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(detail=True, methods=['get'])
+    def slots(self, request, pk=None):
+        """Get open slots for this provider at a location for an appointment type"""
+        location_id = request.query_params.get('location_id')
+        type_id = request.query_params.get('type_id')
+        if not location_id or not type_id:
+            return Response(
+                {'error': 'location_id and type_id are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            start = _parse_date_or_datetime(request.query_params.get('start')) or timezone.now()
+            end = (
+                _parse_date_or_datetime(request.query_params.get('end'), end_of_day=True)
+                or start + timedelta(days=7)
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or end - start > timedelta(days=MAX_SLOT_RANGE_DAYS):
+            return Response(
+                {'error': f'end must be after start and within {MAX_SLOT_RANGE_DAYS} days'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = get_slots(pk, location_id, type_id, start, end)
+        if 'error' in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
 
 
 class LocationViewSet(viewsets.ReadOnlyModelViewSet):
@@ -44,18 +157,129 @@ class AppointmentTypeViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AvailabilityViewSet(viewsets.ViewSet):
+    """API endpoint for searching open slots across providers"""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='type_id',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description='Appointment type ID',
+                required=True
+            ),
+            OpenApiParameter(
+                name='specialty',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Provider specialty (case-insensitive)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='location_ids',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Comma-separated location IDs (default: all)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='start',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='ISO date or datetime to search from (default: now)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='end',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description=f'ISO date or datetime to search until (default: 14 days, max {MAX_SLOT_RANGE_DAYS})',
+                required=False
+            ),
+            OpenApiParameter(
+                name='limit',
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description=f'Number of slots to return (default 10, max {MAX_SEARCH_RESULTS})',
+                required=False
+            ),
+        ],
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Get the earliest open slots across all matching providers"""
+        params = request.query_params
+        try:
+            appt_type = AppointmentType.objects.get(pk=params.get('type_id'))
+            location_ids = [int(x) for x in params.get('location_ids', '').split(',') if x.strip()]
+            limit = min(int(params.get('limit', 10)), MAX_SEARCH_RESULTS)
+        except (AppointmentType.DoesNotExist, ValueError, TypeError):
+            return Response(
+                {'error': 'A valid type_id is required; location_ids and limit must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            start = _parse_date_or_datetime(params.get('start')) or timezone.now()
+            end = (
+                _parse_date_or_datetime(params.get('end'), end_of_day=True)
+                or start + timedelta(days=14)
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or end - start > timedelta(days=MAX_SLOT_RANGE_DAYS):
+            return Response(
+                {'error': f'end must be after start and within {MAX_SLOT_RANGE_DAYS} days'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        slots = search_slots(
+            appt_type,
+            start,
+            end,
+            specialty=params.get('specialty'),
+            location_ids=location_ids,
+            limit=max(limit, 1),
+        )
+        return Response({
+            'type_id': appt_type.id,
+            'slots': slots,
+        })
+
+
+class AppointmentViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     pagination_class = AppointmentPagination
+    # Actions whose responses are built by AppointmentFastSerializer
+    fast_read_actions = ('list', 'upcoming', 'past')
+    # Joins behind the display fields, skipped when ?fields= leaves them out
+    field_select_related = {
+        'provider_name': 'provider',
+        'provider_specialty': 'provider',
+        'type_name': 'appointment_type',
+        'location_name': 'location',
+        'location_address': 'location',
+        'patient_name': 'patient',
+        'patient_age': 'patient',
+        'patient_gender': 'patient',
+    }
+    
+    @property
+    def paginator(self):
+        """Page numbers by default; keyset cursors when the client opts in"""
+        if not hasattr(self, '_paginator'):
+            if AppointmentCursorPagination.requested(getattr(self, 'request', None)):
+                self._paginator = AppointmentCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
     def get_queryset(self):
         """Get all appointments with optional filtering"""
-        queryset = Appointment.objects.all().select_related(
-            'provider', 
-            'appointment_type', 
-            'location',
-            'patient__owner'
-        )
+        queryset = self.with_field_relations(Appointment.objects.all(), AppointmentSerializer)
         
         # Manual filtering
         patient_id = self.request.query_params.get('patient_id')
@@ -80,6 +304,24 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             return AppointmentCreateSerializer
         return AppointmentSerializer
     
+    def list_response(self, queryset):
+        """Paginated list of appointments, on the fast read path when the action allows it"""
+        if self.action in self.fast_read_actions:
+            queryset = AppointmentFastSerializer.project(queryset, self.request)
+            serializer_class = AppointmentFastSerializer
+        else:
+            queryset = self.with_field_relations(queryset, AppointmentSerializer)
+            serializer_class = AppointmentSerializer
+        context = self.get_serializer_context()
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = serializer_class(page, many=True, context=context)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = serializer_class(queryset, many=True, context=context)
+        return Response(serializer.data)
+    
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -111,18 +353,21 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 required=False,
                 enum=['scheduled', 'completed', 'cancelled']
             ),
+            CURSOR_PARAMETER,
         ],
         responses={200: AppointmentSerializer(many=True)}
     )
     def list(self, request, *args, **kwargs):
         """List all appointments with optional filters"""
-        return super().list(request, *args, **kwargs)
+        return self.list_response(self.filter_queryset(self.get_queryset()))
     
     def perform_create(self, serializer):
         """Save the appointment with status='scheduled'"""
-        print(f"📥 Creating appointment with data: {serializer.validated_data}")
-        serializer.save(status='scheduled')
-        print(f"✅ Appointment created successfully")
+        appointment = serializer.save(status='scheduled')
+        logger.info(
+            "Appointment %s created for patient %s with provider %s",
+            appointment.pk, appointment.patient_id, appointment.provider_id
+        )
     
     def update(self, request, *args, **kwargs):
         """Update an appointment"""
@@ -144,34 +389,28 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 description='Filter by patient ID',
                 required=False
             ),
+            CURSOR_PARAMETER,
         ],
         responses={200: AppointmentSerializer(many=True)}
     )
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
-        """Get upcoming appointments (future dates, scheduled status)"""
+        """Get upcoming appointments (start in the future, scheduled status)"""
         patient_id = request.query_params.get('patient_id')
         
         queryset = Appointment.objects.filter(
-            appointment_date__gte=timezone.now().date(),
+            start__gte=timezone.now(),
             status='scheduled'
-        ).select_related('provider', 'appointment_type', 'location').order_by(
-            'appointment_date', 
-            'appointment_time'
+        ).order_by(
+            'start',
+            'id'
         )
         
         # Filter by patient if provided
         if patient_id:
             queryset = queryset.filter(patient_id=patient_id)
         
-        # Paginate the results
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = AppointmentSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = AppointmentSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.list_response(queryset)
     
     @extend_schema(
         parameters=[
@@ -182,6 +421,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 description='Filter by patient ID',
                 required=False
             ),
+            CURSOR_PARAMETER,
         ],
         responses={200: AppointmentSerializer(many=True)}
     )
@@ -192,23 +432,62 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         
         queryset = Appointment.objects.filter(
             appointment_date__lt=timezone.now().date()
-        ).select_related('provider', 'appointment_type', 'location').order_by(
+        ).order_by(
             '-appointment_date', 
-            '-appointment_time'
+            '-appointment_time',
+            '-id'
         )
         
         # Filter by patient if provided
         if patient_id:
             queryset = queryset.filter(patient_id=patient_id)
         
-        # Paginate the results
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = AppointmentSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = AppointmentSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.list_response(queryset)
+    
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='output',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Export format',
+                required=False,
+                enum=['csv', 'ndjson']
+            ),
+            OpenApiParameter(
+                name='patient_ids',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Comma-separated patient IDs',
+                required=False
+            ),
+            OpenApiParameter(
+                name='from',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Start (ISO date or datetime)',
+                required=False
+            ),
+            OpenApiParameter(
+                name='to',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='End (ISO date or datetime)',
+                required=False
+            ),
+        ],
+        responses={200: OpenApiTypes.BINARY}
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream appointments as CSV or NDJSON for analytics (staff and clinicians only)"""
+        user = request.user
+        if not (user.is_staff or getattr(user, 'role', None) in ('admin', 'clinician')):
+            raise PermissionDenied()
+        try:
+            return export_response(APPOINTMENTS, request.query_params)
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=True, methods=['patch'])
     def cancel(self, request, pk=None):
@@ -236,4 +515,30 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         appointment.save()
         
         serializer = AppointmentSerializer(appointment)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+    
+    @extend_schema(
+        request=BulkAppointmentSerializer,
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT}
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsStaffOrReadOnly])
+    def bulk(self, request):
+        """
+        Create, cancel and reschedule many appointments in one transaction.
+        Returns one result per operation, in request order.
+        """
+        serializer = BulkAppointmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        atomic = serializer.validated_data['atomic']
+        
+        results, applied = bulk.apply_operations(serializer.validated_operations(), atomic=atomic)
+        failed = sum(1 for result in results if result['status'] == 'error')
+        return Response(
+            {
+                'applied': applied,
+                'succeeded': len(results) - failed,
+                'failed': failed,
+                'results': results,
+            },
+            status=status.HTTP_400_BAD_REQUEST if atomic and failed else status.HTTP_200_OK
+        )
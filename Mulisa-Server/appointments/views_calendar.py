@@ -0,0 +1,149 @@
+# appointments/views_calendar.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from patients.models import Patient
+from patients.permissions import IsOwnerOrStaff
+from .models import Appointment, CalendarFeed, Provider
+from .services.ics import FEED_HISTORY, feed_version, iter_calendar
+
+FEED_SALT = 'appointments.calendar-feed'
+# Past events kept in a feed so clients don't drop what just happened
+FEED_KINDS = {
+    'providers': 'provider',
+    'patients': 'patient',
+}
+
+
+def _link_version(kind, pk):
+    version = CalendarFeed.objects.filter(kind=kind, object_id=pk).values_list('version', flat=True).first()
+    return version or 0
+
+
+def _feed_token(kind, pk, version):
+    return signing.dumps([kind, pk, version], salt=FEED_SALT)
+
+
+def _token_matches(request, kind, pk):
+    """
+    Calendar clients can't send JWTs, so feeds are authorised by a signed URL
+    token. It must carry the feed's current link version and, with
+    CALENDAR_FEED_MAX_AGE_DAYS set, be younger than that.
+    """
+    cached = getattr(request, '_calendar_token_matches', None)
+    if cached is not None:
+        return cached
+    max_age_days = getattr(settings, 'CALENDAR_FEED_MAX_AGE_DAYS', 0)
+    try:
+        payload = signing.loads(
+            request.GET.get('token', ''),
+            salt=FEED_SALT,
+            max_age=timedelta(days=max_age_days) if max_age_days else None,
+        )
+    except signing.BadSignature:
+        payload = None
+    matches = False
+    if isinstance(payload, list) and payload[:2] == [kind, pk] and len(payload) <= 3:
+        # Links issued before versions existed are version 0
+        version = payload[2] if len(payload) == 3 else 0
+        matches = version == _link_version(kind, pk)
+    # Checked by the ETag function and again by the view
+    request._calendar_token_matches = matches
+    return matches
+
+
+def _feed_etag(request, kind, pk):
+    # Runs before the view: unchanged feeds cost the token's version lookup and one cache read
+    if kind not in FEED_KINDS or not _token_matches(request, kind, pk):
+        return None
+    return feed_version(FEED_KINDS[kind], pk)
+
+
+@require_GET
+@condition(etag_func=_feed_etag)
+def calendar_feed(request, kind, pk):
+    """
+    GET /api/calendars/<providers|patients>/<pk>.ics?token=...
+        → Subscribable (webcal) feed of scheduled appointments, streamed
+    """
+    if kind not in FEED_KINDS or not _token_matches(request, kind, pk):
+        raise Http404('Calendar not found')
+
+    queryset = Appointment.objects.filter(
+        status='scheduled',
+        start__gte=timezone.now() - FEED_HISTORY,
+    ).order_by('start', 'id')
+    if kind == 'providers':
+        owner = get_object_or_404(Provider, pk=pk)
+        queryset = queryset.filter(provider_id=pk)
+        name = f'Dr. {owner.name} appointments'
+    else:
+        owner = get_object_or_404(Patient, pk=pk)
+        queryset = queryset.filter(patient_id=pk)
+        name = f'{owner.name} appointments'
+
+    response = StreamingHttpResponse(
+        iter_calendar(queryset, name),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'inline; filename="{kind}-{pk}.ics"'
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+
+class CalendarLinkView(APIView):
+    """
+    GET  /api/calendars/<providers|patients>/<pk>/link/
+        → Signed feed URLs (https and webcal) for calendar subscriptions
+    POST /api/calendars/<providers|patients>/<pk>/link/
+        → Revoke every link issued so far and return a new one
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _check_access(self, request, kind, pk):
+        user = request.user
+        if kind == 'providers':
+            get_object_or_404(Provider, pk=pk)
+            if not (user.is_staff or getattr(user, 'role', None) in ('admin', 'clinician', 'staff')):
+                raise PermissionDenied()
+        elif kind == 'patients':
+            patient = get_object_or_404(Patient, pk=pk)
+            if not IsOwnerOrStaff().has_object_permission(request, self, patient):
+                raise PermissionDenied()
+        else:
+            raise Http404('Calendar not found')
+
+    def _link(self, request, kind, pk, version):
+        path = reverse('calendar-feed', kwargs={'kind': kind, 'pk': pk})
+        url = request.build_absolute_uri(f'{path}?token={_feed_token(kind, pk, version)}')
+        return Response({
+            'url': url,
+            'webcal': 'webcal://' + url.split('://', 1)[1],
+        })
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT})
+    def get(self, request, kind, pk):
+        self._check_access(request, kind, pk)
+        return self._link(request, kind, pk, _link_version(kind, pk))
+
+    @extend_schema(request=None, responses={200: OpenApiTypes.OBJECT})
+    def post(self, request, kind, pk):
+        self._check_access(request, kind, pk)
+        feed, _ = CalendarFeed.objects.get_or_create(kind=kind, object_id=pk)
+        CalendarFeed.objects.filter(pk=feed.pk).update(version=F('version') + 1, updated_at=timezone.now())
+        feed.refresh_from_db(fields=['version'])
+        return self._link(request, kind, pk, feed.version)
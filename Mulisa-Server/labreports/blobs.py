@@ -0,0 +1,167 @@
+# labreports/blobs.py
+"""
+Content-addressed storage for lab report files.
+
+Files are stored once per SHA-256 under ``blobs/ab/cd/<sha256>`` and shared
+through ``StoredBlob`` rows, whose ``refcount`` is the number of reports
+using them. ``acquire`` takes a reference and writes the bytes only when the
+blob is new; ``release`` drops one when a report is deleted or its file is
+replaced. Blobs left at zero are deleted by ``collect`` (the
+``gc_lab_report_blobs`` command) after a grace period, so a blob that is
+released and immediately re-acquired is not removed underneath its new user.
+
+Files are written before the transaction that creates their row commits.
+If it rolls back the file stays behind with no row: the next ``acquire`` of
+the same bytes writes it again as its own and queues its preview job, and
+``collect_orphans`` deletes the ones nobody comes back for.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import LabReport, PreviewJob, StoredBlob
+
+GC_GRACE = timedelta(hours=24)
+ACQUIRE_ATTEMPTS = 3
+
+
+def storage():
+    return LabReport._meta.get_field("file").storage
+
+
+def sha256_of(content):
+    """Hex SHA-256 of a Django ``File``, read in chunks."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def acquire(sha256, size, content=None):
+    """
+    Take a reference to the blob with ``sha256``, writing ``content`` (a
+    ``File`` with those bytes) if it is not stored yet. ``content`` may be
+    omitted when the blob is known to exist.
+    """
+    for attempt in range(ACQUIRE_ATTEMPTS):
+        try:
+            blob, created = StoredBlob.objects.get_or_create(sha256=sha256, defaults={"size": size})
+        except IntegrityError:
+            # Lost a race with a concurrent first upload of the same bytes
+            if attempt + 1 == ACQUIRE_ATTEMPTS:
+                raise
+            continue
+        with transaction.atomic():
+            # The lock orders concurrent writers of a new blob and fences off collect()
+            blob = StoredBlob.objects.select_for_update().filter(pk=blob.pk).first()
+            if blob is None:
+                # Collected between the two statements; create it afresh
+                continue
+            stored = storage().exists(blob.name)
+            if created and stored and content is not None:
+                # Left by an acquire that rolled back; replace it rather than trust it
+                storage().delete(blob.name)
+                stored = False
+            if not stored:
+                if content is None:
+                    raise ValueError(f"Blob {sha256} is not stored and no content was given")
+                storage().save(blob.name, content)
+            if created or not stored:
+                # Visible to the preview workers once this commits
+                PreviewJob.objects.get_or_create(blob=blob)
+            blob.refcount = F("refcount") + 1
+            blob.save(update_fields=["refcount", "updated_at"])
+        blob.refresh_from_db()
+        return blob
+    raise RuntimeError(f"Could not acquire blob {sha256}")
+
+
+def acquire_file(uploaded):
+    """``acquire`` for an uploaded ``File``, hashing it first."""
+    return acquire(sha256_of(uploaded), uploaded.size, uploaded)
+
+
+def release(blob_id):
+    if blob_id is not None:
+        StoredBlob.objects.filter(pk=blob_id, refcount__gt=0).update(
+            refcount=F("refcount") - 1, updated_at=timezone.now()
+        )
+
+
+def for_patient(sha256, size, patient_id):
+    """
+    The blob with these bytes if one of ``patient_id``'s reports uses it.
+    Only then may an upload skip sending them: the client proves nothing by
+    quoting a hash, and the patient's own files are already readable to it.
+    """
+    return StoredBlob.objects.filter(
+        sha256=sha256, size=size, refcount__gt=0, lab_reports__patient_id=patient_id
+    ).first()
+
+
+def recount(dry_run=False):
+    """Reset refcounts that differ from the reports pointing at the blob; returns how many."""
+    wrong = StoredBlob.objects.annotate(refs=Count("lab_reports")).exclude(refcount=F("refs"))
+    fixed = 0
+    for pk, refs in wrong.values_list("pk", "refs"):
+        fixed += 1 if dry_run else StoredBlob.objects.filter(pk=pk).update(refcount=refs)
+    return fixed
+
+
+def collect(grace=GC_GRACE, dry_run=False):
+    """Delete unreferenced blobs idle for longer than ``grace``; returns (blobs, bytes)."""
+    candidates = StoredBlob.objects.filter(refcount=0, updated_at__lt=timezone.now() - grace)
+    removed = freed = 0
+    for pk in candidates.values_list("pk", flat=True).iterator():
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update(skip_locked=True).filter(
+                ~Exists(LabReport.objects.filter(blob_id=OuterRef("pk"))), pk=pk, refcount=0
+            ).first()
+            if blob is None:
+                continue
+            if not dry_run:
+                storage().delete(blob.name)
+                if blob.preview:
+                    storage().delete(blob.preview)
+                blob.delete()
+        removed += 1
+        freed += blob.size
+    return removed, freed
+
+
+def _blob_files(directory="blobs"):
+    """Names of the files under ``directory`` in storage, any depth."""
+    dirs, files = storage().listdir(directory)
+    for name in files:
+        yield f"{directory}/{name}"
+    for name in dirs:
+        yield from _blob_files(f"{directory}/{name}")
+
+
+def collect_orphans(grace=GC_GRACE, dry_run=False):
+    """
+    Delete blob files without a ``StoredBlob`` row that were last written
+    longer than ``grace`` ago; returns (files, bytes).
+    """
+    if not storage().exists("blobs"):
+        return 0, 0
+    cutoff = timezone.now() - grace
+    removed = freed = 0
+    for name in _blob_files():
+        sha256 = name.rsplit("/", 1)[-1]
+        if StoredBlob.objects.filter(sha256=sha256).exists():
+            continue
+        if storage().get_modified_time(name) >= cutoff:
+            # May belong to an upload that has not committed yet
+            continue
+        size = storage().size(name)
+        if not dry_run:
+            storage().delete(name)
+        removed += 1
+        freed += size
+    return removed, freed
@@ -0,0 +1,147 @@
+# labreports/downloads.py
+"""
+Lab report file responses (report files and their previews).
+
+With ``LAB_REPORT_SENDFILE`` set, Django only authorizes and names the file:
+the X-Sendfile / X-Accel-Redirect header tells the front server to stream
+it, including ranges and caching. Otherwise the file is streamed from
+storage one block at a time, with:
+
+- ``ETag`` (size and mtime, like nginx) and ``Last-Modified``, answered
+  with 304/412 through Django's conditional request handling;
+- a single ``Range: bytes=...`` (206, or 416 when unsatisfiable), honouring
+  ``If-Range``. Multi-range requests get the whole file, as RFC 9110 allows.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+STREAM_BLOCK_SIZE = 64 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _modified(storage, name, fallback):
+    """Whole seconds, the resolution of HTTP dates."""
+    try:
+        modified = storage.get_modified_time(name)
+    except NotImplementedError:
+        modified = fallback
+    return int(modified.timestamp())
+
+
+def _byte_range(header, size):
+    """``(start, end)`` inclusive, None for no usable range, or "unsatisfiable"."""
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.META.get("HTTP_IF_RANGE")
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith("W/"):
+        return value == etag
+    # A date validator only matches the exact Last-Modified (RFC 9110 13.1.5)
+    return parse_http_date_safe(value) == last_modified
+
+
+def _stream(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        file.close()
+
+
+def _offloaded(storage, name, content_type, mode):
+    response = HttpResponse(content_type=content_type)
+    if mode == "x-sendfile":
+        response["X-Sendfile"] = storage.path(name)
+    else:
+        response["X-Accel-Redirect"] = quote(settings.LAB_REPORT_ACCEL_PREFIX.rstrip("/") + "/" + name)
+    return response
+
+
+def file_response(request, storage, name, filename, created_at, as_attachment=True):
+    """
+    Response serving stored file ``name`` as ``filename`` for an already
+    authorized request. ``created_at`` stands in for the mtime on storages
+    that do not report one.
+    """
+    # Blob paths carry no extension, so go by the uploaded name
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    mode = settings.LAB_REPORT_SENDFILE.lower()
+    if mode in ("x-sendfile", "x-accel-redirect"):
+        response = _offloaded(storage, name, content_type, mode)
+    else:
+        response = _streamed(request, storage, name, content_type, created_at)
+    if response.status_code in (200, 206):
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def report_file_response(request, report, as_attachment=True):
+    filename = report.filename or os.path.basename(report.file.name)
+    return file_response(request, report.file.storage, report.file.name, filename, report.created_at, as_attachment)
+
+
+def _streamed(request, storage, name, content_type, created_at):
+    size = storage.size(name)
+    last_modified = _modified(storage, name, created_at)
+    etag = f'"{last_modified:x}-{size:x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    byte_range = None
+    if request.method == "GET" and "HTTP_RANGE" in request.META and _if_range_matches(request, etag, last_modified):
+        byte_range = _byte_range(request.META["HTTP_RANGE"], size)
+
+    if byte_range == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        # Whole file: FileResponse lets the WSGI server use sendfile() where it can
+        response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _stream(storage.open(name, "rb"), start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
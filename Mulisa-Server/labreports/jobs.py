@@ -0,0 +1,151 @@
+# labreports/jobs.py
+"""
+DB-backed job queue for lab report previews and text extraction.
+
+``blobs.acquire`` adds a ``PreviewJob`` in the same transaction that stores
+a new blob, so a job becomes visible to workers only once the upload has
+committed. Jobs are per blob, so deduplicated uploads are processed once.
+
+``run`` (the ``process_lab_report_jobs`` command) claims jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` and renders them in a pool of
+spawned processes (``labreports.previews``, no database access). Results
+are written back by the parent process. Jobs left "running" by a worker
+that died are claimed again once they are stale, and failed jobs are
+retried up to ``MAX_ATTEMPTS`` times.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from patients import chart
+
+from . import previews
+from .blobs import storage
+from .models import LabReport, PreviewJob, StoredBlob
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=15)
+POLL_SECONDS = 5
+# Recycle worker processes now and then; image and PDF libraries can leak
+MAX_TASKS_PER_CHILD = 50
+
+
+def enqueue_missing():
+    """Create jobs for blobs stored before the pipeline existed; returns how many."""
+    missing = StoredBlob.objects.filter(preview_job__isnull=True).values_list("pk", flat=True)
+    return len(PreviewJob.objects.bulk_create(
+        [PreviewJob(blob_id=pk) for pk in missing], ignore_conflicts=True
+    ))
+
+
+def claim(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            PreviewJob.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("blob")
+            .defer("blob__text")
+            .filter(Q(status="pending") | Q(status="running", started_at__lt=now - STALE_AFTER))
+            .order_by("id")[:limit]
+        )
+        for job in jobs:
+            job.status = "running"
+            job.attempts += 1
+            job.started_at = now
+        PreviewJob.objects.bulk_update(jobs, ["status", "attempts", "started_at", "updated_at"])
+    return jobs
+
+
+def _local_path(blob):
+    """A local path to the blob's bytes, and whether it is a temporary copy."""
+    try:
+        return storage().path(blob.name), False
+    except NotImplementedError:
+        with storage().open(blob.name, "rb") as src, tempfile.NamedTemporaryFile(delete=False) as dst:
+            shutil.copyfileobj(src, dst)
+        return dst.name, True
+
+
+def complete(job, result):
+    blob = job.blob
+    preview = ""
+    if result["preview"]:
+        storage().delete(blob.preview_name)
+        preview = storage().save(blob.preview_name, ContentFile(result["preview"]))
+    # update(), not save(): the blob's refcount may be changing concurrently
+    StoredBlob.objects.filter(pk=blob.pk).update(preview=preview, text=result["text"].replace("\0", ""))
+    PreviewJob.objects.filter(pk=job.pk).update(status="done", error="", updated_at=timezone.now())
+    # Charts embed preview_url; update() sends no signals
+    chart.bump(*set(LabReport.objects.filter(blob_id=blob.pk).values_list("patient_id", flat=True)))
+
+
+def fail(job, error):
+    status = "failed" if job.attempts >= MAX_ATTEMPTS else "pending"
+    logger.warning("Preview job %s for blob %s failed (attempt %s): %s", job.pk, job.blob_id, job.attempts, error)
+    PreviewJob.objects.filter(pk=job.pk).update(status=status, error=str(error)[:2000], updated_at=timezone.now())
+
+
+def _run_batch(pool, jobs):
+    futures = {}
+    for job in jobs:
+        try:
+            path, temporary = _local_path(job.blob)
+        except OSError as e:
+            fail(job, e)
+            continue
+        futures[pool.submit(previews.render, path)] = (job, path, temporary)
+    broken = False
+    for future in as_completed(futures):
+        job, path, temporary = futures[future]
+        try:
+            complete(job, future.result())
+        except BrokenProcessPool:
+            # Every unfinished job of the batch sees this, not only the one that crashed
+            broken = True
+            fail(job, "worker process crashed")
+        except Exception as e:
+            fail(job, e)
+        finally:
+            if temporary:
+                os.unlink(path)
+    if broken:
+        raise BrokenProcessPool("A preview worker process died")
+
+
+def run(workers, once=False, poll=POLL_SECONDS):
+    """Process jobs until interrupted, or until none are left with ``once``."""
+    if previews.missing():
+        logger.warning(
+            "%s not installed: lab report jobs will complete without previews or text. "
+            "Install requirements.txt in the worker environment.",
+            ", ".join(previews.missing()),
+        )
+    context = multiprocessing.get_context("spawn")
+    while True:
+        with ProcessPoolExecutor(workers, mp_context=context, max_tasks_per_child=MAX_TASKS_PER_CHILD) as pool:
+            try:
+                while True:
+                    jobs = claim(workers * 2)
+                    if not jobs:
+                        if once:
+                            return
+                        time.sleep(poll)
+                        continue
+                    _run_batch(pool, jobs)
+            except BrokenProcessPool:
+                # A worker crashed, e.g. in a native library; its jobs were sent
+                # back for retry, so carry on with a fresh pool
+                logger.exception("Preview worker pool broke; restarting it")
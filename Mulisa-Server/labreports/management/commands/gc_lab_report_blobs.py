@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from labreports import blobs
+
+
+class Command(BaseCommand):
+    help = "Delete lab report blobs no report refers to any more, and files left without a blob"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=blobs.GC_GRACE.total_seconds() / 3600,
+            help="Only delete blobs unreferenced for at least this long",
+        )
+        parser.add_argument("--recount", action="store_true", help="Rebuild refcounts from the reports first")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+
+    def handle(self, *args, **options):
+        if options["grace_hours"] < 0:
+            raise CommandError("--grace-hours must not be negative")
+        if options["recount"]:
+            fixed = blobs.recount(dry_run=options["dry_run"])
+            self.stdout.write(f"{'Would correct' if options['dry_run'] else 'Corrected'} {fixed} refcounts")
+
+        grace = timedelta(hours=options["grace_hours"])
+        removed, freed = blobs.collect(grace, dry_run=options["dry_run"])
+        orphans, orphan_bytes = blobs.collect_orphans(grace, dry_run=options["dry_run"])
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} blobs ({freed / 1024 ** 2:.1f} MiB)"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {orphans} files with no blob row ({orphan_bytes / 1024 ** 2:.1f} MiB)"
+        ))
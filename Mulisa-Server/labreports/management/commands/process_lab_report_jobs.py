@@ -0,0 +1,26 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from labreports import jobs
+
+
+class Command(BaseCommand):
+    help = "Generate previews and extract text for stored lab report files, using a local process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+        parser.add_argument("--once", action="store_true", help="Exit when no jobs are left instead of polling")
+        parser.add_argument("--poll-interval", type=float, default=jobs.POLL_SECONDS, help="Seconds between polls")
+        parser.add_argument(
+            "--enqueue-missing", action="store_true", help="First queue jobs for files stored before previews existed"
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options["enqueue_missing"]:
+            self.stdout.write(f"Queued {jobs.enqueue_missing()} jobs")
+        self.stdout.write(f"Processing lab report jobs with {options['workers']} workers")
+        jobs.run(options["workers"], once=options["once"], poll=options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS("No jobs left"))
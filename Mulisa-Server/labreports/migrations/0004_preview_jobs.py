@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labreports', '0003_stored_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='preview',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='storedblob',
+            name='text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='PreviewJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preview_job', to='labreports.storedblob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='labreports__status_0c2a4f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labreports', '0004_preview_jobs'),
+        ('patients', '0008_vital_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labreport',
+            index=models.Index(fields=['patient', 'created_at'], name='labreports__patient_8a37ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labreport',
+            index=models.Index(fields=['patient', 'report_date'], name='labreports__patient_86a71b_idx'),
+        ),
+    ]
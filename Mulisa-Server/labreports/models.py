@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from patients.models import Patient
@@ -5,6 +7,62 @@ from patients.models import Patient
 def upload_lab_report(instance, filename):
     return f"labreports/{instance.patient.id}/{filename}"
 
+
+class StoredBlob(models.Model):
+    """
+    One stored file, addressed by its SHA-256 and shared by every report with
+    the same bytes. ``refcount`` counts those reports; unreferenced blobs are
+    removed by ``manage.py gc_lab_report_blobs``.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    # Filled in by the preview worker (see labreports.jobs)
+    preview = models.CharField(max_length=255, blank=True)
+    text = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def name(self):
+        # Sharded so no directory holds more than a few thousand files
+        return f"blobs/{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}"
+
+    @property
+    def preview_name(self):
+        return f"previews/{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}.png"
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.refcount} refs)"
+
+
+class PreviewJob(models.Model):
+    """Preview image and text extraction for one blob, run by ``process_lab_report_jobs``."""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    blob = models.OneToOneField(StoredBlob, on_delete=models.CASCADE, related_name="preview_job")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest pending jobs
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"Preview job for {self.blob_id} ({self.status})"
+
+
 class LabReport(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="lab_reports")
     uploaded_by = models.ForeignKey(
@@ -13,8 +71,57 @@ class LabReport(models.Model):
     report_type = models.CharField(max_length=150)
     report_date = models.DateField()
     file = models.FileField(upload_to=upload_lab_report)
+    # Content-addressed storage; null for files stored before it existed
+    blob = models.ForeignKey(
+        StoredBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="lab_reports"
+    )
+    # Name the file was uploaded with (blob paths are hashes)
+    filename = models.CharField(max_length=255, blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Per-patient lists: newest first, and by report date (filters, chart)
+            models.Index(fields=["patient", "created_at"]),
+            models.Index(fields=["patient", "report_date"]),
+        ]
+
     def __str__(self):
         return f"{self.report_type} ({self.patient})"
+
+
+class LabReportUpload(models.Model):
+    """
+    A chunked upload in progress. The bytes received so far live in a partial
+    file (see ``labreports.uploads``); finalizing checks ``sha256`` and turns
+    it into a ``LabReport``.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("complete", "Complete"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="lab_report_uploads")
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    # LabReport fields, applied on finalize
+    report_type = models.CharField(max_length=150)
+    report_date = models.DateField()
+    notes = models.TextField(blank=True)
+
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    lab_report = models.OneToOneField(
+        LabReport, on_delete=models.SET_NULL, null=True, blank=True, related_name="upload"
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
@@ -0,0 +1,146 @@
+# labreports/previews.py
+"""
+Preview images and text extraction for lab report files.
+
+This module runs inside the worker processes of ``labreports.jobs`` and
+does not touch Django or the database: ``render`` takes a local path and
+returns PNG bytes and text. The file type is sniffed from its content,
+since blobs carry no name.
+
+PDF previews are the first page, rendered with pypdfium2 or, failing that,
+poppler's ``pdftoppm``. With neither, only scanned PDFs get a preview (the
+first embedded image), and text-only PDFs have none.
+
+Pillow, pypdf and pypdfium2 are in requirements.txt but imported
+optionally, so the web process does not need them. Without Pillow there
+are no previews; without pypdf, PDFs yield no text. Jobs still complete
+either way, and the worker logs a warning at startup about what is
+missing (``missing``).
+"""
+import io
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+PREVIEW_SIZE = (320, 320)
+MAX_TEXT_CHARS = 100_000
+MAX_PDF_PAGES = 20
+SNIFF_BYTES = 8192
+PDFTOPPM_TIMEOUT = 60
+
+
+def missing():
+    """Names of the optional libraries that are not installed."""
+    found = [("Pillow", Image), ("pypdf", pypdf), ("pypdfium2", pypdfium2 or shutil.which("pdftoppm"))]
+    return [name for name, module in found if module is None]
+
+
+def _png(image):
+    image.thumbnail(PREVIEW_SIZE)
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGB")
+    out = io.BytesIO()
+    image.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+def _render_first_page(path):
+    """PNG of the PDF's first page, or None without a renderer."""
+    if pypdfium2 is not None and Image is not None:
+        pdf = pypdfium2.PdfDocument(path)
+        try:
+            if not len(pdf):
+                return None
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = min(PREVIEW_SIZE[0] / width, PREVIEW_SIZE[1] / height)
+            return _png(page.render(scale=scale).to_pil())
+        finally:
+            pdf.close()
+    pdftoppm = shutil.which("pdftoppm")
+    if pdftoppm is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "page"
+        subprocess.run(
+            [pdftoppm, "-png", "-singlefile", "-f", "1", "-l", "1",
+             "-scale-to", str(max(PREVIEW_SIZE)), str(path), str(out)],
+            check=True, capture_output=True, timeout=PDFTOPPM_TIMEOUT,
+        )
+        return out.with_suffix(".png").read_bytes()
+
+
+def _embedded_image(reader):
+    # Scanned reports are one image per page; use the first page's
+    for embedded in reader.pages[0].images if reader.pages else ():
+        return _png(embedded.image)
+    return None
+
+
+def _pdf(path):
+    preview = _render_first_page(path)
+    if pypdf is None:
+        return preview, ""
+    reader = pypdf.PdfReader(path)
+    if preview is None and Image is not None:
+        preview = _embedded_image(reader)
+    text, length = [], 0
+    for number, page in enumerate(reader.pages):
+        if number >= MAX_PDF_PAGES or length >= MAX_TEXT_CHARS:
+            break
+        page_text = page.extract_text() or ""
+        text.append(page_text)
+        length += len(page_text)
+    return preview, "\n".join(text)[:MAX_TEXT_CHARS]
+
+
+def _image(path):
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            return _png(image)
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+
+def _text(head, path):
+    if b"\0" in head:
+        return None
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is fine
+        if e.start < len(head) - 3:
+            return None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read(MAX_TEXT_CHARS)
+
+
+def render(path):
+    """``{"preview": PNG bytes or None, "text": str}`` for the file at ``path``."""
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if head.startswith(b"%PDF-"):
+        preview, text = _pdf(path)
+        return {"preview": preview, "text": text}
+    preview = _image(path)
+    if preview is not None:
+        return {"preview": preview, "text": ""}
+    return {"preview": None, "text": _text(head, path) or ""}
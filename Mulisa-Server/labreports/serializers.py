@@ -1,7 +1,89 @@
+import os
+
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
-from .models import LabReport
+from mulisa_api.metrics import TimedSerializerMixin
+from mulisa_api.sparse import SparseFieldsMixin
+from . import blobs
+from .models import LabReport, LabReportUpload
+from .uploads import MAX_UPLOAD_SIZE
+
+class LabReportSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    # Small PNG for list rows, so clients never fetch the file itself to render a list
+    preview_url = serializers.SerializerMethodField()
 
-class LabReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = LabReport
-        fields = "__all__"
+        exclude = ["blob"]
+        read_only_fields = ["filename"]
+
+    @staticmethod
+    def with_preview(queryset):
+        """Join what ``preview_url`` reads, leaving out the extracted text."""
+        return queryset.select_related("blob").defer("blob__text")
+
+    def get_preview_url(self, obj):
+        if obj.blob_id is None or not obj.blob.preview:
+            return None
+        url = reverse("labreport-preview", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def _store(self, validated_data):
+        """Swap the uploaded file for a reference to its content-addressed blob."""
+        uploaded = validated_data.pop("file", None)
+        if uploaded is None:
+            return None
+        blob = blobs.acquire_file(uploaded)
+        validated_data.update(file=blob.name, blob=blob, filename=os.path.basename(uploaded.name))
+        return blob
+
+    @transaction.atomic
+    def create(self, validated_data):
+        self._store(validated_data)
+        return super().create(validated_data)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        old_blob_id = instance.blob_id
+        if self._store(validated_data) is not None:
+            blobs.release(old_blob_id)
+        return super().update(instance, validated_data)
+
+
+class LabReportUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LabReportUpload
+        fields = [
+            "id",
+            "patient",
+            "report_type",
+            "report_date",
+            "notes",
+            "filename",
+            "size",
+            "sha256",
+            "received",
+            "status",
+            "lab_report",
+            "created_at",
+        ]
+        read_only_fields = ["id", "received", "status", "lab_report", "created_at"]
+
+    def validate_filename(self, value):
+        name = os.path.basename(value.replace("\\", "/"))
+        if not name:
+            raise serializers.ValidationError("A file name is required.")
+        return name
+
+    def validate_size(self, value):
+        if not 0 < value <= MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(f"Size must be between 1 and {MAX_UPLOAD_SIZE} bytes.")
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in "0123456789abcdef" for c in value):
+            raise serializers.ValidationError("Expected a hex SHA-256 digest.")
+        return value
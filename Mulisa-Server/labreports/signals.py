@@ -0,0 +1,12 @@
+# labreports/signals.py
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from . import blobs
+from .models import LabReport
+
+
+@receiver(post_delete, sender=LabReport)
+def lab_report_deleted(sender, instance, **kwargs):
+    # Also runs for reports deleted by a patient cascade
+    blobs.release(instance.blob_id)
@@ -0,0 +1,286 @@
+import fcntl
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from labreports import blobs, jobs, uploads
+from labreports.models import LabReport, LabReportUpload, PreviewJob, StoredBlob
+from patients.models import Patient
+
+CONTENT = b"0123456789" * 10
+CONTENT_SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class BlobTests(TempMediaMixin, TestCase):
+    def acquire_and_roll_back(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            blobs.acquire(CONTENT_SHA256, len(CONTENT), ContentFile(CONTENT))
+            raise RuntimeError
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_rolled_back_file_is_rewritten_and_queued(self):
+        self.acquire_and_roll_back()
+        blob = blobs.acquire(CONTENT_SHA256, len(CONTENT), ContentFile(CONTENT))
+        self.assertEqual(blob.refcount, 1)
+        self.assertEqual(PreviewJob.objects.get().blob_id, blob.pk)
+        with blobs.storage().open(blob.name) as f:
+            self.assertEqual(f.read(), CONTENT)
+
+    def test_collect_orphans(self):
+        self.acquire_and_roll_back()
+        kept = blobs.acquire(hashlib.sha256(b"kept").hexdigest(), 4, ContentFile(b"kept"))
+        # Too recent: may belong to an upload still in flight
+        self.assertEqual(blobs.collect_orphans(), (0, 0))
+        self.assertEqual(blobs.collect_orphans(grace=timedelta(0)), (1, len(CONTENT)))
+        self.assertFalse(blobs.storage().exists(f"blobs/{CONTENT_SHA256[:2]}/{CONTENT_SHA256[2:4]}/{CONTENT_SHA256}"))
+        self.assertTrue(blobs.storage().exists(kept.name))
+
+
+class ChunkedUploadTests(TempMediaMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.patient = Patient.objects.create(owner=cls.owner, name="Ada", age=40, gender="female")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+        response = self.client.post("/api/labreports/uploads/", {
+            "patient": self.patient.pk,
+            "report_type": "CBC",
+            "report_date": "2024-01-15",
+            "filename": "cbc.pdf",
+            "size": len(CONTENT),
+            "sha256": CONTENT_SHA256,
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/labreports/uploads/{response.json()['id']}/"
+        self.upload = LabReportUpload.objects.get(pk=response.json()["id"])
+
+    def put_chunk(self, offset, data):
+        return self.client.put(f"{self.url}?offset={offset}", data, content_type="application/octet-stream")
+
+    def test_chunks_then_finalize(self):
+        self.assertEqual(self.put_chunk(0, CONTENT[:40]).json()["received"], 40)
+        self.assertEqual(self.put_chunk(40, CONTENT[40:]).json()["received"], len(CONTENT))
+        response = self.client.post(f"{self.url}finalize/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.put_chunk(0, CONTENT[:40]).status_code, 409)
+
+    def test_retried_chunk_is_rejected(self):
+        self.put_chunk(0, CONTENT[:40])
+        response = self.put_chunk(0, b"x" * 40)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["received"], 40)
+        with open(uploads.partial_path(self.upload), "rb") as f:
+            self.assertEqual(f.read(), CONTENT[:40])
+
+    def test_overlapping_chunk_is_rejected(self):
+        # Stands in for a request still streaming its chunk
+        with open(uploads.partial_path(self.upload), "r+b") as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            response = self.put_chunk(0, CONTENT[:40])
+            self.assertEqual(response.status_code, 409)
+            self.assertIn("in progress", response.json()["error"])
+            self.assertEqual(response.json()["received"], 0)
+        self.assertEqual(self.put_chunk(0, CONTENT[:40]).json()["received"], 40)
+
+
+class DownloadTests(TempMediaMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.patient = Patient.objects.create(owner=cls.owner, name="Ada", age=40, gender="female")
+
+    def setUp(self):
+        super().setUp()
+        blob = blobs.acquire(CONTENT_SHA256, len(CONTENT), ContentFile(CONTENT))
+        report = LabReport.objects.create(
+            patient=self.patient,
+            uploaded_by=self.owner,
+            report_type="CBC",
+            report_date="2024-01-15",
+            file=blob.name,
+            blob=blob,
+            filename="cbc.pdf",
+        )
+        self.url = f"/api/labreports/{report.pk}/download/"
+        self.client.force_authenticate(self.owner)
+        self.full = self.client.get(self.url)
+        self.addCleanup(self.full.close)
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_whole_file(self):
+        self.assertEqual(self.full.status_code, 200)
+        self.assertEqual(self.body(self.full), CONTENT)
+        self.assertEqual(self.full["Accept-Ranges"], "bytes")
+        self.assertEqual(self.full["Content-Type"], "application/pdf")
+        self.assertIn('filename="cbc.pdf"', self.full["Content-Disposition"])
+
+    def test_ranges(self):
+        for header, status, expected, content_range in (
+            ("bytes=10-19", 206, CONTENT[10:20], "bytes 10-19/100"),
+            ("bytes=90-", 206, CONTENT[90:], "bytes 90-99/100"),
+            ("bytes=95-500", 206, CONTENT[95:], "bytes 95-99/100"),
+            ("bytes=-5", 206, CONTENT[-5:], "bytes 95-99/100"),
+        ):
+            with self.subTest(header=header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(self.body(response), expected)
+                self.assertEqual(response["Content-Range"], content_range)
+                self.assertEqual(response["Content-Length"], str(len(expected)))
+
+    def test_unsatisfiable_and_ignored_ranges(self):
+        for header in ("bytes=100-", "bytes=20-10", "bytes=-0"):
+            with self.subTest(header=header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response["Content-Range"], "bytes */100")
+        # Multiple or malformed ranges get the whole file
+        for header in ("bytes=0-1,5-6", "items=0-1"):
+            with self.subTest(header=header):
+                self.assertEqual(self.body(self.get(Range=header)), CONTENT)
+
+    def test_if_none_match(self):
+        etag = self.full["ETag"]
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 304)
+        self.assertEqual(self.get(If_None_Match='"stale"').status_code, 200)
+        self.assertEqual(self.get(If_Modified_Since=self.full["Last-Modified"]).status_code, 304)
+
+    def test_if_range(self):
+        etag, last_modified = self.full["ETag"], self.full["Last-Modified"]
+        self.assertEqual(self.get(Range="bytes=0-9", If_Range=etag).status_code, 206)
+        self.assertEqual(self.get(Range="bytes=0-9", If_Range=last_modified).status_code, 206)
+        # A changed file ignores the range and sends everything
+        stale = self.get(Range="bytes=0-9", If_Range='"stale"')
+        self.assertEqual((stale.status_code, self.body(stale)), (200, CONTENT))
+        self.assertEqual(
+            self.get(Range="bytes=0-9", If_Range="Mon, 01 Jan 2001 00:00:00 GMT").status_code, 200
+        )
+
+    @override_settings(LAB_REPORT_SENDFILE="x-accel-redirect", LAB_REPORT_ACCEL_PREFIX="/protected/")
+    def test_offloaded(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["X-Accel-Redirect"].startswith("/protected/blobs/"))
+        self.assertEqual(response.content, b"")
+
+    def test_other_users_report(self):
+        self.client.force_authenticate(User.objects.create_user(username="other", password="x"))
+        self.assertEqual(self.get().status_code, 403)
+
+
+class PreviewJobTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.blobs = [
+            blobs.acquire(hashlib.sha256(data).hexdigest(), len(data), ContentFile(data))
+            for data in (b"first", b"second")
+        ]
+        self.jobs = list(PreviewJob.objects.order_by("id"))
+
+    def test_claim_marks_jobs_running_once(self):
+        claimed = jobs.claim(limit=1)
+        self.assertEqual([job.pk for job in claimed], [self.jobs[0].pk])
+        self.assertEqual([job.pk for job in jobs.claim(limit=5)], [self.jobs[1].pk])
+        self.assertEqual(jobs.claim(limit=5), [])
+        first = PreviewJob.objects.get(pk=self.jobs[0].pk)
+        self.assertEqual((first.status, first.attempts), ("running", 1))
+
+    def test_stale_running_jobs_are_claimed_again(self):
+        jobs.claim(limit=5)
+        PreviewJob.objects.filter(pk=self.jobs[0].pk).update(
+            started_at=timezone.now() - jobs.STALE_AFTER - timedelta(minutes=1)
+        )
+        reclaimed = jobs.claim(limit=5)
+        self.assertEqual([(job.pk, job.attempts) for job in reclaimed], [(self.jobs[0].pk, 2)])
+
+    def test_failures_retry_until_max_attempts(self):
+        for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+            (job,) = jobs.claim(limit=1)
+            self.assertEqual(job.attempts, attempt)
+            with self.assertLogs("labreports.jobs", "WARNING"):
+                jobs.fail(job, ValueError("unreadable"))
+        job = PreviewJob.objects.get(pk=self.jobs[0].pk)
+        self.assertEqual((job.status, job.error), ("failed", "unreadable"))
+        self.assertEqual([job.pk for job in jobs.claim(limit=5)], [self.jobs[1].pk])
+
+    def test_run_batch(self):
+        def render(path):
+            with open(path, "rb") as f:
+                if f.read() == b"second":
+                    raise ValueError("not a PDF")
+            return {"preview": b"png", "text": "Hb 13.5\0"}
+
+        with mock.patch("labreports.previews.render", side_effect=render), ThreadPoolExecutor(2) as pool:
+            with self.assertLogs("labreports.jobs", "WARNING") as logs:
+                jobs._run_batch(pool, jobs.claim(limit=5))
+        self.assertIn("not a PDF", logs.output[0])
+        done, retry = PreviewJob.objects.order_by("id")
+        self.assertEqual((done.status, retry.status), ("done", "pending"))
+        self.assertEqual(retry.error, "not a PDF")
+        blob = StoredBlob.objects.get(pk=self.blobs[0].pk)
+        self.assertEqual(blob.text, "Hb 13.5")
+        with blobs.storage().open(blob.preview) as f:
+            self.assertEqual(f.read(), b"png")
+
+    def test_enqueue_missing(self):
+        PreviewJob.objects.all().delete()
+        self.assertEqual(jobs.enqueue_missing(), 2)
+        self.assertEqual(jobs.enqueue_missing(), 0)
+
+
+class LabReportListTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        other = User.objects.create_user(username="other", password="x")
+        cls.ada = Patient.objects.create(owner=cls.owner, name="Ada", age=40, gender="female")
+        cy = Patient.objects.create(owner=other, name="Cy", age=60, gender="male")
+        cls.cbc = LabReport.objects.create(patient=cls.ada, report_type="CBC", report_date="2024-01-15")
+        cls.lipids = LabReport.objects.create(patient=cls.ada, report_type="Lipids", report_date="2024-03-01")
+        LabReport.objects.create(patient=cy, report_type="CBC", report_date="2024-01-15")
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+
+    def ids(self, params=None):
+        response = self.client.get("/api/labreports/", params)
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_scoped_and_filtered(self):
+        self.assertEqual(self.ids(), [self.lipids.pk, self.cbc.pk])
+        self.assertEqual(self.ids({"report_type": "cbc"}), [self.cbc.pk])
+        self.assertEqual(self.ids({"from": "2024-02-01"}), [self.lipids.pk])
+
+    def test_bad_filters_are_bad_requests(self):
+        for params in ({"patient": "x"}, {"to": "2024-02-30"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get("/api/labreports/", params).status_code, 400)
@@ -0,0 +1,196 @@
+# labreports/uploads.py
+"""
+Chunked, resumable lab report uploads.
+
+1. ``start`` records the report's metadata plus the file's name, size and
+   SHA-256.
+2. The client PUTs the bytes in chunks, each at the offset the server
+   reports (``received``). ``write_chunk`` streams the request body straight
+   into a partial file under MEDIA_ROOT, a block at a time. Whatever arrived
+   before a disconnect is kept, so the client resumes from the new offset.
+   One chunk per upload is written at a time; an overlapping request gets 409.
+3. ``finalize`` hashes the partial file and, if it matches, stores it as a
+   content-addressed blob (``labreports.blobs``) for the new ``LabReport``.
+   On the filesystem storage that is a rename rather than a copy, and no
+   write at all when the blob already exists.
+
+When the patient already has a report with the same SHA-256 and size,
+``start`` marks the upload as fully received and the client can finalize
+straight away without sending the bytes again.
+"""
+import fcntl
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.http import UnreadablePostError
+from django.utils import timezone
+
+from . import blobs
+from .models import LabReport, LabReportUpload
+
+MAX_UPLOAD_SIZE = 2 * 1024 ** 3
+MAX_CHUNK_SIZE = 32 * 1024 ** 2
+READ_BLOCK_SIZE = 64 * 1024
+# Under MEDIA_ROOT, so finished files can be renamed into place
+PARTIAL_DIR = "partial"
+
+
+class UploadError(Exception):
+    """A chunk or finalize request that cannot be applied; ``status`` is the HTTP code."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _PartialFile(File):
+    # FileSystemStorage moves files that expose a temporary path instead of copying them
+    def temporary_file_path(self):
+        return self.name
+
+
+def partial_path(upload):
+    return Path(settings.MEDIA_ROOT) / PARTIAL_DIR / f"{upload.pk}.part"
+
+
+def start(upload):
+    if blobs.for_patient(upload.sha256, upload.size, upload.patient_id) is not None:
+        upload.received = upload.size
+        upload.save(update_fields=["received", "updated_at"])
+        return
+    path = partial_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def _check_chunk(upload, offset, length):
+    if upload.status != "pending":
+        raise UploadError("Upload is already finalized", status=409)
+    if offset != upload.received:
+        raise UploadError(f"Expected offset {upload.received}", status=409)
+    if length > MAX_CHUNK_SIZE:
+        raise UploadError(f"Chunks may be at most {MAX_CHUNK_SIZE} bytes", status=413)
+    if offset + length > upload.size:
+        raise UploadError(f"Chunk runs past the declared size of {upload.size} bytes")
+
+
+def write_chunk(upload_id, offset, stream, length):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset``. Returns the
+    upload with its new ``received``.
+
+    The request holds an exclusive ``flock`` on the partial file from before
+    the offset check until ``received`` is saved, so chunks of one upload
+    cannot interleave: a second request, such as a client retrying a chunk
+    that is still streaming in, gets 409 instead of waiting. No transaction
+    is open while the body streams in, so a slow client holds neither a row
+    lock nor a connection's transaction.
+    """
+    upload = LabReportUpload.objects.get(pk=upload_id)
+    _check_chunk(upload, offset, length)
+    try:
+        f = open(partial_path(upload), "r+b")
+    except FileNotFoundError:
+        raise UploadError("Upload was aborted", status=410)
+
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk of this upload is in progress; retry once it finishes", status=409)
+        # Again under the lock: the request that held it may have moved the offset
+        upload.refresh_from_db(fields=["status", "received"])
+        _check_chunk(upload, offset, length)
+
+        written = 0
+        # Drops bytes of an earlier chunk that were never acknowledged
+        f.seek(offset)
+        f.truncate()
+        try:
+            while written < length:
+                block = stream.read(min(READ_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+        except UnreadablePostError:
+            # The client went away mid-chunk; keep what arrived so it can resume from there
+            pass
+        f.flush()
+        os.fsync(f.fileno())
+
+        updated_at = timezone.now()
+        advanced = LabReportUpload.objects.filter(pk=upload.pk, status="pending", received=offset).update(
+            received=offset + written, updated_at=updated_at
+        )
+    # Only an abort or finalize racing this chunk gets here
+    if not advanced:
+        raise UploadError("Upload was aborted or finalized during this chunk", status=409)
+    upload.received = offset + written
+    upload.updated_at = updated_at
+    return upload
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(upload_id):
+    """Verify the checksum and create the ``LabReport``; safe to retry."""
+    with transaction.atomic():
+        upload = LabReportUpload.objects.select_for_update().select_related("patient").get(pk=upload_id)
+        if upload.status == "complete":
+            return upload.lab_report
+        if upload.received != upload.size:
+            raise UploadError(f"Received {upload.received} of {upload.size} bytes", status=409)
+
+        path = partial_path(upload)
+        if not path.exists():
+            # Deduplicated at start: no bytes were sent
+            blob = blobs.for_patient(upload.sha256, upload.size, upload.patient_id)
+            if blob is None:
+                raise UploadError("The stored copy of this file is gone; start a new upload", status=410)
+            return _create_report(upload, blobs.acquire(blob.sha256, blob.size))
+        if _sha256(path) == upload.sha256:
+            with _PartialFile(open(path, "rb"), name=str(path)) as content:
+                blob = blobs.acquire(upload.sha256, upload.size, content)
+            # Still there when the blob already existed
+            path.unlink(missing_ok=True)
+            return _create_report(upload, blob)
+
+        # The stored bytes are wrong somewhere; start over rather than guess where
+        with open(path, "r+b") as f:
+            f.truncate(0)
+        upload.received = 0
+        upload.save(update_fields=["received", "updated_at"])
+    raise UploadError("Checksum mismatch; the upload was reset to offset 0")
+
+
+def _create_report(upload, blob):
+    report = LabReport.objects.create(
+        patient=upload.patient,
+        uploaded_by=upload.uploaded_by,
+        report_type=upload.report_type,
+        report_date=upload.report_date,
+        notes=upload.notes,
+        file=blob.name,
+        blob=blob,
+        filename=upload.filename,
+    )
+    upload.lab_report = report
+    upload.status = "complete"
+    upload.save(update_fields=["lab_report", "status", "updated_at"])
+    return report
+
+
+def abort(upload):
+    partial_path(upload).unlink(missing_ok=True)
+    upload.delete()
@@ -1,7 +1,9 @@
 from rest_framework.routers import DefaultRouter
-from .views import LabReportViewSet
+from .views import LabReportUploadViewSet, LabReportViewSet
 
 router = DefaultRouter()
+# Before the '' prefix, whose detail route would otherwise match "uploads/"
+router.register(r'uploads', LabReportUploadViewSet, basename='labreport-upload')
 router.register(r'', LabReportViewSet, basename='labreport')
 
 urlpatterns = router.urls
@@ -1,8 +1,194 @@
-from rest_framework import viewsets, permissions
-from .models import LabReport
-from .serializers import LabReportSerializer
+import os
 
-class LabReportViewSet(viewsets.ModelViewSet):
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.generics import get_object_or_404
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.response import Response
+
+from patients.permissions import IsOwnerOrStaff
+from patients.scoping import RECORD_FILTER_PARAMETERS, PatientScopedRecordsMixin, is_clinical
+from . import downloads, uploads
+from .models import LabReport, LabReportUpload, PreviewJob
+from .serializers import LabReportSerializer, LabReportUploadSerializer
+
+
+class _AnyAccept(BaseContentNegotiation):
+    """Downloads answer with a file whatever the Accept header; errors still render as JSON."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class LabReportViewSet(PatientScopedRecordsMixin, viewsets.ModelViewSet):
+    """
+    Lab reports of the patients the user may see; also served at
+    /api/patients/<patient_id>/labreports/.
+    """
     queryset = LabReport.objects.all().order_by("-created_at")
     serializer_class = LabReportSerializer
     permission_classes = [permissions.IsAuthenticated]
+    date_field = "report_date"
+
+    def get_queryset(self):
+        return LabReportSerializer.with_preview(self.scoped(super().get_queryset()))
+
+    def filter_records(self, queryset, params):
+        queryset = super().filter_records(queryset, params)
+        report_type = params.get("report_type")
+        if report_type:
+            queryset = queryset.filter(report_type__iexact=report_type)
+        return queryset
+
+    @extend_schema(
+        parameters=[
+            *RECORD_FILTER_PARAMETERS,
+            OpenApiParameter(
+                name="report_type",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Filter by report type (case-insensitive)",
+                required=False,
+            ),
+        ],
+        responses={200: LabReportSerializer(many=True)},
+    )
+    def list(self, request, *args, **kwargs):
+        """List lab reports, newest first; from/to apply to report_date"""
+        return super().list(request, *args, **kwargs)
+
+    def _authorized_report(self, request, pk):
+        """The report, if the user owns its patient or is clinical staff."""
+        report = get_object_or_404(LabReport.objects.select_related("patient", "blob"), pk=pk)
+        if not IsOwnerOrStaff().has_object_permission(request, self, report):
+            raise PermissionDenied()
+        return report
+
+    @action(detail=True, methods=["get"], content_negotiation_class=_AnyAccept)
+    def download(self, request, pk=None):
+        """
+        GET /api/labreports/<id>/download/?inline=1
+            → The report file, for the patient's owner or clinical staff.
+              Supports Range, ETag/If-None-Match and Last-Modified/If-Modified-Since.
+        """
+        report = self._authorized_report(request, pk)
+        if not report.file:
+            raise NotFound("This report has no file.")
+        return downloads.report_file_response(request, report, as_attachment=request.query_params.get("inline") != "1")
+
+    @action(detail=True, methods=["get"], content_negotiation_class=_AnyAccept)
+    def preview(self, request, pk=None):
+        """
+        GET /api/labreports/<id>/preview/
+            → PNG thumbnail made by process_lab_report_jobs (404 until then)
+        """
+        report = self._authorized_report(request, pk)
+        if report.blob is None or not report.blob.preview:
+            raise NotFound("No preview yet.")
+        stem = os.path.splitext(report.filename or "report")[0]
+        return downloads.file_response(
+            request,
+            report.file.storage,
+            report.blob.preview,
+            f"{stem}-preview.png",
+            report.blob.updated_at,
+            as_attachment=False,
+        )
+
+    @action(detail=True, methods=["get"])
+    def text(self, request, pk=None):
+        """
+        GET /api/labreports/<id>/text/
+            → Text extracted from the file; status is the extraction job's
+              (pending/running/done/failed, or null for files without one)
+        """
+        report = self._authorized_report(request, pk)
+        job = PreviewJob.objects.filter(blob_id=report.blob_id).values_list("status", flat=True).first()
+        return Response({
+            "id": report.pk,
+            "status": job,
+            "text": report.blob.text if report.blob else "",
+        })
+
+
+class LabReportUploadViewSet(viewsets.GenericViewSet):
+    """
+    Chunked, resumable upload of a lab report file (see labreports/uploads.py).
+
+    POST   /api/labreports/uploads/                      → start; metadata + filename, size, sha256
+    GET    /api/labreports/uploads/<id>/                 → progress; resume from "received"
+    PUT    /api/labreports/uploads/<id>/?offset=N        → raw bytes of the next chunk
+    POST   /api/labreports/uploads/<id>/finalize/        → verify sha256, create the LabReport
+    DELETE /api/labreports/uploads/<id>/                 → abort
+    """
+    serializer_class = LabReportUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = LabReportUpload.objects.all()
+        if not is_clinical(user):
+            queryset = queryset.filter(uploaded_by=user)
+        return queryset
+
+    def _error(self, upload, error):
+        upload.refresh_from_db(fields=["received"])
+        return Response({"error": str(error), "received": upload.received}, status=error.status)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        patient = serializer.validated_data["patient"]
+        if not is_clinical(request.user) and patient.owner_id != request.user.id:
+            raise PermissionDenied("You can only upload reports for your own patients.")
+        upload = serializer.save(uploaded_by=request.user)
+        uploads.start(upload)
+        data = dict(serializer.data, maxChunkSize=uploads.MAX_CHUNK_SIZE)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self.get_object()).data)
+
+    def update(self, request, *args, **kwargs):
+        upload = self.get_object()
+        try:
+            offset = int(request.query_params.get("offset", ""))
+            length = int(request.META.get("CONTENT_LENGTH") or "")
+        except ValueError:
+            return Response(
+                {"error": "Send the chunk offset as ?offset= and a Content-Length header"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if length <= 0 or offset < 0:
+            return Response({"error": "Empty chunk or negative offset"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # request.stream, not request.data: the body is never buffered or parsed
+            upload = uploads.write_chunk(upload.pk, offset, request.stream, length)
+        except uploads.UploadError as e:
+            return self._error(upload, e)
+        return Response({"id": upload.pk, "received": upload.received, "size": upload.size})
+
+    def destroy(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if upload.status == "complete":
+            return Response({"error": "Upload is already finalized"}, status=status.HTTP_409_CONFLICT)
+        uploads.abort(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            report = uploads.finalize(upload.pk)
+        except uploads.UploadError as e:
+            return self._error(upload, e)
+        return Response(
+            LabReportSerializer(report, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED,
+        )
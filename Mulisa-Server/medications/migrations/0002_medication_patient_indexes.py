@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0001_initial'),
+        ('patients', '0008_vital_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['patient', 'created_at'], name='medications_patient_d844ec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['patient', 'start_date'], name='medications_patient_ca7dfb_idx'),
+        ),
+    ]
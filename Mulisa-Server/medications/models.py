@@ -15,5 +15,12 @@ class Medication(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Per-patient lists: newest first, and by start date (filters, chart)
+            models.Index(fields=["patient", "created_at"]),
+            models.Index(fields=["patient", "start_date"]),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.patient})"
@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from mulisa_api.metrics import TimedSerializerMixin
+from mulisa_api.sparse import SparseFieldsMixin
 from .models import Medication
 
-class MedicationSerializer(serializers.ModelSerializer):
+class MedicationSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Medication
         fields = "__all__"
@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from medications.models import Medication
+from patients.models import Patient
+
+
+class MedicationScopingTests(APITestCase):
+    """Lists only show visible patients' records; bad filters are a 400."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.other = User.objects.create_user(username="other", password="x")
+        cls.clinician = User.objects.create_user(username="clinician", password="x", role="clinician")
+        cls.ada = Patient.objects.create(owner=cls.owner, name="Ada", age=40, gender="female")
+        cls.bob = Patient.objects.create(owner=cls.owner, name="Bob", age=50, gender="male")
+        cls.cy = Patient.objects.create(owner=cls.other, name="Cy", age=60, gender="male")
+        today = timezone.localdate()
+        cls.current = cls.medication(cls.ada, "Metformin", date(2024, 1, 10))
+        cls.ended = cls.medication(cls.ada, "Amoxicillin", date(2024, 3, 1), end_date=today - timedelta(days=1))
+        cls.bobs = cls.medication(cls.bob, "Lisinopril", date(2024, 2, 1))
+        cls.cys = cls.medication(cls.cy, "Atorvastatin", date(2024, 2, 1))
+
+    @classmethod
+    def medication(cls, patient, name, start_date, **fields):
+        return Medication.objects.create(
+            patient=patient, name=name, dosage="1 tab", frequency="daily", start_date=start_date, **fields
+        )
+
+    def ids(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return {row["id"] for row in response.json()["results"]}
+
+    def test_flat_list_is_scoped_to_visible_patients(self):
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.ids("/api/medications/"), {self.current.pk, self.ended.pk, self.bobs.pk})
+        self.assertEqual(self.ids("/api/medications/", {"patient": self.cy.pk}), set())
+        self.client.force_authenticate(self.clinician)
+        self.assertEqual(len(self.ids("/api/medications/")), 4)
+
+    def test_filters(self):
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.ids("/api/medications/", {"patient": self.bob.pk}), {self.bobs.pk})
+        self.assertEqual(
+            self.ids("/api/medications/", {"from": "2024-02-01", "to": "2024-02-29"}), {self.bobs.pk}
+        )
+        self.assertEqual(
+            self.ids(f"/api/patients/{self.ada.pk}/medications/", {"active": "true"}), {self.current.pk}
+        )
+
+    def test_nested_route(self):
+        self.client.force_authenticate(self.owner)
+        base = f"/api/patients/{self.ada.pk}/medications/"
+        self.assertEqual(self.ids(base), {self.current.pk, self.ended.pk})
+        response = self.client.post(base, {
+            "patient": self.bob.pk, "name": "Ibuprofen", "dosage": "200 mg",
+            "frequency": "as needed", "start_date": "2024-04-01",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        # The URL's patient wins over the body's
+        self.assertEqual(Medication.objects.get(pk=response.json()["id"]).patient_id, self.ada.pk)
+        self.assertEqual(self.client.get(f"/api/patients/{self.cy.pk}/medications/").status_code, 403)
+        self.assertEqual(self.client.get("/api/patients/999999/medications/").status_code, 404)
+
+    def test_bad_filters_are_bad_requests(self):
+        self.client.force_authenticate(self.owner)
+        for param, value in (
+            ("patient", "abc"),
+            ("patient", "١"),  # Arabic-Indic digit one
+            ("from", "2024-02-30"),
+            ("to", "junk"),
+            ("active", "maybe"),
+        ):
+            with self.subTest(param=param, value=value):
+                response = self.client.get("/api/medications/", {param: value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(param, response.json()["error"])
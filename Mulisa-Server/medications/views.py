@@ -1,8 +1,50 @@
+from django.db.models import Q
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets, permissions
+
+from patients.scoping import RECORD_FILTER_PARAMETERS, FilterError, PatientScopedRecordsMixin
 from .models import Medication
 from .serializers import MedicationSerializer
 
-class MedicationViewSet(viewsets.ModelViewSet):
+
+class MedicationViewSet(PatientScopedRecordsMixin, viewsets.ModelViewSet):
+    """
+    Medications of the patients the user may see; also served at
+    /api/patients/<patient_id>/medications/.
+    """
     queryset = Medication.objects.all().order_by("-created_at")
     serializer_class = MedicationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    date_field = "start_date"
+
+    def get_queryset(self):
+        return self.scoped(super().get_queryset())
+
+    def filter_records(self, queryset, params):
+        queryset = super().filter_records(queryset, params)
+        active = params.get("active", "").lower()
+        if active in ("1", "true"):
+            # Same rule as the patient chart's active medications
+            queryset = queryset.filter(Q(end_date__isnull=True) | Q(end_date__gte=timezone.localdate()))
+        elif active not in ("", "0", "false"):
+            raise FilterError("active must be true or false")
+        return queryset
+
+    @extend_schema(
+        parameters=[
+            *RECORD_FILTER_PARAMETERS,
+            OpenApiParameter(
+                name="active",
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                description="Only medications without an end date, or ending today or later",
+                required=False,
+            ),
+        ],
+        responses={200: MedicationSerializer(many=True)},
+    )
+    def list(self, request, *args, **kwargs):
+        """List medications, newest first; from/to apply to start_date"""
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,23 @@
+# mulisa_api/caching.py
+"""
+Whether cached read paths may be used.
+
+Slot grids, calendar feed versions and patient charts are invalidated by
+bumping version keys in the default cache. A process-local backend would
+only see bumps made in the same process, so writes from another worker,
+the admin of another process, the shell or a management command would
+leave other processes serving stale data until the TTL. Those caches are
+therefore only switched on when the default cache is shared between
+processes (Redis, Memcached, database or file based).
+"""
+from django.conf import settings
+
+PROCESS_LOCAL_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def is_shared():
+    """Whether the default cache is visible to every process."""
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
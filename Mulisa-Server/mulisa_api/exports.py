@@ -0,0 +1,156 @@
+# mulisa_api/exports.py
+"""
+Streaming CSV / NDJSON exports.
+
+An ``Export`` names the columns of a model to dump and the field that date
+ranges apply to. Its queryset may also be a list of querysets (e.g. an
+archive table and the live one), which are read one after the other. Rows are read with ``values_list().iterator()``, which uses
+a server-side cursor on PostgreSQL, and are encoded one chunk at a time.
+Memory therefore stays flat however many rows match, both in
+``export_response`` (HTTP) and in ``write_export`` (files, see the
+``export_data`` command).
+"""
+import csv
+from datetime import datetime, time
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class ExportError(ValueError):
+    """Bad export parameters."""
+
+
+class _Line:
+    """File-like object that hands back what csv.writer writes."""
+
+    def write(self, value):
+        return value
+
+
+class Export:
+    def __init__(self, name, queryset, columns, date_field):
+        self.name = name
+        self.queryset = queryset
+        self.columns = columns
+        self.date_field = date_field
+
+    def filter(self, patient_ids=None, start=None, end=None):
+        """The export's querysets, filtered."""
+        querysets = self.queryset if isinstance(self.queryset, (list, tuple)) else [self.queryset]
+        filtered = []
+        for queryset in querysets:
+            if patient_ids:
+                queryset = queryset.filter(patient_id__in=patient_ids)
+            if start is not None:
+                queryset = queryset.filter(**{f"{self.date_field}__gte": start})
+            if end is not None:
+                queryset = queryset.filter(**{f"{self.date_field}__lte": end})
+            filtered.append(queryset)
+        return filtered
+
+    def rows(self, querysets):
+        return chain.from_iterable(
+            queryset.values_list(*self.columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            for queryset in querysets
+        )
+
+    def iter_csv(self, rows):
+        writer = csv.writer(_Line())
+        batch = [writer.writerow(self.columns)]
+        for row in rows:
+            batch.append(writer.writerow([
+                value.isoformat() if hasattr(value, "isoformat") else value for value in row
+            ]))
+            if len(batch) >= EXPORT_CHUNK_SIZE:
+                yield "".join(batch)
+                batch = []
+        if batch:
+            yield "".join(batch)
+
+    def iter_ndjson(self, rows):
+        encoder = DjangoJSONEncoder(separators=(",", ":"))
+        batch = []
+        for row in rows:
+            batch.append(encoder.encode(dict(zip(self.columns, row))) + "\n")
+            if len(batch) >= EXPORT_CHUNK_SIZE:
+                yield "".join(batch)
+                batch = []
+        if batch:
+            yield "".join(batch)
+
+    def iter_format(self, rows, fmt):
+        if fmt not in FORMATS:
+            raise ExportError(f"output must be one of {', '.join(FORMATS)}")
+        return self.iter_csv(rows) if fmt == "csv" else self.iter_ndjson(rows)
+
+
+def parse_bound(value, end_of_day=False):
+    """ISO date or datetime -> aware datetime (dates cover the whole day)."""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        parsed = None if day is None else datetime.combine(day, time.max if end_of_day else time.min)
+        if parsed is None:
+            parsed = parse_datetime(value)
+    except ValueError:
+        # Well formed but impossible, e.g. February 30th
+        parsed = None
+    if parsed is None:
+        raise ExportError(f"Invalid date: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_patient_ids(value):
+    if not value:
+        return None
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise ExportError("patient_ids must be a comma-separated list of IDs")
+
+
+def export_response(export, params):
+    """
+    StreamingHttpResponse for query params ``output`` (csv|ndjson),
+    ``patient_ids``, ``from`` and ``to``. Raises ExportError on bad input.
+    """
+    fmt = params.get("output", "csv")
+    querysets = export.filter(
+        patient_ids=parse_patient_ids(params.get("patient_ids")),
+        start=parse_bound(params.get("from")),
+        end=parse_bound(params.get("to"), end_of_day=True),
+    )
+    chunks = export.iter_format(export.rows(querysets), fmt)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt])
+    stamp = timezone.now().strftime("%Y%m%d%H%M%S")
+    response["Content-Disposition"] = f'attachment; filename="{export.name}-{stamp}.{fmt}"'
+    return response
+
+
+def write_export(export, stream, fmt, patient_ids=None, start=None, end=None):
+    """Write an export to a text stream; returns the number of rows."""
+    querysets = export.filter(patient_ids=patient_ids, start=start, end=end)
+    written = 0
+
+    def counted(rows):
+        nonlocal written
+        for row in rows:
+            written += 1
+            yield row
+
+    for chunk in export.iter_format(counted(export.rows(querysets)), fmt):
+        stream.write(chunk)
+    return written
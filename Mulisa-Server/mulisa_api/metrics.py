@@ -0,0 +1,186 @@
+# mulisa_api/metrics.py
+"""
+In-process request metrics, exported in the Prometheus text format.
+
+``MetricsMiddleware`` opens a ``RequestMetrics`` for every request and
+records, per resolved URL name, latency, DB query count and DB time.
+Serializers that include ``TimedSerializerMixin`` add their rendering time,
+including any queries they trigger, which is where N+1 patterns show up.
+
+Counters live in the worker process, like the availability cache stats.
+Prometheus scrapes each worker and sums them.
+"""
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_SAMPLE_LIMIT = 50
+SLOW_SAMPLE_MAX_QUERIES = 100
+
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_views = {}
+_slow = deque(maxlen=SLOW_SAMPLE_LIMIT)
+
+
+class RequestMetrics:
+    """Measurements for one request."""
+
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.sql = [] if capture_sql else None
+
+    def record_query(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` hook."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if self.sql is not None and len(self.sql) < SLOW_SAMPLE_MAX_QUERIES:
+                self.sql.append({'sql': sql, 'time': round(elapsed, 6)})
+
+
+@contextmanager
+def activate(metrics):
+    """Make ``metrics`` the current request's while inside, for ``serializer_timer``."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+class serializer_timer:
+    """Adds the time spent inside to the current request; nested serializers count once."""
+
+    def __enter__(self):
+        self.metrics = _current.get()
+        if self.metrics is not None:
+            self.metrics.serializer_depth += 1
+            if self.metrics.serializer_depth == 1:
+                self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.metrics is not None:
+            self.metrics.serializer_depth -= 1
+            if self.metrics.serializer_depth == 0:
+                self.metrics.serializer_time += time.perf_counter() - self.started
+
+
+class TimedSerializerMixin:
+    """Count a serializer's rendering time towards the request's serializer time."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+def should_sample():
+    rate = getattr(settings, 'METRICS_SLOW_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def observe(view, method, status, duration, metrics):
+    with _lock:
+        stats = _views.get((view, method))
+        if stats is None:
+            stats = _views[(view, method)] = {
+                'buckets': [0] * len(LATENCY_BUCKETS),
+                'count': 0,
+                'sum': 0.0,
+                'statuses': {},
+                'queries': 0,
+                'db_time': 0.0,
+                'serializer_time': 0.0,
+            }
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                stats['buckets'][i] += 1
+        stats['count'] += 1
+        stats['sum'] += duration
+        status_class = f'{status // 100}xx'
+        stats['statuses'][status_class] = stats['statuses'].get(status_class, 0) + 1
+        stats['queries'] += metrics.queries
+        stats['db_time'] += metrics.db_time
+        stats['serializer_time'] += metrics.serializer_time
+
+
+def record_slow(sample):
+    with _lock:
+        _slow.append(sample)
+
+
+def slow_samples():
+    with _lock:
+        return list(_slow)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    from appointments.services import availability_cache
+
+    with _lock:
+        views = {key: dict(stats, statuses=dict(stats['statuses'])) for key, stats in _views.items()}
+
+    lines = [
+        '# HELP mulisa_http_request_duration_seconds Request latency by URL name.',
+        '# TYPE mulisa_http_request_duration_seconds histogram',
+    ]
+    for (view, method), stats in sorted(views.items()):
+        for bound, count in zip(LATENCY_BUCKETS, stats['buckets']):
+            lines.append(
+                f'mulisa_http_request_duration_seconds_bucket{_labels(view=view, method=method, le=bound)} {count}'
+            )
+        labels = _labels(view=view, method=method)
+        lines.append(
+            f'mulisa_http_request_duration_seconds_bucket{_labels(view=view, method=method, le="+Inf")} {stats["count"]}'
+        )
+        lines.append(f'mulisa_http_request_duration_seconds_sum{labels} {stats["sum"]:.6f}')
+        lines.append(f'mulisa_http_request_duration_seconds_count{labels} {stats["count"]}')
+
+    counters = [
+        ('mulisa_http_requests_total', 'Requests by URL name and status class.', None),
+        ('mulisa_db_queries_total', 'Database queries by URL name.', 'queries'),
+        ('mulisa_db_query_duration_seconds_total', 'Database time by URL name.', 'db_time'),
+        ('mulisa_serializer_duration_seconds_total', 'Serializer time by URL name.', 'serializer_time'),
+    ]
+    for name, help_text, field in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (view, method), stats in sorted(views.items()):
+            if field is None:
+                for status_class, count in sorted(stats['statuses'].items()):
+                    lines.append(f'{name}{_labels(view=view, method=method, status=status_class)} {count}')
+            else:
+                value = stats[field]
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{name}{_labels(view=view, method=method)} {value}')
+
+    for name, value in sorted(availability_cache.stats().items()):
+        metric = f'mulisa_availability_cache_{name}_total'
+        lines.append(f'# HELP {metric} Availability slot cache {name}.')
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,103 @@
+# mulisa_api/middleware.py
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _measuring(request_metrics):
+    """Count queries on every connection, and serializer time, towards ``request_metrics``."""
+    with metrics.activate(request_metrics), ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(request_metrics.record_query))
+        yield
+
+
+def _measured(content, request_metrics):
+    # Streamed bodies run their queries while the server iterates them,
+    # after the middleware has returned
+    iterator = iter(content)
+    while True:
+        with _measuring(request_metrics):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+class MetricsMiddleware:
+    """
+    Record latency, DB queries/time and serializer time per resolved URL name.
+
+    Streaming responses (exports, calendar feeds, downloads) are recorded
+    when the server closes them, so their figures include the body.
+
+    With ``METRICS_SLOW_SAMPLE_RATE`` > 0, that fraction of requests keeps its
+    SQL, and the ones slower than ``METRICS_SLOW_REQUEST_MS`` are kept as
+    slow samples (see ``/metrics/slow/``) and logged.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = metrics.should_sample()
+        request_metrics = metrics.RequestMetrics(capture_sql=sampled)
+        started = time.perf_counter()
+        with _measuring(request_metrics):
+            response = self.get_response(request)
+
+        if not response.streaming:
+            self.observe(request, response, request_metrics, started, sampled)
+            return response
+
+        # Files handed to wsgi.file_wrapper are left alone so sendfile() still applies
+        if getattr(response, 'file_to_stream', None) is None and not response.is_async:
+            response.streaming_content = _measured(response.streaming_content, request_metrics)
+        close = response.close
+        observed = False
+
+        def close_and_observe():
+            nonlocal observed
+            try:
+                close()
+            finally:
+                if not observed:
+                    observed = True
+                    self.observe(request, response, request_metrics, started, sampled)
+
+        # Servers call close() once the body is sent, or the client went away
+        response.close = close_and_observe
+        return response
+
+    def observe(self, request, response, request_metrics, started, sampled):
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match.route) if match else 'unresolved'
+        metrics.observe(view, request.method, response.status_code, duration, request_metrics)
+
+        if sampled and duration * 1000 >= getattr(settings, 'METRICS_SLOW_REQUEST_MS', 500):
+            metrics.record_slow({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration': round(duration, 6),
+                'queries': request_metrics.queries,
+                'db_time': round(request_metrics.db_time, 6),
+                'serializer_time': round(request_metrics.serializer_time, 6),
+                'sql': request_metrics.sql,
+            })
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in DB',
+                request.method, request.path, view, duration * 1000,
+                request_metrics.queries, request_metrics.db_time * 1000,
+            )
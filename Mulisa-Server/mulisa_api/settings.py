@@ -12,7 +12,6 @@ SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "dev-unsafe")
 DEBUG = os.getenv("DEBUG", "1") == "1"
 
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "127.0.0.1,localhost,10.0.2.2,10.0.0.79").split(",")
-print(f"DEBUG: ALLOWED_HOSTS = {ALLOWED_HOSTS}") 
 AUTH_USER_MODEL = "accounts.User"
 
 # -----------------------
@@ -42,6 +41,8 @@ INSTALLED_APPS = [
 # Middleware
 # -----------------------
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    "mulisa_api.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -83,6 +84,8 @@ if os.getenv("USE_SQLITE", "0") == "1":
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock up front so concurrent writers wait instead of failing
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
         }
     }
 else:
@@ -97,6 +100,53 @@ else:
         }
     }
 
+# -----------------------
+# Cache
+# -----------------------
+# Point CACHE_BACKEND/CACHE_LOCATION at a shared cache (e.g. Redis). The
+# local-memory default is per process, so slot grid, calendar feed and chart
+# caching stay off with it (see mulisa_api.caching).
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "mulisa"),
+    }
+}
+
+# Seconds a /patients/<id>/chart/ snapshot may be served from cache (0 disables;
+# off on a per-process cache); writes to the charted tables invalidate it on commit.
+PATIENT_CHART_CACHE_SECONDS = int(os.getenv("PATIENT_CHART_CACHE_SECONDS", "30"))
+
+# Calendar feed links stop working after this many days (0: only when revoked)
+CALENDAR_FEED_MAX_AGE_DAYS = int(os.getenv("CALENDAR_FEED_MAX_AGE_DAYS", "365"))
+
+# Vitals older than this many days are moved to the archive table by `manage.py archive_vitals`
+VITALS_HOT_DAYS = int(os.getenv("VITALS_HOT_DAYS", "365"))
+
+# -----------------------
+# Metrics
+# -----------------------
+# /metrics needs "Authorization: Bearer <METRICS_TOKEN>"; without a token it is served only in DEBUG.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Fraction of requests whose SQL is captured; those slower than the threshold are kept at /metrics/slow/
+METRICS_SLOW_SAMPLE_RATE = float(os.getenv("METRICS_SLOW_SAMPLE_RATE", "0"))
+METRICS_SLOW_REQUEST_MS = int(os.getenv("METRICS_SLOW_REQUEST_MS", "500"))
+
+# -----------------------
+# Logging
+# -----------------------
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        app: {"handlers": ["console"], "level": os.getenv("LOG_LEVEL", "INFO")}
+        for app in ("mulisa_api", "accounts", "patients", "medications", "labreports", "appointments")
+    },
+}
+
 # -----------------------
 # Password validation
 # -----------------------
@@ -119,6 +169,18 @@ USE_TZ = True
 # Static files
 # -----------------------
 STATIC_URL = "static/"
+
+# -----------------------
+# Uploaded files
+# -----------------------
+MEDIA_URL = "media/"
+MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", BASE_DIR / "media"))
+# How /api/labreports/<id>/download/ hands files to the front server after the auth check:
+# "" streams from Django, "x-sendfile" (Apache/lighttpd) sends the absolute path, and
+# "x-accel-redirect" (nginx) sends LAB_REPORT_ACCEL_PREFIX + the file name, which must map
+# to an `internal` location aliased to MEDIA_ROOT.
+LAB_REPORT_SENDFILE = os.getenv("LAB_REPORT_SENDFILE", "")
+LAB_REPORT_ACCEL_PREFIX = os.getenv("LAB_REPORT_ACCEL_PREFIX", "/protected-media/")
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "accounts.User" 
 # -----------------------
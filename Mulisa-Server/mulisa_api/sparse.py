@@ -0,0 +1,79 @@
+# mulisa_api/sparse.py
+"""
+Sparse fieldsets for read endpoints.
+
+``?fields=a,b`` keeps only the named top-level fields. ``?expand=x`` applies
+to the fields a serializer lists in ``Meta.expandable_fields`` (nested
+objects, or values that cost a query): they are rendered by default, and
+once ``expand`` is given only the named ones stay.
+
+``SparseFieldsMixin`` trims the serializer. ``SparseQuerysetMixin`` trims
+the view's queryset to match, so the joins and prefetches behind dropped
+fields never run. Only safe methods are affected: writes always see every
+field.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _names(value):
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def wants(request, name, expandable=False):
+    """Whether ``request`` asks for field ``name``."""
+    if request is None or request.method not in SAFE_METHODS:
+        return True
+    fields = _names(request.query_params.get("fields"))
+    if fields is not None and name not in fields:
+        return False
+    if expandable:
+        expand = _names(request.query_params.get("expand"))
+        if expand is not None and name not in expand:
+            return False
+    return True
+
+
+def _expandable(serializer_class):
+    return getattr(getattr(serializer_class, "Meta", None), "expandable_fields", ())
+
+
+class SparseFieldsMixin:
+    """Serializer mixin: drop top-level fields the request did not ask for."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+        expandable = _expandable(type(self))
+        for name in list(self.fields):
+            if not wants(request, name, name in expandable):
+                self.fields.pop(name)
+
+
+class SparseQuerysetMixin:
+    """
+    View mixin: apply ``field_select_related`` / ``field_prefetch_related``
+    ({field name: lookup or Prefetch}) only for the fields being rendered.
+    """
+    field_select_related = {}
+    # Values may be callables returning the lookups, so Prefetch querysets are built per request
+    field_prefetch_related = {}
+
+    def with_field_relations(self, queryset, serializer_class=None):
+        expandable = _expandable(serializer_class or self.get_serializer_class())
+        select, prefetch = [], []
+        for name, lookups in self.field_select_related.items():
+            if wants(self.request, name, name in expandable):
+                select.extend(lookups if isinstance(lookups, (list, tuple)) else [lookups])
+        for name, lookups in self.field_prefetch_related.items():
+            if wants(self.request, name, name in expandable):
+                lookups = lookups() if callable(lookups) else lookups
+                prefetch.extend(lookups if isinstance(lookups, (list, tuple)) else [lookups])
+        if select:
+            queryset = queryset.select_related(*dict.fromkeys(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
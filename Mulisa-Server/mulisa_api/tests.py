@@ -0,0 +1,43 @@
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from mulisa_api.exports import ExportError, parse_bound
+
+
+class ParseBoundTests(SimpleTestCase):
+    def test_dates_cover_the_whole_day(self):
+        start, end = parse_bound("2024-02-28"), parse_bound("2024-02-28", end_of_day=True)
+        self.assertEqual((start.hour, start.minute), (0, 0))
+        self.assertEqual((end.hour, end.minute), (23, 59))
+
+    def test_datetimes(self):
+        self.assertEqual(parse_bound("2024-02-28T10:30:00").hour, 10)
+        self.assertIsNone(parse_bound(""))
+
+    def test_malformed_and_impossible_dates(self):
+        for value in ("junk", "2024-02-30", "2024-13-01", "2024-02-30T10:00:00"):
+            with self.subTest(value=value), self.assertRaises(ExportError):
+                parse_bound(value)
+
+
+class ExportBadInputTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff", password="x", is_staff=True)
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+
+    def test_impossible_dates_are_bad_requests(self):
+        for url in ("/api/vitals/export/", "/api/appointments/export/"):
+            for param in ("from", "to"):
+                with self.subTest(url=url, param=param):
+                    response = self.client.get(url, {param: "2024-02-30"})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("error", response.json())
+
+    def test_export_command_reports_bad_dates(self):
+        with self.assertRaisesMessage(CommandError, "Invalid date: 2024-02-30"):
+            call_command("export_data", "vitals", "--from", "2024-02-30")
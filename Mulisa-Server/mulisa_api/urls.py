@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from .views import metrics_view, slow_requests_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -11,4 +12,6 @@ urlpatterns = [
     path('api/labreports/', include('labreports.urls')),
     path("api/", include("appointments.urls")),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="docs"),
+    path("metrics", metrics_view, name="metrics"),
+    path("metrics/slow/", slow_requests_view, name="metrics-slow"),
 ]
@@ -0,0 +1,31 @@
+# mulisa_api/views.py
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from . import metrics
+
+
+def _authorised(request):
+    """Scrapers send ``Authorization: Bearer <METRICS_TOKEN>``; without a token only DEBUG serves metrics."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return settings.DEBUG
+    return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+@require_GET
+def metrics_view(request):
+    """GET /metrics → Prometheus text exposition"""
+    if not _authorised(request):
+        raise Http404()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@require_GET
+def slow_requests_view(request):
+    """GET /metrics/slow/ → Recent sampled slow requests with their SQL"""
+    if not _authorised(request):
+        raise Http404()
+    return JsonResponse({'samples': metrics.slow_samples()})
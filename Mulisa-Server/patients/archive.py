@@ -0,0 +1,102 @@
+# patients/archive.py
+"""
+Hot/cold split of the vitals history.
+
+``Vital`` holds recent readings. ``archive_vitals`` moves readings recorded
+before a cutoff into ``VitalArchive``, in id-ordered batches that keep their
+ids. Each patient's latest reading always stays hot, so "latest" lookups
+(latest view, dashboard, chart, patient list) never need the archive.
+
+History reads go through ``history()``, a UNION ALL of both tables, each side
+range-scanning its own (patient, recorded_at) index. For a recent window the
+archive side finds nothing at once, so its cost stays flat as the archive
+grows.
+"""
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Vital, VitalArchive
+
+ARCHIVE_BATCH_SIZE = 2000
+
+# Columns copied to the archive, besides id and patient
+ARCHIVED_FIELDS = [
+    field.attname
+    for field in VitalArchive._meta.concrete_fields
+    if field.attname not in ("id", "patient_id", "archived_at")
+]
+HISTORY_FIELDS = ["id", "patient_id", *ARCHIVED_FIELDS]
+
+
+def _in_range(queryset, patient_id, start=None, end=None):
+    queryset = queryset.filter(patient_id=patient_id).order_by()
+    if start is not None:
+        queryset = queryset.filter(recorded_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(recorded_at__lte=end)
+    return queryset
+
+
+def history(patient_id, start=None, end=None):
+    """One patient's vitals from both tables, as dicts, newest first."""
+    return (
+        _in_range(Vital.objects.all(), patient_id, start, end)
+        .values(*HISTORY_FIELDS)
+        .union(_in_range(VitalArchive.objects.all(), patient_id, start, end).values(*HISTORY_FIELDS), all=True)
+        .order_by("-recorded_at", "-id")
+    )
+
+
+def get_vital(patient_id, vital_id):
+    """A hot ``Vital``, else an archived one; None if neither exists."""
+    for model in (Vital, VitalArchive):
+        vital = model.objects.filter(pk=vital_id, patient_id=patient_id).first()
+        if vital is not None:
+            return vital
+    return None
+
+
+def archivable(cutoff):
+    """Hot vitals recorded before ``cutoff`` that are not their patient's latest."""
+    newer = Vital.objects.filter(patient_id=OuterRef("patient_id")).filter(
+        Q(recorded_at__gt=OuterRef("recorded_at"))
+        | Q(recorded_at=OuterRef("recorded_at"), id__gt=OuterRef("id"))
+    )
+    return Vital.objects.filter(recorded_at__lt=cutoff).filter(Exists(newer)).order_by("id")
+
+
+def _delete(ids):
+    # Raw DELETE: a queryset delete would load every row to send post_delete,
+    # and archiving never changes anything the chart shows.
+    table = connection.ops.quote_name(Vital._meta.db_table)
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+
+
+def archive_vitals(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move archivable vitals to ``VitalArchive``, one transaction per batch.
+    Yields the number of rows moved by each batch.
+    """
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                archivable(cutoff).filter(id__gt=last_id).select_for_update(of=("self",))[:batch_size]
+            )
+            if not batch:
+                return
+            VitalArchive.objects.bulk_create(
+                [
+                    VitalArchive(
+                        id=vital.id,
+                        patient_id=vital.patient_id,
+                        **{name: getattr(vital, name) for name in ARCHIVED_FIELDS},
+                    )
+                    for vital in batch
+                ]
+            )
+            _delete([vital.id for vital in batch])
+        last_id = batch[-1].id
+        yield len(batch)
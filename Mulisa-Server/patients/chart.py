@@ -0,0 +1,103 @@
+# patients/chart.py
+"""
+Patient chart snapshot: patient with latest vitals, active medications,
+recent lab reports and upcoming appointments, each section in one query.
+
+Charts are cached for ``PATIENT_CHART_CACHE_SECONDS`` (0 disables caching)
+under a per-patient version. Saves and deletes of any table in the chart
+bump the version through signals (see ``patients.signals``), and the bulk
+write paths and the lab report job worker call ``bump`` directly, so a
+stale chart lives at most until the next write, never for the whole TTL.
+Bumps run once the write commits, and caching is off unless the default
+cache is shared between processes (``mulisa_api.caching``), since the
+worker and other processes bump it too.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
+
+from mulisa_api import caching
+
+from .models import Vital
+from .serializers import PatientSerializer
+
+RECENT_LAB_REPORTS = 10
+UPCOMING_APPOINTMENTS = 5
+
+
+def _version_key(patient_id):
+    return f"chart:ver:{patient_id}"
+
+
+def chart_version(patient_id):
+    key = _version_key(patient_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump(*patient_ids):
+    keys = [_version_key(pk) for pk in patient_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, None))
+
+
+def build_chart(patient, request):
+    from appointments.serializers import AppointmentFastSerializer
+    from appointments.models import Appointment
+    from labreports.models import LabReport
+    from labreports.serializers import LabReportSerializer
+    from medications.models import Medication
+    from medications.serializers import MedicationSerializer
+
+    prefetch_related_objects(
+        [patient],
+        Prefetch("vitals", queryset=Vital.objects.order_by("-recorded_at", "-id")[:1], to_attr="latest_vitals"),
+    )
+    context = {"request": request}
+    today = timezone.localdate()
+
+    medications = Medication.objects.filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=today),
+        patient_id=patient.pk,
+    ).order_by("-start_date", "-id")
+    lab_reports = LabReportSerializer.with_preview(LabReport.objects.filter(patient_id=patient.pk)).order_by(
+        "-report_date", "-created_at"
+    )[:RECENT_LAB_REPORTS]
+    appointments = AppointmentFastSerializer.project(
+        Appointment.objects.filter(
+            patient_id=patient.pk,
+            status="scheduled",
+            start__gte=timezone.now(),
+        ).order_by("start", "id")
+    )[:UPCOMING_APPOINTMENTS]
+
+    return {
+        "patient": PatientSerializer(patient, context=context).data,
+        "activeMedications": MedicationSerializer(medications, many=True, context=context).data,
+        "recentLabReports": LabReportSerializer(lab_reports, many=True, context=context).data,
+        "upcomingAppointments": AppointmentFastSerializer(appointments, many=True).data,
+    }
+
+
+def get_chart(patient, request):
+    """The chart for an already authorised ``patient``, from cache when fresh."""
+    timeout = getattr(settings, "PATIENT_CHART_CACHE_SECONDS", 0)
+    if not timeout or not caching.is_shared():
+        return build_chart(patient, request)
+
+    # Absolute file URLs and ?fields= depend on the request
+    variant = hashlib.md5(f"{request.get_host()}{request.get_full_path()}".encode()).hexdigest()
+    key = f"chart:{patient.pk}:{chart_version(patient.pk)}:{variant}"
+    chart = cache.get(key)
+    if chart is None:
+        chart = build_chart(patient, request)
+        cache.set(key, chart, timeout)
+    return chart
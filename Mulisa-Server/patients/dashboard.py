@@ -0,0 +1,92 @@
+# patients/dashboard.py
+"""
+Ward board: the latest vital of every patient in a set, with out-of-range
+flags.
+
+One query picks each patient's newest row with a correlated subquery
+(ORDER BY recorded_at DESC, id DESC LIMIT 1), which the (patient,
+recorded_at) index answers without reading the rest of their vitals, and
+joins the patient's name.
+
+With ``since``, only patients that have a vital written after it are
+included. Writes are tracked by ``Vital.updated_at``, so backdated device
+readings are picked up too. Clients poll with the ``asOf`` of their
+previous response.
+"""
+from django.db.models import OuterRef, Subquery
+
+from .models import Patient, Vital
+
+MAX_DASHBOARD_PATIENTS = 500
+
+# Adult reference ranges; values outside them are flagged "low"/"high"
+NORMAL_RANGES = {
+    "heart_rate": (60, 100),
+    "bp_sys": (90, 140),
+    "bp_dia": (60, 90),
+    "temperature_c": (36.1, 37.8),
+    "spo2": (95, 100),
+    "respiratory_rate": (12, 20),
+}
+
+# Model field -> key used by PatientSerializer.get_vitals
+VITAL_KEYS = {
+    "heart_rate": "heartRate",
+    "bp_sys": "bpSystolic",
+    "bp_dia": "bpDiastolic",
+    "height_cm": "heightCm",
+    "weight_kg": "weightKg",
+    "temperature_c": "temperatureC",
+    "spo2": "spo2",
+    "respiratory_rate": "respiratoryRate",
+}
+
+
+def flags_for(row):
+    flags = {}
+    for field, (low, high) in NORMAL_RANGES.items():
+        value = row[field]
+        if value is None:
+            continue
+        if value < low:
+            flags[VITAL_KEYS[field]] = "low"
+        elif value > high:
+            flags[VITAL_KEYS[field]] = "high"
+    return flags
+
+
+def latest_vitals(patients, since=None):
+    """Board rows for the patients in the ``patients`` queryset, by name."""
+    board_patients = Patient.objects.filter(pk__in=patients)
+    if since is not None:
+        board_patients = board_patients.filter(
+            pk__in=Vital.objects.filter(updated_at__gt=since).values("patient_id")
+        )
+    # One (patient, recorded_at) index probe per patient, never a scan of their history
+    newest = Vital.objects.filter(patient_id=OuterRef("pk")).order_by("-recorded_at", "-id").values("pk")[:1]
+    latest_ids = (
+        board_patients.annotate(latest_vital=Subquery(newest))
+        .filter(latest_vital__isnull=False)
+        .order_by("name", "pk")
+        .values("latest_vital")[:MAX_DASHBOARD_PATIENTS]
+    )
+    rows = Vital.objects.filter(pk__in=latest_ids).order_by("patient__name", "patient_id").values(
+        "id",
+        "patient_id",
+        "patient__name",
+        "recorded_at",
+        *VITAL_KEYS,
+    )
+
+    board = []
+    for row in rows:
+        vitals_out = {key: row[field] for field, key in VITAL_KEYS.items()}
+        vitals_out["recordedAt"] = row["recorded_at"]
+        board.append({
+            "patientId": row["patient_id"],
+            "name": row["patient__name"],
+            "vitalId": row["id"],
+            "vitals": vitals_out,
+            "flags": flags_for(row),
+        })
+    return board
@@ -0,0 +1,28 @@
+# patients/exports.py
+from mulisa_api.exports import Export
+
+from .models import Vital, VitalArchive
+
+VITALS = Export(
+    "vitals",
+    # Archived rows first, then the hot table; each matches its (patient, recorded_at) index
+    [
+        VitalArchive.objects.order_by("patient_id", "recorded_at", "id"),
+        Vital.objects.order_by("patient_id", "recorded_at", "id"),
+    ],
+    [
+        "id",
+        "patient_id",
+        "device_id",
+        "recorded_at",
+        "heart_rate",
+        "bp_sys",
+        "bp_dia",
+        "height_cm",
+        "weight_kg",
+        "temperature_c",
+        "spo2",
+        "respiratory_rate",
+    ],
+    date_field="recorded_at",
+)
@@ -0,0 +1,183 @@
+# patients/ingest.py
+"""
+Bulk ingestion of device vitals.
+
+Readings are validated column by column: every metric's values are checked
+against its plausible range in one pass, so cost grows with the number of
+columns rather than with per-row serializer work. Valid rows are written
+with ``bulk_create`` in chunks. Re-sent readings, with the same patient,
+device and timestamp, are skipped: first by a lookup of the batch's time
+window, then by the ``vital_unique_device_reading`` constraint for
+concurrent senders.
+"""
+import math
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import chart
+from .models import Patient, Vital, VitalArchive
+
+MAX_READINGS = 10000
+INSERT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+# Device clocks drift; readings further in the future than this are rejected
+FUTURE_TOLERANCE = timedelta(minutes=5)
+
+# Metric -> (low, high, integer only)
+PLAUSIBLE_RANGES = {
+    "heart_rate": (20, 300, True),
+    "bp_sys": (40, 300, True),
+    "bp_dia": (20, 200, True),
+    "height_cm": (20, 272, False),
+    "weight_kg": (0.5, 650, False),
+    "temperature_c": (25, 45, False),
+    "spo2": (50, 100, False),
+    "respiratory_rate": (2, 80, True),
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_metric(column, low, high, integer):
+    """Error message for each bad value in ``column`` (None for fine/missing values)."""
+    messages = [None] * len(column)
+    for i, value in enumerate(column):
+        if value is None:
+            continue
+        if not _is_number(value) or not math.isfinite(value) or (integer and value != int(value)):
+            messages[i] = "must be an integer" if integer else "must be a number"
+        elif not low <= value <= high:
+            messages[i] = f"must be between {low} and {high}"
+    return messages
+
+
+def _parse_timestamps(column, now):
+    values, messages = [None] * len(column), [None] * len(column)
+    for i, raw in enumerate(column):
+        if raw is None:
+            values[i] = now
+            continue
+        try:
+            parsed = parse_datetime(raw) if isinstance(raw, str) else None
+        except ValueError:
+            # Well formed but impossible, e.g. February 30th
+            parsed = None
+        if parsed is None:
+            messages[i] = "must be an ISO 8601 datetime"
+            continue
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        if parsed > now + FUTURE_TOLERANCE:
+            messages[i] = "is in the future"
+            continue
+        values[i] = parsed
+    return values, messages
+
+
+def validate(readings, user):
+    """
+    Split ``readings`` (dicts with patientId, deviceId, recordedAt and metric
+    fields) into Vital instances and ``{index: {field: message}}`` errors.
+    """
+    now = timezone.now()
+    errors = {}
+
+    def flag(messages, field):
+        for i, message in enumerate(messages):
+            if message is not None:
+                errors.setdefault(i, {}).setdefault(field, message)
+
+    if not all(isinstance(row, dict) for row in readings):
+        flag(["must be an object" if not isinstance(row, dict) else None for row in readings], "reading")
+    rows = [row if isinstance(row, dict) else {} for row in readings]
+
+    patient_ids = [row.get("patientId") for row in rows]
+    visible = Patient.objects.filter(pk__in={pk for pk in patient_ids if isinstance(pk, int) and not isinstance(pk, bool)})
+    if not (user.is_staff or getattr(user, "role", None) in ("admin", "clinician")):
+        visible = visible.filter(owner=user)
+    known = set(visible.values_list("pk", flat=True))
+    flag(
+        [None if pk in known and not isinstance(pk, bool) else "Patient not found." for pk in patient_ids],
+        "patientId",
+    )
+
+    device_ids = [row.get("deviceId") or "" for row in rows]
+    flag(
+        [None if isinstance(d, str) and len(d) <= 64 else "must be a string of at most 64 characters"
+         for d in device_ids],
+        "deviceId",
+    )
+
+    timestamps, messages = _parse_timestamps([row.get("recordedAt") for row in rows], now)
+    flag(messages, "recordedAt")
+
+    columns = {metric: [row.get(metric) for row in rows] for metric in PLAUSIBLE_RANGES}
+    for metric, (low, high, integer) in PLAUSIBLE_RANGES.items():
+        flag(_check_metric(columns[metric], low, high, integer), metric)
+    flag(
+        [None if any(columns[m][i] is not None for m in PLAUSIBLE_RANGES) else "no metrics in reading"
+         for i in range(len(rows))],
+        "reading",
+    )
+
+    vitals = [
+        Vital(
+            patient_id=patient_ids[i],
+            device_id=device_ids[i],
+            recorded_at=timestamps[i],
+            **{metric: columns[metric][i] for metric in PLAUSIBLE_RANGES},
+        )
+        for i in range(len(rows))
+        if i not in errors
+    ]
+    return vitals, errors
+
+
+def _drop_duplicates(vitals):
+    """Readings already stored, or repeated within the batch, are dropped."""
+    keyed = [v for v in vitals if v.device_id]
+    seen = set()
+    if keyed:
+        window = {
+            "patient_id__in": {v.patient_id for v in keyed},
+            "device_id__in": {v.device_id for v in keyed},
+            "recorded_at__range": (
+                min(v.recorded_at for v in keyed),
+                max(v.recorded_at for v in keyed),
+            ),
+        }
+        # Late re-sends of archived readings are duplicates too
+        for model in (Vital, VitalArchive):
+            seen.update(model.objects.filter(**window).values_list("patient_id", "device_id", "recorded_at"))
+    fresh = []
+    for vital in vitals:
+        if vital.device_id:
+            key = (vital.patient_id, vital.device_id, vital.recorded_at)
+            if key in seen:
+                continue
+            seen.add(key)
+        fresh.append(vital)
+    return fresh
+
+
+def ingest(readings, user):
+    """Validate and store ``readings``; returns a summary for the response."""
+    vitals, errors = validate(readings, user)
+    fresh = _drop_duplicates(vitals)
+    Vital.objects.bulk_create(fresh, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+    # bulk_create sends no post_save, so refresh charts here
+    chart.bump(*{vital.patient_id for vital in fresh})
+    return {
+        "received": len(readings),
+        "accepted": len(fresh),
+        "duplicates": len(vitals) - len(fresh),
+        "rejected": len(errors),
+        "errors": [
+            {"index": index, "errors": errors[index]}
+            for index in sorted(errors)[:MAX_REPORTED_ERRORS]
+        ],
+    }
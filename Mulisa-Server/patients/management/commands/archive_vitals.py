@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from patients.archive import ARCHIVE_BATCH_SIZE, archivable, archive_vitals
+
+
+class Command(BaseCommand):
+    help = (
+        "Move vitals older than the hot window to the archive table, keeping "
+        "each patient's latest reading hot"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.VITALS_HOT_DAYS,
+            help=f"Keep readings of the last N days hot (default {settings.VITALS_HOT_DAYS})",
+        )
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would move")
+
+    def handle(self, *args, **options):
+        if options["days"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--days and --batch-size must be positive")
+        cutoff = timezone.now() - timedelta(days=options["days"])
+
+        if options["dry_run"]:
+            self.stdout.write(f"{archivable(cutoff).count()} vitals recorded before {cutoff:%Y-%m-%d %H:%M} would be archived")
+            return
+
+        moved = 0
+        for count in archive_vitals(cutoff, batch_size=options["batch_size"]):
+            moved += count
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {moved} archived")
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} vitals recorded before {cutoff:%Y-%m-%d %H:%M}"))
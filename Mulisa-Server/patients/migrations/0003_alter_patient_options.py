@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_remove_patient_vital_bp_dia_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='patient',
+            options={'ordering': ['name']},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_alter_patient_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vital',
+            index=models.Index(fields=['patient', 'recorded_at'], name='patients_vi_patient_542ac9_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0004_vital_patient_recorded_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vital',
+            name='device_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='vital',
+            name='recorded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='vital',
+            constraint=models.UniqueConstraint(condition=models.Q(('device_id', ''), _negated=True), fields=('patient', 'device_id', 'recorded_at'), name='vital_unique_device_reading'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:35
+
+from django.db import migrations
+
+# Expressions match what icontains compiles to on PostgreSQL: UPPER("col"::text)
+TRIGRAM_INDEXES = {
+    "patients_patient_name_trgm": "name",
+    "patients_patient_email_trgm": "contact_email",
+    "patients_patient_phone_trgm": "contact_phone",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON patients_patient '
+            f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("patients", "0005_vital_device_readings"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
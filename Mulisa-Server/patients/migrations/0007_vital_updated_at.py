@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:35
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing rows were last written when they were recorded
+    Vital = apps.get_model("patients", "Vital")
+    Vital.objects.update(updated_at=F("recorded_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0006_patient_search_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vital',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
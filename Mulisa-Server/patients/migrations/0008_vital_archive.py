@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0007_vital_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VitalArchive',
+            fields=[
+                ('heart_rate', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('bp_sys', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('bp_dia', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('height_cm', models.FloatField(blank=True, null=True)),
+                ('weight_kg', models.FloatField(blank=True, null=True)),
+                ('temperature_c', models.FloatField(blank=True, null=True)),
+                ('spo2', models.FloatField(blank=True, null=True)),
+                ('respiratory_rate', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('device_id', models.CharField(blank=True, default='', max_length=64)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_vitals', to='patients.patient')),
+            ],
+            options={
+                'ordering': ['-recorded_at'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['patient', 'recorded_at'], name='patients_vi_patient_4378d7_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class Patient(models.Model):
@@ -39,12 +40,8 @@ class Patient(models.Model):
         return f"{self.name} ({self.gender})"
 
 
-class Vital(models.Model):
-    patient = models.ForeignKey(
-        Patient,
-        on_delete=models.CASCADE,
-        related_name="vitals"
-    )
+class VitalReading(models.Model):
+    """Measurement columns shared by the hot ``Vital`` table and its archive."""
 
     heart_rate = models.PositiveSmallIntegerField(blank=True, null=True)   # bpm
     bp_sys = models.PositiveSmallIntegerField(blank=True, null=True)       # systolic
@@ -55,10 +52,63 @@ class Vital(models.Model):
     spo2 = models.FloatField(blank=True, null=True)
     respiratory_rate = models.PositiveSmallIntegerField(blank=True, null=True)
 
-    recorded_at = models.DateTimeField(auto_now_add=True)
+    # Set by the server for app entries; devices send their own timestamps
+    recorded_at = models.DateTimeField(default=timezone.now)
+    # Source device for ingested readings, blank for manual entries
+    device_id = models.CharField(max_length=64, blank=True, default="")
 
     class Meta:
+        abstract = True
         ordering = ["-recorded_at"]
 
+
+class Vital(VitalReading):
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name="vitals"
+    )
+
+    # Server time of the last write, for ?since= polling (recorded_at can be backdated)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta(VitalReading.Meta):
+        indexes = [
+            # Range scans of one patient's history (series, latest)
+            models.Index(fields=["patient", "recorded_at"]),
+        ]
+        constraints = [
+            # Makes device re-sends idempotent
+            models.UniqueConstraint(
+                fields=["patient", "device_id", "recorded_at"],
+                condition=~models.Q(device_id=""),
+                name="vital_unique_device_reading",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Vitals for {self.patient.name} on {self.recorded_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class VitalArchive(VitalReading):
+    """
+    Vitals moved out of the hot table by ``archive_vitals``. Rows keep the id
+    they had in ``Vital``; each patient's latest reading is never archived.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name="archived_vitals"
+    )
+
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta(VitalReading.Meta):
+        indexes = [
+            models.Index(fields=["patient", "recorded_at"]),
+        ]
+
     def __str__(self):
-        return f"Vitals for {self.patient.name} on {self.recorded_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"Archived vitals for patient {self.patient_id} on {self.recorded_at.strftime('%Y-%m-%d %H:%M')}"
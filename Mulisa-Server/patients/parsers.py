@@ -0,0 +1,23 @@
+# patients/parsers.py
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON: one object per line, blank lines ignored."""
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        rows = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line.decode(encoding)))
+            except (ValueError, UnicodeDecodeError) as exc:
+                raise ParseError(f"NDJSON parse error on line {number}: {exc}")
+        return rows
@@ -0,0 +1,159 @@
+# patients/scoping.py
+"""
+Patient-scoped record viewsets (lab reports, medications).
+
+Records are visible under the rules of ``IsOwnerOrStaff``: clinical staff
+see every patient's, other users only those of patients they own. Each
+viewset is served twice, flat (``/api/labreports/?patient=<id>``) and nested
+under a patient (``/api/patients/<patient_id>/labreports/``). The nested
+route answers 404 for unknown patients and 403 for patients the user may not
+see, and creates records for its patient.
+
+List filters are applied in the database and backed by the records'
+(patient, ...) indexes, so one patient's list is an index range scan.
+"""
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .models import Patient
+
+RECORD_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        name="patient",
+        type=OpenApiTypes.INT,
+        location=OpenApiParameter.QUERY,
+        description="Filter by patient ID",
+        required=False,
+    ),
+    OpenApiParameter(
+        name="from",
+        type=OpenApiTypes.DATE,
+        location=OpenApiParameter.QUERY,
+        description="Earliest date (inclusive)",
+        required=False,
+    ),
+    OpenApiParameter(
+        name="to",
+        type=OpenApiTypes.DATE,
+        location=OpenApiParameter.QUERY,
+        description="Latest date (inclusive)",
+        required=False,
+    ),
+]
+
+
+def is_clinical(user):
+    return user.is_staff or getattr(user, "role", None) in ("admin", "clinician")
+
+
+class FilterError(ValueError):
+    """Bad list filter; answered with 400."""
+
+
+def datetime_param(params, name):
+    """Query param ``name`` as an aware datetime, None when absent."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        # Well formed but impossible, e.g. February 30th
+        parsed = None
+    if parsed is None:
+        raise FilterError(f"{name} must be an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class PatientScopedRecordsMixin:
+    # Model date field that ?from= / ?to= apply to
+    date_field = None
+
+    def get_patient(self):
+        """The nested route's patient (loaded once), or None on the flat route."""
+        if "patient_id" not in self.kwargs:
+            return None
+        if getattr(self, "_patient", None) is None:
+            try:
+                self._patient = Patient.objects.get(pk=self.kwargs["patient_id"])
+            except Patient.DoesNotExist:
+                raise NotFound("Patient not found.")
+        return self._patient
+
+    def check_patient(self, patient):
+        if not is_clinical(self.request.user) and patient.owner_id != self.request.user.id:
+            raise PermissionDenied("You do not have access to this patient's records.")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        patient = self.get_patient()
+        if patient is not None:
+            self.check_patient(patient)
+
+    def scoped(self, queryset):
+        """``queryset`` limited to visible records, and to the route's patient."""
+        user = self.request.user
+        if not is_clinical(user):
+            queryset = queryset.filter(patient__owner=user)
+        patient = self.get_patient()
+        if patient is not None:
+            queryset = queryset.filter(patient_id=patient.pk)
+        return queryset
+
+    def filter_records(self, queryset, params):
+        """Apply ?patient=, ?from= and ?to=; subclasses add their own filters."""
+        patient_id = params.get("patient")
+        if patient_id:
+            if not (patient_id.isascii() and patient_id.isdigit()):
+                raise FilterError("patient must be a patient ID")
+            queryset = queryset.filter(patient_id=int(patient_id))
+        for param, lookup in (("from", "gte"), ("to", "lte")):
+            value = params.get(param)
+            if value:
+                try:
+                    day = parse_date(value)
+                except ValueError:
+                    # Well formed but impossible, e.g. February 30th
+                    day = None
+                if day is None:
+                    raise FilterError(f"{param} must be an ISO date (YYYY-MM-DD)")
+                queryset = queryset.filter(**{f"{self.date_field}__{lookup}": day})
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list":
+            queryset = self.filter_records(queryset, self.request.query_params)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except FilterError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        writing = self.request.method not in SAFE_METHODS and not kwargs.get("many")
+        if writing and self.get_patient() is not None and "patient" in serializer.fields:
+            # Taken from the URL on nested routes
+            serializer.fields["patient"].read_only = True
+        return serializer
+
+    def perform_create(self, serializer):
+        patient = self.get_patient() or serializer.validated_data["patient"]
+        self.check_patient(patient)
+        serializer.save(patient=patient)
+
+    def perform_update(self, serializer):
+        if "patient" in serializer.validated_data:
+            self.check_patient(serializer.validated_data["patient"])
+        serializer.save()
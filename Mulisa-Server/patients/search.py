@@ -0,0 +1,55 @@
+# patients/search.py
+"""
+Typeahead search over patient name, phone and email.
+
+The lookups are plain ``icontains``/``istartswith``, which Django renders on
+PostgreSQL as ``UPPER(col::text) LIKE UPPER(...)``. Migration
+0006_patient_search_trgm adds GIN trigram indexes on exactly those
+expressions, so substring matches are index scans. When nothing matches, a
+second query falls back to trigram similarity on the name (``%``, on the
+same ``UPPER(name::text)`` expression so it uses the same index), which
+catches typos. SQLite has neither index nor operator: dev databases do a
+LIKE scan and skip the fuzzy pass.
+"""
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, TextField, Value, When
+from django.db.models.functions import Cast, Upper
+
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+SEARCH_FIELDS = ("id", "name", "age", "gender", "contact_phone", "contact_email")
+
+
+def search_patients(queryset, q, limit=DEFAULT_LIMIT):
+    """Up to ``limit`` lightweight patient dicts matching ``q``; name-prefix matches first."""
+    q = q.strip()
+    if len(q) < MIN_QUERY_LENGTH:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    matches = list(
+        queryset.filter(
+            Q(name__icontains=q) | Q(contact_email__icontains=q) | Q(contact_phone__icontains=q)
+        ).annotate(
+            rank=Case(
+                When(name__istartswith=q, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by("rank", "name", "id").values(*SEARCH_FIELDS)[:limit]
+    )
+    if matches or connection.vendor != "postgresql":
+        return matches
+
+    # Typo-tolerant pass; the % operator uses the same trigram index
+    name = Upper(Cast("name", output_field=TextField()))
+    term = Upper(Value(q, output_field=TextField()))
+    return list(
+        queryset.filter(TrigramSimilar(name, term))
+        .annotate(similarity=TrigramSimilarity(name, term))
+        .order_by("-similarity", "name", "id")
+        .values(*SEARCH_FIELDS)[:limit]
+    )
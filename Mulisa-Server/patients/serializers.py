@@ -1,8 +1,10 @@
 from rest_framework import serializers
+from mulisa_api.metrics import TimedSerializerMixin
+from mulisa_api.sparse import SparseFieldsMixin
 from .models import Patient, Vital
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     externalId = serializers.CharField(source="id", read_only=True)
     photoUrl = serializers.URLField(source="photo_url", allow_null=True, required=False)
 
@@ -18,6 +20,7 @@ class PatientSerializer(serializers.ModelSerializer):
             "contact", "medical", "emergency", "vitals", "notes", "created_at"
         ]
         read_only_fields = ("id", "externalId", "created_at")
+        expandable_fields = ("vitals",)
 
     # ---------- Nested getters ----------
     def get_contact(self, obj):
@@ -45,9 +48,14 @@ class PatientSerializer(serializers.ModelSerializer):
     def get_vitals(self, obj):
         """
         Return the LATEST vitals snapshot from the Vital history table,
-        or nulls if none exist yet. (Relies on Vital.Meta.ordering = ['-recorded_at'])
+        or nulls if none exist yet. Uses ``latest_vitals`` when the view
+        prefetched it, otherwise queries this patient's vitals.
         """
-        latest = obj.vitals.first()  # thanks to ordering, this is the most recent
+        prefetched = getattr(obj, "latest_vitals", None)
+        if prefetched is not None:
+            latest = prefetched[0] if prefetched else None
+        else:
+            latest = obj.vitals.order_by("-recorded_at", "-id").first()
         if not latest:
             return {
                 "heartRate": None,
@@ -153,8 +161,8 @@ class PatientSerializer(serializers.ModelSerializer):
         return instance
 
 
-class VitalSerializer(serializers.ModelSerializer):
-    patientId = serializers.IntegerField(source="patient.id", read_only=True)
+class VitalSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    patientId = serializers.IntegerField(source="patient_id", read_only=True)
     recordedAt = serializers.DateTimeField(source="recorded_at", read_only=True)
 
     class Meta:
@@ -175,7 +183,7 @@ class VitalSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "patientId", "recordedAt"]
         
         
-class PatientListSerializer(serializers.ModelSerializer):
+class PatientListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Simple serializer for patient list - used in dropdowns"""
     owner_email = serializers.CharField(source='owner.email', read_only=True)
     
@@ -0,0 +1,22 @@
+# patients/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from appointments.models import Appointment
+from labreports.models import LabReport
+from medications.models import Medication
+from . import chart
+from .models import Patient, Vital
+
+
+@receiver([post_save, post_delete], sender=Patient)
+def patient_changed(sender, instance, **kwargs):
+    chart.bump(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Vital)
+@receiver([post_save, post_delete], sender=Medication)
+@receiver([post_save, post_delete], sender=LabReport)
+@receiver([post_save, post_delete], sender=Appointment)
+def chart_section_changed(sender, instance, **kwargs):
+    chart.bump(instance.patient_id)
@@ -0,0 +1,226 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from patients.models import Patient, Vital
+
+
+class PatientVitalQueryBudgetTests(APITestCase):
+    """
+    The nested vitals routes load the route patient once and share it with
+    the permission check, so each endpoint has a fixed query budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.patient = Patient.objects.create(owner=cls.owner, name="Ada", age=40, gender="female")
+        now = timezone.now()
+        Vital.objects.bulk_create(
+            Vital(patient=cls.patient, heart_rate=60 + i, recorded_at=now - timedelta(hours=i))
+            for i in range(5)
+        )
+        cls.vital = Vital.objects.filter(patient=cls.patient).latest("recorded_at")
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+        self.base = f"/api/patients/{self.patient.pk}/vitals/"
+
+    def test_list(self):
+        # patient, count, page
+        with self.assertNumQueries(3):
+            response = self.client.get(self.base)
+        self.assertEqual(response.status_code, 200)
+
+    def test_create(self):
+        # patient, insert
+        with self.assertNumQueries(2):
+            response = self.client.post(self.base, {"heart_rate": 72}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_latest(self):
+        # patient, latest vital
+        with self.assertNumQueries(2):
+            response = self.client.get(f"{self.base}latest/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], self.vital.pk)
+
+    def test_detail(self):
+        # patient, vital
+        with self.assertNumQueries(2):
+            response = self.client.get(f"{self.base}{self.vital.pk}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_update(self):
+        # patient, vital, update
+        with self.assertNumQueries(3):
+            response = self.client.patch(f"{self.base}{self.vital.pk}/", {"heart_rate": 75}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_series(self):
+        # patient, one aggregate per table
+        with self.assertNumQueries(3):
+            response = self.client.get(f"{self.base}series/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_patient(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/patients/999999/vitals/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_users_patient(self):
+        self.client.force_authenticate(User.objects.create_user(username="other", password="x"))
+        with self.assertNumQueries(1):
+            response = self.client.get(self.base)
+        self.assertEqual(response.status_code, 403)
+
+
+class VitalQueryParamTests(APITestCase):
+    """Bad or impossible dates in query params are answered with 400, not 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.patient = Patient.objects.create(owner=cls.owner, name="Ada", age=40, gender="female")
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+        self.base = f"/api/patients/{self.patient.pk}/vitals/"
+
+    def assertBadParam(self, url, param, value):
+        response = self.client.get(url, {param: value})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(param, response.json()["error"])
+
+    def test_list_dates(self):
+        for param in ("from", "to"):
+            for value in ("junk", "2024-02-30T00:00:00"):
+                with self.subTest(param=param, value=value):
+                    self.assertBadParam(self.base, param, value)
+        response = self.client.get(self.base, {"from": "2024-02-01T00:00:00"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_series_dates(self):
+        for param in ("from", "to"):
+            for value in ("junk", "2024-02-30T00:00:00"):
+                with self.subTest(param=param, value=value):
+                    self.assertBadParam(f"{self.base}series/", param, value)
+        response = self.client.get(f"{self.base}series/", {"from": "2024-02-01T00:00:00", "to": "2024-02-29T00:00:00"})
+        self.assertEqual(response.status_code, 200)
+
+
+class VitalDashboardTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinician = User.objects.create_user(username="clinician", password="x", role="clinician")
+        owner = User.objects.create_user(username="owner", password="x")
+        cls.ada = Patient.objects.create(owner=owner, name="Ada", age=40, gender="female")
+        cls.bob = Patient.objects.create(owner=owner, name="Bob", age=50, gender="male")
+        Patient.objects.create(owner=owner, name="Cy", age=60, gender="male")  # no vitals
+        cls.now = timezone.now()
+        for i in range(5):
+            Vital.objects.create(patient=cls.ada, heart_rate=60 + i, recorded_at=cls.now - timedelta(hours=i))
+            Vital.objects.create(patient=cls.bob, heart_rate=120, recorded_at=cls.now - timedelta(days=1, hours=i))
+        # Same timestamp as Ada's newest: the higher id wins
+        cls.ada_latest = Vital.objects.create(patient=cls.ada, heart_rate=55, recorded_at=cls.now)
+
+    def setUp(self):
+        self.client.force_authenticate(self.clinician)
+
+    def test_latest_vital_per_patient_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/vitals/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        board = response.json()["patients"]
+        self.assertEqual([row["name"] for row in board], ["Ada", "Bob"])
+        self.assertEqual(board[0]["vitalId"], self.ada_latest.pk)
+        self.assertEqual(board[0]["flags"], {"heartRate": "low"})
+        self.assertEqual(board[1]["vitals"]["heartRate"], 120)
+        self.assertEqual(board[1]["flags"], {"heartRate": "high"})
+
+    def test_since_only_includes_patients_with_new_writes(self):
+        since = timezone.now()
+        Vital.objects.create(patient=self.bob, heart_rate=80, recorded_at=self.now - timedelta(days=3))
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/vitals/dashboard/", {"since": since.isoformat()})
+        board = response.json()["patients"]
+        # A backdated reading is still a write; Bob's newest reading is unchanged
+        self.assertEqual([row["name"] for row in board], ["Bob"])
+        self.assertEqual(board[0]["vitals"]["heartRate"], 120)
+
+    def test_bad_since(self):
+        for value in ("junk", "2024-02-30T00:00:00"):
+            with self.subTest(value=value):
+                response = self.client.get("/api/vitals/dashboard/", {"since": value})
+                self.assertEqual(response.status_code, 400)
+
+
+class VitalIngestTests(APITestCase):
+    """Device re-sends are skipped, by the window lookup and by the partial unique constraint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.patient = Patient.objects.create(owner=cls.owner, name="Ada", age=40, gender="female")
+        cls.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+
+    def reading(self, minutes, device="cuff-1", **metrics):
+        return {
+            "patientId": self.patient.pk,
+            "deviceId": device,
+            "recordedAt": (self.start + timedelta(minutes=minutes)).isoformat(),
+            **(metrics or {"heart_rate": 70}),
+        }
+
+    def post(self, readings):
+        response = self.client.post("/api/vitals/ingest/", readings, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_resent_batch_is_skipped(self):
+        batch = [self.reading(i) for i in range(5)]
+        self.assertEqual(self.post(batch)["accepted"], 5)
+        summary = self.post(batch + [self.reading(5)])
+        self.assertEqual((summary["accepted"], summary["duplicates"]), (1, 5))
+        self.assertEqual(Vital.objects.count(), 6)
+
+    def test_repeats_within_a_batch(self):
+        summary = self.post([self.reading(0), self.reading(0), self.reading(0, device="cuff-2")])
+        self.assertEqual((summary["accepted"], summary["duplicates"]), (2, 1))
+
+    def test_readings_without_device_are_never_duplicates(self):
+        # The constraint only covers device readings
+        summary = self.post([self.reading(0, device=""), self.reading(0, device="")])
+        self.assertEqual(summary["accepted"], 2)
+        self.assertEqual(Vital.objects.filter(device_id="").count(), 2)
+
+    def test_constraint_catches_concurrent_senders(self):
+        self.post([self.reading(0)])
+        # As if another request stored the reading after this one's lookup
+        with mock.patch("patients.ingest._drop_duplicates", side_effect=lambda vitals: vitals):
+            self.post([self.reading(0), self.reading(1)])
+        self.assertEqual(Vital.objects.count(), 2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vital.objects.create(
+                patient=self.patient, device_id="cuff-1", recorded_at=self.start, heart_rate=70
+            )
+
+    def test_bad_readings_are_reported_by_index(self):
+        summary = self.post([
+            self.reading(0),
+            self.reading(1, heart_rate=1000),
+            {**self.reading(2), "patientId": True},
+            {**self.reading(3), "recordedAt": "2024-02-30T10:00:00"},
+        ])
+        self.assertEqual((summary["accepted"], summary["rejected"]), (1, 3))
+        self.assertEqual(
+            [(error["index"], list(error["errors"])) for error in summary["errors"]],
+            [(1, ["heart_rate"]), (2, ["patientId"]), (3, ["recordedAt"])],
+        )
@@ -2,11 +2,17 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from labreports.views import LabReportViewSet
+from medications.views import MedicationViewSet
 from .views import PatientViewSet
 from .views_vitals import (
     PatientVitalListCreateView,
     PatientVitalDetailView,
     PatientVitalLatestView,
+    PatientVitalSeriesView,
+    VitalDashboardView,
+    VitalExportView,
+    VitalIngestView,
 )
 
 app_name = "patients"
@@ -18,6 +24,11 @@ urlpatterns = [
     # Router-generated CRUD for /api/patients/...
     *router.urls,
 
+    # Device readings for many patients at once
+    path("vitals/ingest/", VitalIngestView.as_view(), name="vitals-ingest"),
+    path("vitals/export/", VitalExportView.as_view(), name="vitals-export"),
+    path("vitals/dashboard/", VitalDashboardView.as_view(), name="vitals-dashboard"),
+
     # Nested vitals history under a patient
     path(
         "patients/<int:patient_id>/vitals/",
@@ -29,9 +40,26 @@ urlpatterns = [
         PatientVitalLatestView.as_view(),
         name="patient-vitals-latest",
     ),
+    path(
+        "patients/<int:patient_id>/vitals/series/",
+        PatientVitalSeriesView.as_view(),
+        name="patient-vitals-series",
+    ),
     path(
         "patients/<int:patient_id>/vitals/<int:vital_id>/",
         PatientVitalDetailView.as_view(),
         name="patient-vitals-detail",
     ),
+
+    # A patient's lab reports and medications (filters as on the flat routes)
+    path(
+        "patients/<int:patient_id>/labreports/",
+        LabReportViewSet.as_view({"get": "list", "post": "create"}),
+        name="patient-labreports",
+    ),
+    path(
+        "patients/<int:patient_id>/medications/",
+        MedicationViewSet.as_view({"get": "list", "post": "create"}),
+        name="patient-medications",
+    ),
 ]
@@ -1,16 +1,76 @@
-from rest_framework import viewsets, permissions
-from .models import Patient
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from mulisa_api.sparse import SparseQuerysetMixin
+from .chart import get_chart
+from .models import Patient, Vital
+from .search import DEFAULT_LIMIT, MIN_QUERY_LENGTH, search_patients
 from .serializers import PatientSerializer
 
-class PatientViewSet(viewsets.ModelViewSet):
+LATEST_FIRST = ("-recorded_at", "-id")
+
+
+def _latest_vitals():
+    # Latest vital of every patient on the page in one windowed query
+    return Prefetch("vitals", queryset=Vital.objects.order_by(*LATEST_FIRST)[:1], to_attr="latest_vitals")
+
+
+class PatientViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = PatientSerializer
     permission_classes = [permissions.IsAuthenticated]
+    field_prefetch_related = {"vitals": _latest_vitals}
 
-    def get_queryset(self):
+    def visible_patients(self):
         user = self.request.user
         if user.is_staff or user.role in ("admin", "clinician"):
             return Patient.objects.all()
         return Patient.objects.filter(owner=user)
 
+    def get_queryset(self):
+        return self.with_field_relations(self.visible_patients())
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description=f"Name, phone or email fragment (at least {MIN_QUERY_LENGTH} characters)",
+                required=True,
+            ),
+            OpenApiParameter(
+                name="limit",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description="Maximum results (default 10, max 25)",
+                required=False,
+            ),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """Typeahead for patient dropdowns: capped, unpaginated, lightweight rows"""
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        results = search_patients(self.visible_patients(), request.query_params.get("q", ""), limit)
+        return Response({"results": results})
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT})
+    @action(detail=True, methods=["get"])
+    def chart(self, request, pk=None):
+        """
+        Everything the patient screen needs in one call: patient with latest
+        vitals, active medications, recent lab reports, upcoming appointments
+        """
+        patient = get_object_or_404(self.visible_patients(), pk=pk)
+        return Response(get_chart(patient, request))
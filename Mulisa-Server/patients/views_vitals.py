@@ -1,11 +1,44 @@
-from django.utils.dateparse import parse_datetime
-from rest_framework import generics, permissions
-from rest_framework.exceptions import NotFound
+from datetime import timedelta
+
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from mulisa_api.exports import ExportError, export_response
 
-from .models import Patient, Vital
+from . import ingest
+from .archive import get_vital, history
+from .dashboard import MAX_DASHBOARD_PATIENTS, latest_vitals
+from .exports import VITALS
+from .models import Patient, Vital, VitalArchive
+from .parsers import NDJSONParser
 from .serializers import VitalSerializer
 from .permissions import IsOwnerOrStaff
+from .scoping import FilterError, datetime_param
+
+
+VITAL_METRICS = (
+    "heart_rate",
+    "bp_sys",
+    "bp_dia",
+    "height_cm",
+    "weight_kg",
+    "temperature_c",
+    "spo2",
+    "respiratory_rate",
+)
+# ?bucket= value -> (Trunc kind, window used when ?from is omitted)
+SERIES_BUCKETS = {
+    "1h": ("hour", timedelta(days=7)),
+    "1d": ("day", timedelta(days=90)),
+    "1w": ("week", timedelta(days=730)),
+}
 
 
 # --- Helper: fetch patient safely ---
@@ -19,11 +52,17 @@ def _get_patient_or_404(patient_id: int) -> Patient:
 # --- Mixin to scope vitals to a patient ---
 class PatientScopedMixin:
     def get_patient(self) -> Patient:
-        return _get_patient_or_404(self.kwargs["patient_id"])
+        """
+        The route's patient, loaded once per request. The permission check,
+        querysets, object lookups and saves all share this instance.
+        """
+        if getattr(self, "_patient", None) is None:
+            self._patient = _get_patient_or_404(self.kwargs["patient_id"])
+        return self._patient
 
     def get_queryset(self):
         patient = self.get_patient()
-        return Vital.objects.filter(patient=patient)
+        return Vital.objects.filter(patient_id=patient.pk)
 
 
 # ==========================================================
@@ -33,30 +72,29 @@ class PatientScopedMixin:
 class PatientVitalListCreateView(PatientScopedMixin, generics.ListCreateAPIView):
     """
     GET  /api/patients/<patient_id>/vitals/?from=ISO&to=ISO
-        → List all vitals for the given patient (optionally date-filtered)
+        → List all vitals for the given patient (optionally date-filtered),
+          archived ones included
     POST /api/patients/<patient_id>/vitals/
         → Add a new vital record for that patient
     """
     serializer_class = VitalSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrStaff]
 
-    def get(self, request, *args, **kwargs):
-        qs = self.get_queryset()
+    def get_queryset(self):
+        if self.request.method != "GET":
+            return super().get_queryset()
         # Optional ?from & ?to query params for date filtering
-        from_str = request.query_params.get("from")
-        to_str = request.query_params.get("to")
+        return history(
+            self.get_patient().pk,
+            start=datetime_param(self.request.query_params, "from"),
+            end=datetime_param(self.request.query_params, "to"),
+        )
 
-        if from_str:
-            dt = parse_datetime(from_str)
-            if dt:
-                qs = qs.filter(recorded_at__gte=dt)
-        if to_str:
-            dt = parse_datetime(to_str)
-            if dt:
-                qs = qs.filter(recorded_at__lte=dt)
-
-        self.queryset = qs
-        return super().get(request, *args, **kwargs)
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except FilterError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def perform_create(self, serializer):
         patient = self.get_patient()
@@ -68,6 +106,8 @@ class PatientVitalDetailView(PatientScopedMixin, generics.RetrieveUpdateDestroyA
     GET     /api/patients/<patient_id>/vitals/<vital_id>/
     PATCH   /api/patients/<patient_id>/vitals/<vital_id>/
     DELETE  /api/patients/<patient_id>/vitals/<vital_id>/
+
+    Archived vitals can be read but not changed.
     """
     serializer_class = VitalSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrStaff]
@@ -75,11 +115,13 @@ class PatientVitalDetailView(PatientScopedMixin, generics.RetrieveUpdateDestroyA
 
     def get_object(self):
         patient = self.get_patient()
-        try:
-            obj = Vital.objects.get(pk=self.kwargs["vital_id"], patient=patient)
-        except Vital.DoesNotExist:
+        obj = get_vital(patient.pk, self.kwargs["vital_id"])
+        if obj is None:
             raise NotFound("Vital record not found for this patient.")
+        obj.patient = patient
         self.check_object_permissions(self.request, obj)
+        if isinstance(obj, VitalArchive) and self.request.method not in SAFE_METHODS:
+            raise PermissionDenied("Archived vital records are read-only.")
         return obj
 
 
@@ -93,8 +135,181 @@ class PatientVitalLatestView(PatientScopedMixin, generics.RetrieveAPIView):
 
     def get_object(self):
         patient = self.get_patient()
-        obj = Vital.objects.filter(patient=patient).order_by("-recorded_at").first()
+        obj = Vital.objects.filter(patient_id=patient.pk).order_by("-recorded_at", "-id").first()
         if not obj:
             raise NotFound("No vitals recorded yet for this patient.")
+        obj.patient = patient
         self.check_object_permissions(self.request, obj)
         return obj
+
+
+class PatientVitalSeriesView(PatientScopedMixin, generics.GenericAPIView):
+    """
+    GET /api/patients/<patient_id>/vitals/series/?bucket=1h|1d|1w&metrics=heart_rate,bp_sys&from=ISO&to=ISO
+        → Min/max/avg/count per time bucket, aggregated in the database
+          (hot and archived vitals separately, then merged)
+    """
+    permission_classes = [permissions.IsAuthenticated, IsOwnerOrStaff]
+
+    def get(self, request, *args, **kwargs):
+        bucket = request.query_params.get("bucket", "1d")
+        if bucket not in SERIES_BUCKETS:
+            return Response(
+                {"error": f"bucket must be one of {', '.join(SERIES_BUCKETS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        kind, window = SERIES_BUCKETS[bucket]
+
+        metrics_param = request.query_params.get("metrics")
+        metrics = [m for m in metrics_param.split(",") if m] if metrics_param else list(VITAL_METRICS)
+        unknown = [m for m in metrics if m not in VITAL_METRICS]
+        if unknown or not metrics:
+            return Response(
+                {"error": f"metrics must be a comma-separated subset of {', '.join(VITAL_METRICS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            to_dt = datetime_param(request.query_params, "to") or timezone.now()
+            from_dt = datetime_param(request.query_params, "from") or to_dt - window
+        except FilterError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Sums rather than averages, so buckets split across tables can be merged
+        aggregates = {"count": Count("id")}
+        for metric in metrics:
+            aggregates[f"{metric}__min"] = Min(metric)
+            aggregates[f"{metric}__max"] = Max(metric)
+            aggregates[f"{metric}__sum"] = Sum(metric)
+            aggregates[f"{metric}__count"] = Count(metric)
+
+        buckets = {}
+        for model in (Vital, VitalArchive):
+            rows = (
+                model.objects.filter(
+                    patient_id=self.get_patient().pk, recorded_at__gte=from_dt, recorded_at__lte=to_dt
+                )
+                .annotate(bucket=Trunc("recorded_at", kind))
+                .values("bucket")
+                .annotate(**aggregates)
+                .order_by("bucket")
+            )
+            for row in rows:
+                merged = buckets.setdefault(row["bucket"], row)
+                if merged is row:
+                    continue
+                merged["count"] += row["count"]
+                for metric in metrics:
+                    for name, pick in ((f"{metric}__min", min), (f"{metric}__max", max)):
+                        values = [v for v in (merged[name], row[name]) if v is not None]
+                        merged[name] = pick(values) if values else None
+                    merged[f"{metric}__sum"] = (merged[f"{metric}__sum"] or 0) + (row[f"{metric}__sum"] or 0)
+                    merged[f"{metric}__count"] += row[f"{metric}__count"]
+
+        points = []
+        for bucket in sorted(buckets):
+            row = buckets[bucket]
+            point = {"start": bucket, "count": row["count"]}
+            for metric in metrics:
+                count = row[f"{metric}__count"]
+                point[metric] = {
+                    "min": row[f"{metric}__min"],
+                    "max": row[f"{metric}__max"],
+                    "avg": round(row[f"{metric}__sum"] / count, 2) if count else None,
+                    "count": count,
+                }
+            points.append(point)
+
+        return Response({
+            "bucket": bucket,
+            "from": from_dt,
+            "to": to_dt,
+            "metrics": metrics,
+            "points": points,
+        })
+
+
+class VitalIngestView(APIView):
+    """
+    POST /api/vitals/ingest/
+        → Bulk-insert device readings for any number of patients.
+          Body: NDJSON (application/x-ndjson), a JSON array, or {"readings": [...]}.
+          Each reading: patientId, deviceId, recordedAt (ISO), plus metric fields.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        readings = request.data
+        if isinstance(readings, dict):
+            readings = readings.get("readings")
+        if not isinstance(readings, list) or not readings:
+            return Response(
+                {"error": "Expected a non-empty list of readings"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(readings) > ingest.MAX_READINGS:
+            return Response(
+                {"error": f"At most {ingest.MAX_READINGS} readings per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(ingest.ingest(readings, request.user), status=status.HTTP_201_CREATED)
+
+
+class VitalExportView(APIView):
+    """
+    GET /api/vitals/export/?output=csv|ndjson&patient_ids=1,2&from=ISO&to=ISO
+        → Streamed dump of vitals for analytics (staff and clinicians only)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        if not (user.is_staff or getattr(user, "role", None) in ("admin", "clinician")):
+            raise PermissionDenied()
+        try:
+            return export_response(VITALS, request.query_params)
+        except ExportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class VitalDashboardView(APIView):
+    """
+    GET /api/vitals/dashboard/?patient_ids=1,2,3&since=ISO
+        → Latest vitals of each visible patient with out-of-range flags.
+          Poll with since=<asOf of the previous response> to get only patients
+          whose vitals changed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        if user.is_staff or getattr(user, "role", None) in ("admin", "clinician"):
+            patients = Patient.objects.all()
+        else:
+            patients = Patient.objects.filter(owner=user)
+
+        ids = request.query_params.get("patient_ids")
+        if ids:
+            try:
+                patients = patients.filter(pk__in=[int(pk) for pk in ids.split(",") if pk.strip()])
+            except ValueError:
+                return Response(
+                    {"error": "patient_ids must be a comma-separated list of IDs"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            since = datetime_param(request.query_params, "since")
+        except FilterError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Taken before the query so writes racing with it are seen by the next poll
+        as_of = timezone.now()
+        board = latest_vitals(patients.values("pk"), since=since)
+        return Response({
+            "asOf": as_of,
+            "since": since,
+            "truncated": len(board) >= MAX_DASHBOARD_PATIENTS,
+            "patients": board,
+        })